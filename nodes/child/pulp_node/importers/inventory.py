@@ -9,23 +9,39 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+from operator import itemgetter
+
+from pulp_node.manifest import unit_key_digest
+
 
 class UniqueKey(object):
     """
     A unique unit key consisting of a unit's type_id & unit_key.
-    The unit key is sorted to ensure consistency.
+    The unit key is sorted to ensure consistency and reduced to a fixed
+    size digest to keep large inventories small.
     :ivar uid: The unique ID.
-    :type uid: A tuple of: (type_id, unit_key)
+    :type uid: str: SHA1 digest of (type_id, unit_key)
     """
 
+    __slots__ = ('uid',)
+
+    @staticmethod
+    def digest(unit):
+        """
+        Get the digest of the unit's type_id & (sorted) unit_key.
+        :param unit: A content unit.
+        :type unit: dict
+        :return: The digest.
+        :rtype: str
+        """
+        return unit_key_digest(unit)
+
     def __init__(self, unit):
         """
         :param unit: A content unit.
         :type unit: dict
         """
-        type_id = unit['type_id']
-        unit_key = tuple(sorted(unit['unit_key'].items()))
-        self.uid = (type_id, unit_key)
+        self.uid = self.digest(unit)
 
     def __hash__(self):
         return hash(self.uid)
@@ -36,36 +52,136 @@ class UniqueKey(object):
     def __ne__(self, other):
         return self.uid != other.uid
 
+    def __lt__(self, other):
+        return self.uid < other.uid
+
+
+class ParentUnits(object):
+    """
+    A listing of parent units that fetches each unit from the units
+    file (by reference) only as the listing is iterated.
+    Iterating yields: (unit, unit reference).
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: List of parent inventory entries.  Either a unit
+            reference or a (unit, None) tuple for units not backed by a file.
+        :type entries: list
+        """
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            if isinstance(entry, tuple):
+                yield entry
+            else:
+                yield (entry.fetch(), entry)
+
 
 class UnitInventory(object):
     """
     The unit inventory contains both the parent and child inventory
     of content units associated with a specific repository.  Each is contained
-    within a dictionary keyed by {UnitKey} to ensure uniqueness.
+    within a list of (UniqueKey.uid, entry) sorted by key with duplicates removed
+    so the inventories can be compared using a sorted merge.
+    Only the reference is kept for parent units so that large parent
+    inventories don't need to be held in memory.
     """
 
+    @staticmethod
+    def _sorted(units):
+        """
+        Sort (key, entry) tuples by key and remove duplicate keys.
+        The last entry for a duplicated key wins.
+        :param units: List of (key, entry).
+        :type units: list
+        :return: The sorted, unique list of (key, entry).
+        :rtype: list
+        """
+        units.sort(key=itemgetter(0))
+        _units = []
+        for unit in units:
+            if _units and _units[-1][0] == unit[0]:
+                _units[-1] = unit
+            else:
+                _units.append(unit)
+        return _units
+
+    @staticmethod
+    def _difference(units, other):
+        """
+        Get the entries in units for which the key is not in other.
+        Both lists must be sorted by key.
+        :param units: Sorted list of (key, entry).
+        :type units: list
+        :param other: Sorted list of (key, entry).
+        :type other: list
+        :return: List of entries.
+        :rtype: list
+        """
+        entries = []
+        i = 0
+        other_count = len(other)
+        for key, entry in units:
+            while i < other_count and other[i][0] < key:
+                i += 1
+            if i < other_count and other[i][0] == key:
+                continue
+            entries.append(entry)
+        return entries
+
+    @staticmethod
+    def _intersection(units, other):
+        """
+        Get the entries in units for which the key is also in other.
+        Both lists must be sorted by key.
+        :param units: Sorted list of (key, entry).
+        :type units: list
+        :param other: Sorted list of (key, entry).
+        :type other: list
+        :return: List of entries.
+        :rtype: list
+        """
+        entries = []
+        i = 0
+        other_count = len(other)
+        for key, entry in units:
+            while i < other_count and other[i][0] < key:
+                i += 1
+            if i < other_count and other[i][0] == key:
+                entries.append(entry)
+        return entries
+
     @staticmethod
     def _import_parent_units(units):
-        _units = {}
+        _units = []
         for unit, ref in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = (unit, ref)
-        return _units
+            key = UniqueKey.digest(unit)
+            if ref is None:
+                # not backed by a units file
+                unit.pop('metadata', None)
+                _units.append((key, (unit, ref)))
+            else:
+                _units.append((key, ref))
+        return UnitInventory._sorted(_units)
 
     @staticmethod
     def _import_child_units(units):
-        _units = {}
+        _units = []
         for unit in units:
             unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = unit
-        return _units
+            key = UniqueKey.digest(unit)
+            _units.append((key, unit))
+        return UnitInventory._sorted(_units)
 
     def __init__(self, parent_units, child_units):
         """
         :param parent_units: The content units in the parent node.
-        :type parent_units: iterable
+        :type parent_units: iterable of: (unit, unit reference)
         :param child_units: The content units in the child node.
         :type child_units: iterable
         """
@@ -76,10 +192,11 @@ class UnitInventory(object):
         """
         Listing of units contained in the parent inventory
         but not contained in the child inventory.
-        :return: List of (unit address).
-        :rtype: list
+        The units are fetched as the listing is iterated.
+        :return: Listing of (unit, unit reference).
+        :rtype: ParentUnits
         """
-        return [r for k, r in self.parent_units.items() if k not in self.child_units]
+        return ParentUnits(self._difference(self.parent_units, self.child_units))
 
     def units_on_child_only(self):
         """
@@ -88,4 +205,46 @@ class UnitInventory(object):
         :return: List of units that need to be purged.
         :rtype: list
         """
-        return [u for k, u in self.child_units.items() if k not in self.parent_units]
\ No newline at end of file
+        return self._difference(self.child_units, self.parent_units)
+
+
+class DeltaInventory(UnitInventory):
+    """
+    The unit inventory built from the units added and removed on the parent
+    since the manifest the child last synchronized with.  Only the added units
+    are compared with the child inventory and only the child units removed
+    on the parent are reported as being on the child only.
+    """
+
+    def __init__(self, added_units, child_units, removed_units):
+        """
+        :param added_units: The content units added in the parent node.
+        :type added_units: iterable of: (unit, unit reference)
+        :param child_units: The content units in the child node.
+        :type child_units: iterable
+        :param removed_units: The content units removed in the parent node.
+        :type removed_units: iterable of: (unit, unit reference)
+        """
+        UnitInventory.__init__(self, added_units, child_units)
+        self.removed_units = self._sorted([(UniqueKey.digest(u), None) for u, r in removed_units])
+
+    def units_on_child_only(self):
+        """
+        Listing of units contained in the child inventory
+        that have been removed from the parent inventory.
+        :return: List of units that need to be purged.
+        :rtype: list
+        """
+        return self._intersection(self.child_units, self.removed_units)
+
+    def unit_keys(self):
+        """
+        The keys of the units in the child inventory once the delta
+        has been applied.
+        :return: The set of unit key digests.
+        :rtype: set
+        """
+        keys = set(key for key, unit in self.child_units)
+        keys.difference_update(key for key, unit in self.removed_units)
+        keys.update(key for key, ref in self.parent_units)
+        return keys
@@ -25,8 +25,8 @@ from pulp.server.config import config as pulp_conf
 
 from pulp_node import constants
 from pulp_node.conduit import NodesConduit
-from pulp_node.manifest import Manifest
-from pulp_node.importers.inventory import UnitInventory
+from pulp_node.manifest import Manifest, unit_keys_digest
+from pulp_node.importers.inventory import UnitInventory, DeltaInventory
 from pulp_node.importers.download import UnitDownloadManager
 from pulp_node.error import (NodeError, GetChildUnitsError, GetParentUnitsError, AddUnitError,
     DeleteUnitError, CaughtException)
@@ -38,6 +38,7 @@ log = getLogger(__name__)
 # --- i18n ------------------------------------------------------------------------------
 
 STRATEGY_UNSUPPORTED = _('Importer strategy "%(s)s" not supported')
+DELTA_NOT_APPLICABLE = _('Repository "%(r)s" changed since last synchronized, using full manifest: %(m)s')
 
 
 # --- request ---------------------------------------------------------------------------
@@ -62,6 +63,8 @@ class SyncRequest(object):
     :type repo_id: str
     :ivar working_dir: The absolute path to a directory to be used as temporary storage.
     :type working_dir: str
+    :ivar manifest_id: The ID of the parent manifest being synchronized.
+    :type manifest_id: str
     """
 
     def __init__(self, importer, conduit, config, downloader, progress, summary, repo):
@@ -87,6 +90,7 @@ class SyncRequest(object):
         self.summary = summary
         self.repo_id = repo.id
         self.working_dir = repo.working_dir
+        self.manifest_id = None
 
     def started(self):
         """
@@ -128,6 +132,11 @@ class ImporterStrategy(object):
             log.exception(request.repo_id)
             request.summary.errors.append(CaughtException(e, request.repo_id))
 
+        if request.summary.errors or request.cancelled():
+            return
+
+        self._set_synced_manifest_id(request)
+
     def _synchronize(self, request):
         """
         Specific strategies defined by subclasses.
@@ -163,6 +172,11 @@ class ImporterStrategy(object):
     def _unit_inventory(self, request):
         """
         Build the unit inventory.
+        When the parent manifest includes the units added and removed since
+        the manifest last synchronized into the child by this strategy, only
+        those are fetched and compared.  Otherwise, or when applying them would
+        not leave the child with the units in the parent manifest (the child
+        has changed since), the full units file is used.
         :param request: A synchronization request.
         :type request: SyncRequest
         :return: The built inventory.
@@ -171,7 +185,7 @@ class ImporterStrategy(object):
         # fetch child units
         try:
             conduit = NodesConduit()
-            child_units = conduit.get_units(request.repo_id)
+            child_units = list(conduit.get_units(request.repo_id))
         except NodeError:
             raise
         except Exception:
@@ -184,6 +198,17 @@ class ImporterStrategy(object):
             url = request.config.get(constants.MANIFEST_URL_KEYWORD)
             manifest = Manifest()
             manifest.fetch(url, request.working_dir, request.downloader)
+            request.manifest_id = manifest.id
+            delta = manifest.has_delta() and \
+                manifest.previous_id == self._synced_manifest_id(request)
+            if delta:
+                manifest.fetch_delta(url, request.downloader)
+                added_units = manifest.get_added_units()
+                removed_units = manifest.get_removed_units()
+                inventory = DeltaInventory(added_units, child_units, removed_units)
+                if self._delta_applies(inventory, manifest):
+                    return inventory
+                log.info(DELTA_NOT_APPLICABLE % {'r': request.repo_id, 'm': manifest.id})
             manifest.fetch_units(url, request.downloader)
             parent_units = manifest.get_units()
         except NodeError:
@@ -194,6 +219,62 @@ class ImporterStrategy(object):
 
         return UnitInventory(parent_units, child_units)
 
+    @staticmethod
+    def _delta_applies(inventory, manifest):
+        """
+        Determine whether applying the delta leaves the child with exactly
+        the units in the parent manifest.  It does not when units were added to
+        or removed from the child since the previous manifest was synchronized.
+        The unit keys are compared using the digest published in the manifest.
+        :param inventory: The inventory built from the delta.
+        :type inventory: DeltaInventory
+        :param manifest: The parent manifest.
+        :type manifest: Manifest
+        :return: True if the delta can be used.
+        :rtype: bool
+        """
+        if not manifest.units_digest:
+            return False
+        return unit_keys_digest(inventory.unit_keys()) == manifest.units_digest
+
+    def _synced_manifest_id(self, request):
+        """
+        Get the ID of the parent manifest last successfully synchronized
+        into the child repository by this strategy.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :return: The manifest ID or None when not known or when it was
+            synchronized using a different strategy.
+        :rtype: str
+        """
+        try:
+            scratchpad = request.conduit.get_scratchpad() or {}
+            if scratchpad.get(constants.SYNCED_STRATEGY_KEY) != self.__class__.__name__:
+                return None
+            return scratchpad.get(constants.SYNCED_MANIFEST_ID_KEY)
+        except Exception:
+            log.exception(request.repo_id)
+            return None
+
+    def _set_synced_manifest_id(self, request):
+        """
+        Record the ID of the parent manifest successfully synchronized
+        into the child repository and the strategy that synchronized it.
+        A failure to record the ID only means
+        that the next synchronization uses the full manifest.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        """
+        if request.manifest_id is None:
+            return
+        try:
+            scratchpad = request.conduit.get_scratchpad() or {}
+            scratchpad[constants.SYNCED_MANIFEST_ID_KEY] = request.manifest_id
+            scratchpad[constants.SYNCED_STRATEGY_KEY] = self.__class__.__name__
+            request.conduit.set_scratchpad(scratchpad)
+        except Exception:
+            log.exception(request.repo_id)
+
     def _storage_path(self, unit):
         """
         Get the storage_path for the unit using the storage_dir defined in
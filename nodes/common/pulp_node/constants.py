@@ -40,6 +40,12 @@ CA_CERT_KEYWORD = 'ca_cert'
 CLIENT_CERT_KEYWORD = 'client_cert'
 
 
+# --- importer scratchpad ----------------------------------------------------
+
+SYNCED_MANIFEST_ID_KEY = 'synced_manifest_id'
+SYNCED_STRATEGY_KEY = 'synced_strategy'
+
+
 # --- consumer notes ---------------------------------------------------------
 
 NODE_NOTE_KEY = '_child-node'
@@ -18,7 +18,10 @@ json encoded file.  For performance reasons, the unit files are compressed.
 
 import os
 import json
+import mmap
 
+from array import array
+from hashlib import sha1
 from logging import getLogger
 
 from nectar.request import DownloadRequest
@@ -34,6 +37,70 @@ log = getLogger(__name__)
 
 MANIFEST_FILE_NAME = 'manifest.json'
 UNITS_FILE_NAME = 'units.json.gz'
+ADDED_UNITS_FILE_NAME = 'units_added.json.gz'
+REMOVED_UNITS_FILE_NAME = 'units_removed.json.gz'
+
+
+# --- unit key --------------------------------------------------------------------------
+
+
+def _encode(value):
+    """
+    Encode a unit key value for hashing.
+    Values that compare equal are encoded the same regardless of type so that
+    units read from the database (str, long) match units parsed from json (unicode, int).
+    :param value: A unit key value.
+    :return: The encoded value.
+    :rtype: str
+    """
+    if isinstance(value, unicode):
+        return 's' + value.encode('utf-8')
+    if isinstance(value, str):
+        return 's' + value
+    if isinstance(value, bool):
+        return 'b%d' % value
+    if isinstance(value, (int, long)):
+        return 'i%d' % value
+    if isinstance(value, float):
+        if value.is_integer():
+            return 'i%d' % value
+        return 'f' + repr(value)
+    if isinstance(value, (list, tuple)):
+        return 'l[%s]' % ','.join(map(_encode, value))
+    if isinstance(value, dict):
+        items = sorted((_encode(k), _encode(v)) for k, v in value.items())
+        return 'd{%s}' % ','.join('%s:%s' % item for item in items)
+    return 'r' + repr(value)
+
+
+def unit_key_digest(unit):
+    """
+    Get a fixed size digest of the unit's type_id & (sorted) unit_key.
+    Units with the same digest are the same unit.
+    :param unit: A content unit.
+    :type unit: dict
+    :return: The SHA1 digest.
+    :rtype: str
+    """
+    fields = [_encode(unit['type_id'])]
+    for item in sorted(unit['unit_key'].items()):
+        fields.extend(map(_encode, item))
+    return sha1('\0'.join(fields)).digest()
+
+
+def unit_keys_digest(keys):
+    """
+    Get a digest of a collection of unit key digests.
+    Collections containing the same units have the same digest regardless of order.
+    :param keys: A collection of unit key digests.  See: unit_key_digest().
+    :type keys: iterable
+    :return: The hex encoded SHA1 digest.
+    :rtype: str
+    """
+    h = sha1()
+    for key in sorted(set(keys)):
+        h.update(key)
+    return h.hexdigest()
 
 
 # --- manifest --------------------------------------------------------------------------
@@ -50,12 +117,32 @@ class Manifest(object):
     :type total_units: int
     :ivar unit_path: The path to the downloaded content units file.
     :type unit_path: str
+    :ivar units_digest: The digest of the unit keys in the units file.
+        See: unit_keys_digest().
+    :type units_digest: str
+    :ivar previous_id: The ID of the previously published manifest
+        that the added and removed units are relative to.
+    :type previous_id: str
+    :ivar total_added: The number of units in the added units file.
+    :type total_added: int
+    :ivar added_path: The path to the added content units file.
+    :type added_path: str
+    :ivar total_removed: The number of units in the removed units file.
+    :type total_removed: int
+    :ivar removed_path: The path to the removed content units file.
+    :type removed_path: str
     """
 
     def __init__(self, manifest_id=None):
         self.id = manifest_id
         self.total_units = 0
         self.units_path = None
+        self.units_digest = None
+        self.previous_id = None
+        self.total_added = 0
+        self.added_path = None
+        self.total_removed = 0
+        self.removed_path = None
 
     def fetch(self, url, dir_path, downloader):
         """
@@ -79,6 +166,9 @@ class Manifest(object):
             manifest = json.load(fp)
             self.__dict__.update(manifest)
             self.units_path = os.path.join(dir_path, os.path.basename(self.units_path))
+            if self.has_delta():
+                self.added_path = os.path.join(dir_path, os.path.basename(self.added_path))
+                self.removed_path = os.path.join(dir_path, os.path.basename(self.removed_path))
 
     def fetch_units(self, url, downloader):
         """
@@ -90,14 +180,44 @@ class Manifest(object):
         :type downloader: nectar.downloaders.base.Downloader
         :raise HTTPError: on URL errors.
 -       :raise ValueError: on json decoding errors
+        """
+        self.units_path = self._fetch_file(url, self.units_path, downloader)
+
+    def fetch_delta(self, url, downloader):
+        """
+        Fetch the added and removed units files referenced in the manifest.
+        The files are decompressed and written to the paths specified by
+        added_path and removed_path.
+        :param url: The URL to the manifest.  Used as the base URL.
+        :type url: str
+        :param downloader: The nectar downloader to be used.
+        :type downloader: nectar.downloaders.base.Downloader
+        :raise HTTPError: on URL errors.
+        """
+        self.added_path = self._fetch_file(url, self.added_path, downloader)
+        self.removed_path = self._fetch_file(url, self.removed_path, downloader)
+
+    def _fetch_file(self, url, path, downloader):
+        """
+        Fetch a file published alongside the manifest.
+        :param url: The URL to the manifest.  Used as the base URL.
+        :type url: str
+        :param path: The absolute path to where the file is to be downloaded.
+        :type path: str
+        :param downloader: The nectar downloader to be used.
+        :type downloader: nectar.downloaders.base.Downloader
+        :return: The path to the downloaded (decompressed) file.
+        :rtype: str
+        :raise HTTPError: on URL errors.
         """
         base_url = url.rsplit('/', 1)[0]
-        url = '/'.join((base_url, os.path.basename(self.units_path)))
-        request = DownloadRequest(str(url), self.units_path)
+        url = '/'.join((base_url, os.path.basename(path)))
+        request = DownloadRequest(str(url), path)
         request_list = [request]
         downloader.download(request_list)
-        if compressed(self.units_path):
-            self.units_path = decompress(self.units_path)
+        if compressed(path):
+            path = decompress(path)
+        return path
 
     def read(self, path):
         """
@@ -127,15 +247,45 @@ class Manifest(object):
             json.dump(self.__dict__, fp, indent=2)
         return path
 
-    def set_units(self, writer):
+    def set_units(self, writer, keys=None):
         """
         Set the associated units file using the specified writer.
         Updates the units_path and total_units based on what was written by the writer.
         :param writer: The writer used to create the units file.
         :type writer: UnitWriter
+        :param keys: The unit key digests of the written units.
+            Used to set the units_digest.
+        :type keys: iterable
         """
         self.units_path = writer.path
         self.total_units = writer.total_units
+        if keys is not None:
+            self.units_digest = unit_keys_digest(keys)
+
+    def set_delta(self, previous_id, added_writer, removed_writer):
+        """
+        Set the associated added and removed units files using the specified writers.
+        :param previous_id: The ID of the manifest the delta is relative to.
+        :type previous_id: str
+        :param added_writer: The writer used to create the added units file.
+        :type added_writer: UnitWriter
+        :param removed_writer: The writer used to create the removed units file.
+        :type removed_writer: UnitWriter
+        """
+        self.previous_id = previous_id
+        self.added_path = added_writer.path
+        self.total_added = added_writer.total_units
+        self.removed_path = removed_writer.path
+        self.total_removed = removed_writer.total_units
+
+    def has_delta(self):
+        """
+        Get whether the manifest references added and removed units files
+        relative to a previous manifest.
+        :return: True if the manifest has a delta.
+        :rtype: bool
+        """
+        return bool(self.previous_id and self.added_path and self.removed_path)
 
     def get_units(self):
         """
@@ -150,6 +300,33 @@ class Manifest(object):
         else:
             return []
 
+    def get_added_units(self):
+        """
+        Get the content units added since the previous manifest.
+        :return: An iterator used to read downloaded content units.
+        :rtype: iterable
+        :raise IOError: on I/O errors.
+-       :raise ValueError: json decoding errors
+        """
+        if self.total_added:
+            return UnitIterator(self.added_path, self.total_added)
+        else:
+            return []
+
+    def get_removed_units(self):
+        """
+        Get the content units removed since the previous manifest.
+        Only the type_id and unit_key are included for removed units.
+        :return: An iterator used to read downloaded content units.
+        :rtype: iterable
+        :raise IOError: on I/O errors.
+-       :raise ValueError: json decoding errors
+        """
+        if self.total_removed:
+            return UnitIterator(self.removed_path, self.total_removed)
+        else:
+            return []
+
 
 class UnitWriter(object):
     """
@@ -209,6 +386,125 @@ class UnitWriter(object):
         self.close()
 
 
+class UnitReader(object):
+    """
+    Provides random access to the units in a (decompressed) units file.
+    The file is memory mapped and indexed by the offset and length of each
+    json encoded unit.  The index is stored in arrays to keep the memory
+    footprint small for large units files.  The file is mapped once and shared
+    by all of the references created by the reader.
+    :ivar path: The absolute path to the units file.
+    :type path: str
+    :ivar offsets: The offset of each unit within the file.
+    :type offsets: array
+    :ivar lengths: The length of each unit within the file.
+    :type lengths: array
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the units file.
+        :type path: str
+        :raise IOError: on I/O errors.
+        """
+        self.path = path
+        self.offsets = array('L')
+        self.lengths = array('L')
+        self.fp = None
+        self.map = None
+        self.fp = open(path)
+        if os.fstat(self.fp.fileno()).st_size:
+            self.map = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Build the (offset, length) index of the units in the file.
+        """
+        if self.map is None:
+            return
+        size = len(self.map)
+        begin = 0
+        while begin < size:
+            end = self.map.find('\n', begin)
+            if end < 0:
+                end = size
+            else:
+                end += 1
+            self.offsets.append(begin)
+            self.lengths.append(end - begin)
+            begin = end
+
+    def read(self, offset, length):
+        """
+        Read the unit at the specified location within the file.
+        :param offset: The offset of the unit within the file.
+        :type offset: int
+        :param length: The length of the unit within the file.
+        :type length: int
+        :return: The json decoded unit.
+        :rtype: dict
+        :raise ValueError: json decoding errors
+        """
+        json_unit = self.map[offset:offset + length]
+        return json.loads(json_unit)
+
+    def get(self, index):
+        """
+        Get the unit at the specified position within the file.
+        :param index: The position of the unit.
+        :type index: int
+        :return: The json decoded unit.
+        :rtype: dict
+        :raise IndexError: when the index is out of range.
+        :raise ValueError: json decoding errors
+        """
+        return self.read(self.offsets[index], self.lengths[index])
+
+    def ref(self, index):
+        """
+        Get a reference to the unit at the specified position within the file.
+        :param index: The position of the unit.
+        :type index: int
+        :return: A reference to the unit.
+        :rtype: UnitRef
+        :raise IndexError: when the index is out of range.
+        """
+        return UnitRef(self.path, self.offsets[index], self.lengths[index], self)
+
+    @property
+    def closed(self):
+        return self.fp is None or self.fp.closed
+
+    def close(self):
+        """
+        Close the memory map and the file.  This method is idempotent.
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if not self.closed:
+            self.fp.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for index in xrange(len(self.offsets)):
+            yield (self.get(index), self.ref(index))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused):
+        self.close()
+        return False
+
+    def __del__(self):
+        # just in case the reader is not properly closed.
+        self.close()
+
+
 class UnitIterator:
     """
     Used to iterate content units inventory file associated with a manifest.
@@ -218,18 +514,9 @@ class UnitIterator:
 
     @staticmethod
     def get_units(path):
-        with open(path) as fp:
-            while True:
-                begin = fp.tell()
-                json_unit = fp.readline()
-                end = fp.tell()
-                if json_unit:
-                    unit = json.loads(json_unit)
-                    length = (end - begin)
-                    ref = UnitRef(path, begin, length)
-                    yield (unit, ref)
-                else:
-                    break
+        reader = UnitReader(path)
+        for unit, ref in reader:
+            yield (unit, ref)
 
     def __init__(self, path, total_units):
         """
@@ -260,9 +547,13 @@ class UnitRef(object):
     :type offset: int
     :ivar length: The length of a specific unit within the file.
     :type length: int
+    :ivar reader: An optional reader used to fetch the unit.
+    :type reader: UnitReader
     """
 
-    def __init__(self, path, offset, length):
+    __slots__ = ('path', 'offset', 'length', 'reader')
+
+    def __init__(self, path, offset, length, reader=None):
         """
         :param path: The absolute path to the units file.
         :type path: str
@@ -270,10 +561,14 @@ class UnitRef(object):
         :type offset: int
         :param length: The length of a specific unit within the file.
         :type length: int
+        :param reader: An optional reader used to fetch the unit.  When not
+            specified (or closed), the units file is opened on each fetch.
+        :type reader: UnitReader
         """
         self.path = path
         self.offset = offset
         self.length = length
+        self.reader = reader
 
     def fetch(self):
         """
@@ -283,6 +578,8 @@ class UnitRef(object):
         :raise IOError: on I/O errors.
 -       :raise ValueError: json decoding errors
         """
+        if self.reader is not None and not self.reader.closed:
+            return self.reader.read(self.offset, self.length)
         with open(self.path) as fp:
             fp.seek(self.offset)
             json_unit = fp.read(self.length)
@@ -13,13 +13,18 @@ import os
 
 from uuid import uuid4
 
-from pulp_node.manifest import Manifest, UnitWriter, MANIFEST_FILE_NAME, UNITS_FILE_NAME
+from pulp_node.compression import decompress
+from pulp_node.manifest import (Manifest, UnitWriter, unit_key_digest,
+    MANIFEST_FILE_NAME, UNITS_FILE_NAME, ADDED_UNITS_FILE_NAME, REMOVED_UNITS_FILE_NAME)
 
 from logging import getLogger
 
 log = getLogger(__name__)
 
 
+PREVIOUS_UNITS_FILE_NAME = 'units_previous.json.gz'
+
+
 def join(*parts):
     """
     Join URL and file path fragments.
@@ -83,24 +88,94 @@ class FilePublisher(Publisher):
         Publish the specified units.
         Writes the units.json file and symlinks each of the
         files associated to the unit.storage_path.
+        When a previous manifest has been published, the units added and
+        removed since are also written and referenced in the manifest so
+        that children in sync with the previous manifest only need the delta.
         :param units: A list of units to publish.
         :type units: iterable
         """
 
         dir_path = join(self.publish_dir, self.repo_id)
         units_path = os.path.join(dir_path, UNITS_FILE_NAME)
+        added_path = os.path.join(dir_path, ADDED_UNITS_FILE_NAME)
+        removed_path = os.path.join(dir_path, REMOVED_UNITS_FILE_NAME)
         manifest_path = os.path.join(dir_path, MANIFEST_FILE_NAME)
         mkdir(dir_path)
-        with UnitWriter(units_path) as writer:
-            for unit in units:
-                self.link_unit(unit)
-                writer.add(unit)
-        manifest_id = str(uuid4())
-        manifest = Manifest(manifest_id)
-        manifest.set_units(writer)
+        previous = self._previous(dir_path, manifest_path)
+        try:
+            previous_units = set()
+            added_writer = None
+            if previous is not None:
+                previous_units = self._unit_keys(previous)
+                added_writer = UnitWriter(added_path)
+            published = set()
+            with UnitWriter(units_path) as writer:
+                for unit in units:
+                    self.link_unit(unit)
+                    writer.add(unit)
+                    key = unit_key_digest(unit)
+                    published.add(key)
+                    if added_writer is not None and key not in previous_units:
+                        added_writer.add(unit)
+            manifest_id = str(uuid4())
+            manifest = Manifest(manifest_id)
+            manifest.set_units(writer, published)
+            if previous is not None:
+                added_writer.close()
+                with UnitWriter(removed_path) as removed_writer:
+                    for unit, ref in previous.get_units():
+                        if unit_key_digest(unit) not in published:
+                            removed_writer.add(dict(type_id=unit['type_id'], unit_key=unit['unit_key']))
+                manifest.set_delta(previous.id, added_writer, removed_writer)
+        finally:
+            if previous is not None:
+                os.unlink(previous.units_path)
         manifest_path = manifest.write(manifest_path)
         return manifest_path
 
+    def _previous(self, dir_path, manifest_path):
+        """
+        Get the previously published manifest.
+        The previous units file is moved aside (and decompressed) so it
+        can be compared with the units being published.
+        :param dir_path: The publishing directory for the repository.
+        :type dir_path: str
+        :param manifest_path: The path to the published manifest.
+        :type manifest_path: str
+        :return: The previous manifest with units_path updated to the
+            moved units file or None when not available.
+        :rtype: Manifest
+        """
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            previous = Manifest()
+            previous.read(manifest_path)
+            units_path = os.path.join(dir_path, os.path.basename(previous.units_path))
+            if not previous.id or not os.path.exists(units_path):
+                return None
+            previous_path = os.path.join(dir_path, PREVIOUS_UNITS_FILE_NAME)
+            os.rename(units_path, previous_path)
+            previous.units_path = decompress(previous_path)
+            return previous
+        except Exception:
+            log.exception(manifest_path)
+            return None
+
+    @staticmethod
+    def _unit_keys(manifest):
+        """
+        Get the unit key digests of the units in the specified manifest.
+        :param manifest: A manifest with a (decompressed) units file.
+        :type manifest: Manifest
+        :return: The set of unit key digests.
+        :rtype: set
+        """
+        keys = set()
+        for unit, ref in manifest.get_units():
+            keys.add(unit_key_digest(unit))
+        return keys
+
     def link_unit(self, unit):
         """
         Link files associated with the unit into the publish directory.
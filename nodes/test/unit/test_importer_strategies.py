@@ -23,7 +23,10 @@ from pulp.plugins.model import Unit
 from pulp.server.config import config as pulp_conf
 
 from pulp_node.importers.strategies import *
-from pulp_node.importers.inventory import UnitInventory
+from pulp_node.importers.inventory import UnitInventory, UniqueKey, DeltaInventory
+from pulp_node.manifest import Manifest, UnitWriter, UnitIterator, unit_keys_digest
+from pulp_node import constants
+from pulp_node.compression import decompress
 from pulp_node.importers.reports import SummaryReport, ProgressListener
 from pulp_node.reports import RepositoryProgress
 from pulp_node.error import *
@@ -41,6 +44,8 @@ class TestConduit:
     save_unit = Mock()
     remove_unit = Mock()
     set_progress = Mock()
+    get_scratchpad = Mock(return_value=None)
+    set_scratchpad = Mock()
 
 
 class TestImporter:
@@ -308,6 +313,246 @@ class TestBase(TestCase):
         self.assertTrue(request.downloader.download.called)
         self.assertTrue(request.downloader.cancel.called)
 
+    def test_inventory_parent_units_by_reference(self):
+        # Setup
+        tmp_dir = mkdtemp()
+        try:
+            writer = UnitWriter(os.path.join(tmp_dir, 'units.json'))
+            for n in range(0, 3):
+                writer.add(dict(unit_id=str(n), type_id='T', unit_key={'n': n}, metadata={'m': n}))
+            writer.close()
+            units_path = decompress(writer.path)
+            child_unit = dict(unit_id='1', type_id='T', unit_key={'n': 1}, metadata={})
+            # Test
+            inventory = UnitInventory(UnitIterator(units_path, 3), [child_unit])
+            units = inventory.units_on_parent_only()
+            # Verify
+            for key, ref in inventory.parent_units:
+                self.assertFalse(isinstance(ref, tuple))
+            self.assertEqual(len(units), 2)
+            fetched = sorted([unit['unit_id'] for unit, ref in units])
+            self.assertEqual(fetched, ['0', '2'])
+            for unit, ref in units:
+                self.assertEqual(unit['metadata'], {'m': unit['unit_key']['n']})
+                self.assertEqual(ref.fetch(), unit)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_unique_key(self):
+        unit_1 = dict(type_id='T', unit_key={'name': 'a', 'version': '1'})
+        unit_2 = dict(type_id=u'T', unit_key={u'version': u'1', u'name': u'a'})
+        unit_3 = dict(type_id='T', unit_key={'name': 'a', 'version': '2'})
+        unit_4 = dict(type_id='X', unit_key={'name': 'a', 'version': '1'})
+        self.assertEqual(UniqueKey(unit_1), UniqueKey(unit_2))
+        self.assertNotEqual(UniqueKey(unit_1), UniqueKey(unit_3))
+        self.assertNotEqual(UniqueKey(unit_1), UniqueKey(unit_4))
+        self.assertEqual(len(UniqueKey(unit_1).uid), 20)
+
+    def test_unique_key_numbers(self):
+        # child units are read from the database, parent units from json
+        child_unit = dict(type_id='T', unit_key={'name': 'a', 'size': 3000000000L, 'n': 2.0})
+        parent_unit = dict(type_id=u'T', unit_key={u'name': u'a', u'size': 3000000000, u'n': 2})
+        self.assertEqual(UniqueKey(child_unit), UniqueKey(parent_unit))
+        child_unit = dict(type_id='T', unit_key={'name': 'a', 'size': 1L})
+        parent_unit = dict(type_id='T', unit_key={'name': 'a', 'size': 1.5})
+        self.assertNotEqual(UniqueKey(child_unit), UniqueKey(parent_unit))
+
+    def test_inventory_difference(self):
+        parent_units = []
+        for n in (5, 1, 3, 1, 7):
+            unit = dict(unit_id='p%d' % n, type_id='T', unit_key={'n': n}, metadata={})
+            parent_units.append((unit, None))
+        child_units = []
+        for n in (2, 3, 9, 5, 2):
+            child_units.append(dict(unit_id='c%d' % n, type_id='T', unit_key={'n': n}, metadata={}))
+        # Test
+        inventory = UnitInventory(parent_units, child_units)
+        # Verify
+        parent_only = sorted([u['unit_id'] for u, ref in inventory.units_on_parent_only()])
+        child_only = sorted([u['unit_id'] for u in inventory.units_on_child_only()])
+        self.assertEqual(parent_only, ['p1', 'p7'])
+        self.assertEqual(child_only, ['c2', 'c9'])
+
+    def test_delta_inventory(self):
+        added_units = []
+        for n in (1, 2):
+            unit = dict(unit_id='p%d' % n, type_id='T', unit_key={'n': n}, metadata={})
+            added_units.append((unit, None))
+        removed_units = []
+        for n in (3, 8):
+            removed_units.append((dict(type_id='T', unit_key={'n': n}), None))
+        child_units = []
+        for n in (2, 3, 4):
+            child_units.append(dict(unit_id='c%d' % n, type_id='T', unit_key={'n': n}, metadata={}))
+        # Test
+        inventory = DeltaInventory(added_units, child_units, removed_units)
+        # Verify
+        parent_only = [u['unit_id'] for u, ref in inventory.units_on_parent_only()]
+        child_only = [u['unit_id'] for u in inventory.units_on_child_only()]
+        self.assertEqual(parent_only, ['p1'])
+        self.assertEqual(child_only, ['c3'])
+        keys = [UniqueKey.digest(dict(type_id='T', unit_key={'n': n})) for n in (1, 2, 4)]
+        self.assertEqual(inventory.unit_keys(), set(keys))
+
+    def _manifest(self, previous_id):
+        manifest = Manifest('m2')
+        manifest.previous_id = previous_id
+        manifest.added_path = 'added'
+        manifest.removed_path = 'removed'
+        manifest.units_digest = unit_keys_digest([])
+        return manifest
+
+    @patch('pulp_node.conduit.NodesConduit.get_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.fetch')
+    @patch('pulp_node.manifest.Manifest.fetch_units')
+    @patch('pulp_node.manifest.Manifest.fetch_delta')
+    @patch('pulp_node.manifest.Manifest.get_added_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.get_removed_units', return_value=[])
+    def test_unit_inventory_delta(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = {
+            constants.SYNCED_MANIFEST_ID_KEY: 'm1',
+            constants.SYNCED_STRATEGY_KEY: 'ImporterStrategy'}
+        manifest = self._manifest('m1')
+        # Test
+        strategy = ImporterStrategy()
+        with patch('pulp_node.importers.strategies.Manifest', return_value=manifest):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertTrue(isinstance(inventory, DeltaInventory))
+        self.assertTrue(manifest.fetch_delta.called)
+        self.assertFalse(manifest.fetch_units.called)
+        self.assertEqual(request.manifest_id, 'm2')
+
+    @patch('pulp_node.conduit.NodesConduit.get_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.fetch')
+    @patch('pulp_node.manifest.Manifest.fetch_units')
+    @patch('pulp_node.manifest.Manifest.fetch_delta')
+    @patch('pulp_node.manifest.Manifest.get_units', return_value=[])
+    def test_unit_inventory_delta_not_matched(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = {constants.SYNCED_MANIFEST_ID_KEY: 'm0'}
+        manifest = self._manifest('m1')
+        # Test
+        strategy = ImporterStrategy()
+        with patch('pulp_node.importers.strategies.Manifest', return_value=manifest):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertFalse(isinstance(inventory, DeltaInventory))
+        self.assertFalse(manifest.fetch_delta.called)
+        self.assertTrue(manifest.fetch_units.called)
+
+    @patch('pulp_node.conduit.NodesConduit.get_units',
+           return_value=[dict(unit_id='c1', type_id='T', unit_key={'n': 1}, metadata={})])
+    @patch('pulp_node.manifest.Manifest.fetch')
+    @patch('pulp_node.manifest.Manifest.fetch_units')
+    @patch('pulp_node.manifest.Manifest.fetch_delta')
+    @patch('pulp_node.manifest.Manifest.get_added_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.get_removed_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.get_units', return_value=[])
+    def test_unit_inventory_delta_child_changed(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = {
+            constants.SYNCED_MANIFEST_ID_KEY: 'm1',
+            constants.SYNCED_STRATEGY_KEY: 'Mirror'}
+        manifest = self._manifest('m1')
+        manifest.total_units = 0
+        # Test
+        strategy = Mirror()
+        with patch('pulp_node.importers.strategies.Manifest', return_value=manifest):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertFalse(isinstance(inventory, DeltaInventory))
+        self.assertTrue(manifest.fetch_delta.called)
+        self.assertTrue(manifest.fetch_units.called)
+        child_only = [unit['unit_id'] for unit in inventory.units_on_child_only()]
+        self.assertEqual(child_only, ['c1'])
+
+    @patch('pulp_node.conduit.NodesConduit.get_units',
+           return_value=[dict(unit_id='c1', type_id='T', unit_key={'n': 1}, metadata={}),
+                         dict(unit_id='c3', type_id='T', unit_key={'n': 3}, metadata={})])
+    @patch('pulp_node.manifest.Manifest.fetch')
+    @patch('pulp_node.manifest.Manifest.fetch_units')
+    @patch('pulp_node.manifest.Manifest.fetch_delta')
+    @patch('pulp_node.manifest.Manifest.get_added_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.get_removed_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.get_units', return_value=[])
+    def test_unit_inventory_delta_child_drifted(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = {
+            constants.SYNCED_MANIFEST_ID_KEY: 'm1',
+            constants.SYNCED_STRATEGY_KEY: 'Mirror'}
+        # the child gained unit 3 and lost unit 2 so the count still matches
+        manifest = self._manifest('m1')
+        manifest.total_units = 2
+        manifest.units_digest = unit_keys_digest(
+            [UniqueKey.digest(dict(type_id='T', unit_key={'n': n})) for n in (1, 2)])
+        # Test
+        strategy = Mirror()
+        with patch('pulp_node.importers.strategies.Manifest', return_value=manifest):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertFalse(isinstance(inventory, DeltaInventory))
+        self.assertTrue(manifest.fetch_delta.called)
+        self.assertTrue(manifest.fetch_units.called)
+
+    @patch('pulp_node.conduit.NodesConduit.get_units', return_value=[])
+    @patch('pulp_node.manifest.Manifest.fetch')
+    @patch('pulp_node.manifest.Manifest.fetch_units')
+    @patch('pulp_node.manifest.Manifest.fetch_delta')
+    @patch('pulp_node.manifest.Manifest.get_units', return_value=[])
+    def test_unit_inventory_delta_strategy_changed(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = {
+            constants.SYNCED_MANIFEST_ID_KEY: 'm1',
+            constants.SYNCED_STRATEGY_KEY: 'Additive'}
+        manifest = self._manifest('m1')
+        # Test
+        strategy = Mirror()
+        with patch('pulp_node.importers.strategies.Manifest', return_value=manifest):
+            inventory = strategy._unit_inventory(request)
+        # Verify
+        self.assertFalse(isinstance(inventory, DeltaInventory))
+        self.assertFalse(manifest.fetch_delta.called)
+        self.assertTrue(manifest.fetch_units.called)
+
+    @patch('pulp_node.importers.strategies.ImporterStrategy._synchronize')
+    def test_synchronize_records_manifest_id(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.conduit.get_scratchpad.return_value = None
+        request.manifest_id = 'm2'
+        # Test
+        strategy = ImporterStrategy()
+        strategy.synchronize(request)
+        # Verify
+        request.conduit.set_scratchpad.assert_called_once_with({
+            constants.SYNCED_MANIFEST_ID_KEY: 'm2',
+            constants.SYNCED_STRATEGY_KEY: 'ImporterStrategy'})
+
+    @patch('pulp_node.importers.strategies.ImporterStrategy._synchronize', side_effect=UNIT_ERROR)
+    def test_synchronize_failed_manifest_id_not_recorded(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit = Mock()
+        request.manifest_id = 'm2'
+        # Test
+        strategy = ImporterStrategy()
+        strategy.synchronize(request)
+        # Verify
+        self.assertFalse(request.conduit.set_scratchpad.called)
+
     def test_strategy_factory(self):
         for name, strategy in STRATEGIES.items():
             self.assertEqual(find_strategy(name), strategy)
@@ -21,6 +21,7 @@ from nectar.downloaders.curl import HTTPSCurlDownloader
 from nectar.config import DownloaderConfig
 
 from pulp_node.manifest import *
+from pulp_node.compression import decompress
 
 
 class TestManifest(TestCase):
@@ -114,3 +115,43 @@ class TestManifest(TestCase):
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
         self.verify(units, units_in)
+
+    def test_reader(self):
+        # Setup
+        units = []
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={'n': i})
+            units.append(unit)
+        units_path = os.path.join(self.tmp_dir, UNITS_FILE_NAME)
+        writer = UnitWriter(units_path)
+        for u in units:
+            writer.add(u)
+        writer.close()
+        units_path = decompress(writer.path)
+        # Test
+        reader = UnitReader(units_path)
+        # Verify
+        self.assertEqual(len(reader), self.NUM_UNITS)
+        self.assertEqual(reader.get(3), units[3])
+        units_in = []
+        for unit, ref in reader:
+            units_in.append(unit)
+            self.assertTrue(ref.reader is reader)
+            self.assertEqual(ref.fetch(), unit)
+        self.verify(units, units_in)
+        ref = reader.ref(5)
+        reader.close()
+        self.assertTrue(reader.closed)
+        # closed reader, the file is read directly
+        self.assertEqual(ref.fetch(), units[5])
+
+    def test_reader_empty_file(self):
+        # Setup
+        units_path = os.path.join(self.tmp_dir, 'units.json')
+        open(units_path, 'w').close()
+        # Test
+        reader = UnitReader(units_path)
+        # Verify
+        self.assertEqual(len(reader), 0)
+        self.assertEqual(list(reader), [])
+        reader.close()
@@ -17,7 +17,8 @@ from unittest import TestCase
 from nectar.downloaders.curl import HTTPSCurlDownloader
 from nectar.config import DownloaderConfig
 from pulp_node.distributors.http.publisher import HttpPublisher
-from pulp_node.manifest import Manifest
+from pulp_node.distributors.publisher import PREVIOUS_UNITS_FILE_NAME
+from pulp_node.manifest import Manifest, MANIFEST_FILE_NAME, unit_key_digest, unit_keys_digest
 
 
 class TestHttp(TestCase):
@@ -88,3 +89,41 @@ class TestHttp(TestCase):
             self.assertEqual(s, file_content)
             self.assertEqual(unit['unit_key']['n'], n)
             n += 1
+
+    def test_publisher_delta(self):
+        # setup
+        repo_id = 'test_repo'
+        base_url = 'file://'
+        publish_dir = os.path.join(self.tmpdir, 'nodes/repos')
+        virtual_host = (publish_dir, publish_dir)
+        p = HttpPublisher(base_url, virtual_host, repo_id)
+        units = [{'type_id':'unit', 'unit_key':{'n':n}} for n in range(0, 3)]
+        p.publish(units)
+        manifest_path = os.path.join(publish_dir, repo_id, MANIFEST_FILE_NAME)
+        previous = Manifest()
+        previous.read(manifest_path)
+        # test
+        units = [{'type_id':'unit', 'unit_key':{'n':n}} for n in range(1, 5)]
+        p.publish(units)
+        # verify
+        self.assertFalse(previous.has_delta())
+        conf = DownloaderConfig()
+        downloader = HTTPSCurlDownloader(conf)
+        working_dir = os.path.join(self.tmpdir, 'working_dir')
+        os.makedirs(working_dir)
+        manifest = Manifest()
+        url = 'file://' + manifest_path
+        manifest.fetch(url, working_dir, downloader)
+        self.assertTrue(manifest.has_delta())
+        self.assertEqual(manifest.previous_id, previous.id)
+        self.assertEqual(manifest.total_units, 4)
+        self.assertEqual(manifest.units_digest, unit_keys_digest(map(unit_key_digest, units)))
+        self.assertEqual(manifest.total_added, 2)
+        self.assertEqual(manifest.total_removed, 1)
+        manifest.fetch_delta(url, downloader)
+        added = sorted([unit['unit_key']['n'] for unit, ref in manifest.get_added_units()])
+        removed = [unit['unit_key']['n'] for unit, ref in manifest.get_removed_units()]
+        self.assertEqual(added, [3, 4])
+        self.assertEqual(removed, [0])
+        dir_path = os.path.join(publish_dir, repo_id)
+        self.assertFalse(os.path.exists(os.path.join(dir_path, PREVIOUS_UNITS_FILE_NAME)))
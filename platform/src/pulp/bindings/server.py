@@ -12,8 +12,13 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import base64
+import httplib
 import locale
 import logging
+import select
+import socket
+import threading
+import time
 import urllib
 from types import NoneType
 
@@ -28,6 +33,17 @@ import pulp.bindings.exceptions as exceptions
 from pulp.bindings.responses import Response, Task
 from pulp.common.util import ensure_utf_8
 
+# -- constants ----------------------------------------------------------------
+
+# Maximum number of idle connections kept open by a keep-alive connection pool
+# and seconds an idle connection is kept before it is closed
+DEFAULT_POOL_SIZE = 4
+POOL_IDLE_TIMEOUT = 30
+
+# Methods that may be sent again if the server fails to answer them on a
+# reused keep-alive connection
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
 # -- server connection --------------------------------------------------------
 
 class PulpConnection(object):
@@ -38,11 +54,16 @@ class PulpConnection(object):
     parameter can be used to pass in another mechanism to make the actual
     call to the server. The likely use of this is a duck-typed mock object
     for unit testing purposes.
+
+    By default, a new connection (and TLS handshake) is made for every call.
+    If keep_alive is set, connections are kept open and reused for subsequent
+    calls instead.
     """
 
     def __init__(self, host, port=443, path_prefix='/pulp/api', timeout=120,
                  logger=None, api_responses_logger=None,
-                 username=None, password=None, cert_filename=None, server_wrapper=None):
+                 username=None, password=None, cert_filename=None, server_wrapper=None,
+                 keep_alive=False, pool_size=DEFAULT_POOL_SIZE):
 
         self.host = host
         self.port = port
@@ -69,6 +90,10 @@ class PulpConnection(object):
                         'Accept-Language': default_locale,
                         'Content-Type': 'application/json'}
 
+        # Connection reuse
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+
         # Server Wrapper
         if server_wrapper:
             self.server_wrapper = server_wrapper
@@ -232,19 +257,38 @@ class HTTPSServerWrapper(object):
 
     def __init__(self, pulp_connection):
         self.pulp_connection = pulp_connection
+        self.pool = None
+        if pulp_connection.keep_alive:
+            self.pool = ConnectionPool(self._create_connection, pulp_connection.pool_size)
 
     def request(self, method, url, body):
 
         headers = dict(self.pulp_connection.headers) # copy so we don't affect the calling method
 
-        # Create a new connection each time since HTTPSConnection has problems
-        # reusing a connection for multiple calls (lame).
-        ssl_context = None
         if self.pulp_connection.username and self.pulp_connection.password:
             raw = ':'.join((self.pulp_connection.username, self.pulp_connection.password))
             encoded = base64.encodestring(raw)[:-1]
             headers['Authorization'] = 'Basic ' + encoded
-        elif self.pulp_connection.cert_filename:
+
+        if self.pool is None:
+            # Create a new connection each time since HTTPSConnection has problems
+            # reusing a connection for multiple calls (lame).
+            connection = self._create_connection()
+            response, response_body = self._send(connection, method, url, body, headers)
+        else:
+            response, response_body = self._send_pooled(method, url, body, headers)
+
+        # Attempt to deserialize the body (should pass unless the server is busted)
+        try:
+            response_body = json.loads(response_body)
+        except:
+            pass
+        return response.status, response_body
+
+    def _create_connection(self):
+        ssl_context = None
+        if not (self.pulp_connection.username and self.pulp_connection.password) and \
+                self.pulp_connection.cert_filename:
             ssl_context = SSL.Context('sslv3')
             ssl_context.set_session_timeout(self.pulp_connection.timeout)
             ssl_context.load_cert(self.pulp_connection.cert_filename)
@@ -254,10 +298,24 @@ class HTTPSServerWrapper(object):
             connection = httpslib.HTTPSConnection(self.pulp_connection.host, self.pulp_connection.port, ssl_context=ssl_context)
         else:
             connection = httpslib.HTTPSConnection(self.pulp_connection.host, self.pulp_connection.port)
+        return connection
+
+    def _send(self, connection, method, url, body, headers):
+        """
+        Makes the request on the given connection.
 
+        :return: tuple of the response and its body
+        """
         # Request against the server
         connection.request(method, url, body=body, headers=headers)
+        return self._receive(connection)
 
+    def _receive(self, connection):
+        """
+        Reads the response to the request last sent on the given connection.
+
+        :return: tuple of the response and its body
+        """
         try:
             response = connection.getresponse()
         except SSL.SSLError, err:
@@ -267,11 +325,163 @@ class HTTPSServerWrapper(object):
             else:
                 raise exceptions.ConnectionException(None, str(err), None)
 
-        # Attempt to deserialize the body (should pass unless the server is busted)
-        response_body = response.read()
+        return response, response.read()
 
+    def _send_pooled(self, method, url, body, headers):
+        """
+        Makes the request on a connection from the pool. The server may close
+        an idle connection at any time, so a request that fails on a reused
+        connection is retried once on a new one. Once the request has been
+        written the server may already have acted on it, so from that point
+        only idempotent requests are retried.
+
+        :return: tuple of the response and its body
+        """
+        connection, reused = self.pool.acquire()
+        sent = False
         try:
-            response_body = json.loads(response_body)
+            connection.request(method, url, body=body, headers=headers)
+            sent = True
+            response, response_body = self._receive(connection)
+        except (httplib.HTTPException, socket.error, SSL.SSLError, exceptions.ConnectionException):
+            self.pool.discard(connection)
+            if not reused or (sent and method.upper() not in IDEMPOTENT_METHODS):
+                raise
+            connection = self.pool.create()
+            try:
+                response, response_body = self._send(connection, method, url, body, headers)
+            except:
+                self.pool.discard(connection)
+                raise
         except:
-            pass
-        return response.status, response_body
+            self.pool.discard(connection)
+            raise
+
+        if response.will_close:
+            self.pool.discard(connection)
+        else:
+            self.pool.release(connection)
+        return response, response_body
+
+
+class ConnectionPool(object):
+    """
+    Pool of keep-alive connections to the server. Connections are handed out
+    to one caller at a time; idle connections are checked to still be usable
+    before they are handed out again.
+    """
+
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        """
+        :param factory: callable that returns a new, unopened connection
+        :type  factory: callable
+
+        :param size: maximum number of idle connections kept
+        :type  size: int
+
+        :param idle_timeout: seconds an idle connection is kept
+        :type  idle_timeout: int
+        """
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = [] # list of (connection, time released), most recent last
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def acquire(self):
+        """
+        :return: tuple of a connection and whether it has been used before
+        :rtype:  tuple
+        """
+        now = time.time()
+        while True:
+            self._lock.acquire()
+            try:
+                if not self._idle:
+                    break
+                connection, released = self._idle.pop()
+            finally:
+                self._lock.release()
+            if now - released <= self.idle_timeout and self._is_usable(connection):
+                self._lock.acquire()
+                self.reused += 1
+                self._lock.release()
+                return connection, True
+            self.discard(connection)
+        return self.create(), False
+
+    def create(self):
+        """
+        :return: new connection, not taken from the idle connections
+        """
+        self._lock.acquire()
+        self.created += 1
+        self._lock.release()
+        return self.factory()
+
+    def release(self, connection):
+        """
+        Returns a connection, whose response has been read completely, to the
+        pool.
+        """
+        self._lock.acquire()
+        try:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.time()))
+                return
+        finally:
+            self._lock.release()
+        self.discard(connection)
+
+    def discard(self, connection):
+        """
+        Closes a connection that is not returned to the pool.
+        """
+        connection.close()
+        self._lock.acquire()
+        self.discarded += 1
+        self._lock.release()
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = []
+        finally:
+            self._lock.release()
+        for connection, released in idle:
+            connection.close()
+
+    def statistics(self):
+        """
+        :return: number of connections created, reused and discarded and the
+                 number of idle connections
+        :rtype:  dict
+        """
+        self._lock.acquire()
+        try:
+            return {'created': self.created, 'reused': self.reused,
+                    'discarded': self.discarded, 'idle': len(self._idle)}
+        finally:
+            self._lock.release()
+
+    def _is_usable(self, connection):
+        """
+        An idle connection is usable if it is still open and the server has
+        not sent anything on it; a readable socket means the server closed
+        the connection (or is misbehaving).
+        """
+        sock = getattr(connection, 'sock', None)
+        if sock is None:
+            return False
+        try:
+            readable = select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
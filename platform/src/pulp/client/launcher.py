@@ -189,8 +189,12 @@ def _create_bindings(config, logger, username, password):
         call_log.addHandler(handler)
         call_log.setLevel(logging.INFO)
 
+    keep_alive = False
+    if config.has_option('server', 'keep_alive'):
+        keep_alive = config.parse_bool(config['server']['keep_alive'])
+
     # Create the connection and bindings
-    conn = PulpConnection(hostname, port, username=username, password=password, cert_filename=cert_filename, logger=logger, api_responses_logger=call_log)
+    conn = PulpConnection(hostname, port, username=username, password=password, cert_filename=cert_filename, logger=logger, api_responses_logger=call_log, keep_alive=keep_alive)
     bindings = Bindings(conn)
 
     return bindings
@@ -22,6 +22,10 @@ import copy
 import os
 import pickle
 import sys
+import threading
+import time
+
+from M2Crypto import threading as m2threading
 
 from pulp.client.lock import LockFile
 
@@ -29,6 +33,15 @@ from pulp.client.lock import LockFile
 
 DEFAULT_CHUNKSIZE = 1048576 # 1 MB per upload call
 
+# Bounds of the chunk size when uploading concurrently; the chunk size is
+# adapted so each upload call takes about TARGET_SEGMENT_SECONDS.
+MIN_CHUNKSIZE = 262144 # 256 KB
+MAX_CHUNKSIZE = 16777216 # 16 MB
+TARGET_SEGMENT_SECONDS = 2
+
+# Minimum number of seconds between saves of a tracker file while uploading
+TRACKER_SAVE_INTERVAL = 1
+
 # -- exceptions ---------------------------------------------------------------
 
 class ManagerUninitializedException(Exception):
@@ -84,7 +97,8 @@ class UploadManager(object):
     on disk state files.
     """
 
-    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE):
+    def __init__(self, upload_working_dir, bindings, chunk_size=DEFAULT_CHUNKSIZE,
+                 concurrency=1):
         """
         @param upload_working_dir: directory in which to store client-side files
                to track upload requests; if it doesn't exist it will be created
@@ -95,12 +109,18 @@ class UploadManager(object):
         @type  bindings: Bindings
 
         @param chunk_size: size in bytes of data to upload on each call to the
-               server
+               server; when uploading concurrently, the initial size
         @type  chunk_size: int
+
+        @param concurrency: number of upload calls to the server made at once;
+               when greater than 1, the chunk size is adapted to the speed
+               of the upload calls
+        @type  concurrency: int
         """
         self.upload_working_dir = upload_working_dir
         self.bindings = bindings
         self.chunk_size = chunk_size
+        self.concurrency = concurrency
 
         # Internal state
         self.tracker_files = {}
@@ -194,7 +214,8 @@ class UploadManager(object):
         will be invoked with the new offset in the file and the file size
         (intended to be fed into a progress indicator). As this is called
         after each upload segment call, the granularity at which it is called
-        depends on the chunk_size value for this instance.
+        depends on the chunk_size value for this instance. When uploading
+        concurrently, it is invoked with the number of bytes uploaded so far.
 
         The callback_func should have a signature of (int, int).
 
@@ -239,6 +260,11 @@ class UploadManager(object):
 
             source_file_size = os.path.getsize(tracker_file.source_filename)
 
+            if self.concurrency > 1:
+                self._upload_concurrently(tracker_file, source_file_size, callback_func)
+                return
+
+            last_save = time.time()
             f = open(tracker_file.source_filename, 'r')
             while True:
                 # Load the chunk to upload
@@ -251,10 +277,14 @@ class UploadManager(object):
                 self.bindings.uploads.upload_segment(upload_id, tracker_file.offset, data)
 
                 # Status update and callback notification
-                tracker_file.offset = min(tracker_file.offset + self.chunk_size, source_file_size)
-                tracker_file.save()
+                tracker_file.add_completed_range(tracker_file.offset, tracker_file.offset + len(data))
+                if time.time() - last_save >= TRACKER_SAVE_INTERVAL:
+                    tracker_file.save()
+                    last_save = time.time()
 
-                callback_func(tracker_file.offset, source_file_size)
+                if callback_func:
+                    callback_func(tracker_file.offset, source_file_size)
+            f.close()
 
             tracker_file.is_finished_uploading = True
         finally:
@@ -263,6 +293,88 @@ class UploadManager(object):
             tracker_file.is_running = False
             tracker_file.save()
 
+    def _upload_concurrently(self, tracker_file, source_file_size, callback_func):
+        """
+        Uploads the parts of the file not yet uploaded using concurrent calls
+        to the server. The tracker file records the ranges of the file that
+        have been uploaded and is saved periodically, so the upload can be
+        resumed if it is interrupted.
+        """
+        # OpenSSL is only safe to call from multiple threads once M2Crypto
+        # has installed its locking callbacks
+        m2threading.init()
+
+        scheduler = SegmentScheduler(tracker_file, source_file_size, self.chunk_size)
+        workers = []
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._upload_segments,
+                                      args=(tracker_file, scheduler))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+
+        try:
+            last_save = time.time()
+            reported = None
+            while True:
+                scheduler.condition.acquire()
+                try:
+                    # wake up periodically so a KeyboardInterrupt is handled
+                    if not scheduler.is_done():
+                        scheduler.condition.wait(TRACKER_SAVE_INTERVAL)
+                    done = scheduler.is_done()
+                    uploaded = tracker_file.uploaded_bytes()
+                    if done or time.time() - last_save >= TRACKER_SAVE_INTERVAL:
+                        tracker_file.save()
+                        last_save = time.time()
+                finally:
+                    scheduler.condition.release()
+
+                if callback_func and uploaded != reported:
+                    callback_func(uploaded, source_file_size)
+                    reported = uploaded
+                if done:
+                    break
+        except:
+            scheduler.abort()
+            raise
+
+        for worker in workers:
+            worker.join()
+
+        # the callbacks are left in place when interrupted above since
+        # workers may still be in the middle of a call
+        m2threading.cleanup()
+
+        if scheduler.error is not None:
+            raise scheduler.error[0], scheduler.error[1], scheduler.error[2]
+
+        tracker_file.is_finished_uploading = True
+
+    def _upload_segments(self, tracker_file, scheduler):
+        """
+        Upload worker; uploads segments handed out by the scheduler until there
+        are none left.
+        """
+        f = open(tracker_file.source_filename, 'r')
+        try:
+            while True:
+                segment = scheduler.next_segment()
+                if segment is None:
+                    break
+                offset, length = segment
+                try:
+                    f.seek(offset)
+                    data = f.read(length)
+                    start = time.time()
+                    self.bindings.uploads.upload_segment(tracker_file.upload_id, offset, data)
+                except Exception:
+                    scheduler.segment_failed(sys.exc_info())
+                    break
+                scheduler.segment_done(offset, length, time.time() - start)
+        finally:
+            f.close()
+
     def import_upload(self, upload_id):
         """
         Once the file is finished uploading, this call will request the server
@@ -394,6 +506,7 @@ class UploadTracker(object):
         self.upload_id = None
         self.location = None # URL to the upload request on the server
         self.offset = None # start of next chunk to upload
+        self.completed_ranges = [] # list of [start, end) ranges already uploaded
         self.source_filename = None # path on disk to the file to upload
 
         # Import call information
@@ -406,6 +519,54 @@ class UploadTracker(object):
         self.is_running = False
         self.is_finished_uploading = False
 
+    def add_completed_range(self, start, end):
+        """
+        Records that the given range of the file has been uploaded. The offset
+        is kept at the end of the range uploaded from the start of the file.
+
+        @param start: offset of the first uploaded byte
+        @type  start: int
+
+        @param end: offset following the last uploaded byte
+        @type  end: int
+        """
+        ranges = []
+        for r in sorted(self.completed_ranges + [[start, end]]):
+            if ranges and r[0] <= ranges[-1][1]:
+                ranges[-1] = [ranges[-1][0], max(ranges[-1][1], r[1])]
+            else:
+                ranges.append(list(r))
+
+        # replaced rather than modified so it can be saved while uploading
+        self.completed_ranges = ranges
+        if ranges and ranges[0][0] == 0:
+            self.offset = ranges[0][1]
+
+    def missing_ranges(self, file_size):
+        """
+        @param file_size: size of the file being uploaded
+        @type  file_size: int
+
+        @return: list of [start, end) ranges of the file not yet uploaded
+        @rtype:  list
+        """
+        missing = []
+        position = 0
+        for start, end in self.completed_ranges:
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+        if position < file_size:
+            missing.append([position, file_size])
+        return missing
+
+    def uploaded_bytes(self):
+        """
+        @return: number of bytes of the file uploaded so far
+        @rtype:  int
+        """
+        return sum(end - start for start, end in self.completed_ranges)
+
     def save(self):
         """
         Saves the current state of the tracker file. This will lock on the file
@@ -445,4 +606,125 @@ class UploadTracker(object):
         status_file = pickle.load(f)
         f.close()
 
+        # Trackers saved before ranges were tracked only know the offset
+        if not hasattr(status_file, 'completed_ranges'):
+            status_file.completed_ranges = []
+            if status_file.offset:
+                status_file.completed_ranges.append([0, status_file.offset])
+
         return status_file
+
+
+class SegmentScheduler(object):
+    """
+    Hands out the segments of a file still to be uploaded to concurrent upload
+    workers and records the segments they complete in the upload's tracker.
+    The size of the segments is adapted so each upload call takes about
+    TARGET_SEGMENT_SECONDS.
+    """
+
+    def __init__(self, tracker_file, file_size, chunk_size):
+        """
+        @param tracker_file: tracker of the upload
+        @type  tracker_file: UploadTracker
+
+        @param file_size: size of the file being uploaded
+        @type  file_size: int
+
+        @param chunk_size: initial size of the segments
+        @type  chunk_size: int
+        """
+        self.condition = threading.Condition()
+        self.tracker_file = tracker_file
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min(chunk_size, MIN_CHUNKSIZE)
+        self.max_chunk_size = max(chunk_size, MAX_CHUNKSIZE)
+        self.missing = tracker_file.missing_ranges(file_size)
+        self.in_flight = 0
+        self.error = None
+        self.aborted = False
+
+    def next_segment(self):
+        """
+        @return: tuple of offset and length of the next segment to upload;
+                 None if there are no more segments to upload
+        @rtype:  tuple or None
+        """
+        self.condition.acquire()
+        try:
+            if self.aborted or self.error is not None or not self.missing:
+                return None
+            start, end = self.missing[0]
+            length = min(self.chunk_size, end - start)
+            if start + length == end:
+                self.missing.pop(0)
+            else:
+                self.missing[0] = [start + length, end]
+            self.in_flight += 1
+            return start, length
+        finally:
+            self.condition.release()
+
+    def segment_done(self, offset, length, elapsed):
+        """
+        Records a segment as uploaded and adapts the segment size to the time
+        it took.
+
+        @param offset: offset of the segment
+        @type  offset: int
+
+        @param length: length of the segment
+        @type  length: int
+
+        @param elapsed: seconds the upload call took
+        @type  elapsed: float
+        """
+        self.condition.acquire()
+        try:
+            self.in_flight -= 1
+            self.tracker_file.add_completed_range(offset, offset + length)
+            # only full size segments say anything about the current size
+            if length == self.chunk_size:
+                if elapsed < TARGET_SEGMENT_SECONDS / 2.0:
+                    self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+                elif elapsed > TARGET_SEGMENT_SECONDS * 2:
+                    self.chunk_size = max(self.chunk_size / 2, self.min_chunk_size)
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def segment_failed(self, exc_info):
+        """
+        Records a failed upload call; no more segments are handed out.
+
+        @param exc_info: exception information as returned by sys.exc_info()
+        @type  exc_info: tuple
+        """
+        self.condition.acquire()
+        try:
+            self.in_flight -= 1
+            if self.error is None:
+                self.error = exc_info
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def abort(self):
+        """
+        Stops handing out segments.
+        """
+        self.condition.acquire()
+        try:
+            self.aborted = True
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def is_done(self):
+        """
+        @return: True if no segments are being uploaded and no more will be
+                 handed out
+        @rtype:  bool
+        """
+        stopped = self.aborted or self.error is not None or not self.missing
+        return stopped and self.in_flight == 0
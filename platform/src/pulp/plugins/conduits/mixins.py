@@ -129,7 +129,7 @@ class SingleRepoUnitsMixin(object):
         self.repo_id = repo_id
         self.exception_class = exception_class
 
-    def get_units(self, criteria=None):
+    def get_units(self, criteria=None, as_generator=False):
         """
         Returns the collection of content units associated with the repository
         being operated on.
@@ -141,10 +141,14 @@ class SingleRepoUnitsMixin(object):
                the Criteria class can be imported from this module
         @type  criteria: L{UnitAssociationCriteria}
 
+        @param as_generator: if true, return a generator that loads the units
+               as they are iterated instead of a list
+        @type  as_generator: bool
+
         @return: list of unit instances
-        @rtype:  list of L{AssociatedUnit}
+        @rtype:  list or generator of L{AssociatedUnit}
         """
-        return do_get_repo_units(self.repo_id, criteria, self.exception_class)
+        return do_get_repo_units(self.repo_id, criteria, self.exception_class, as_generator)
 
 
 class MultipleRepoUnitsMixin(object):
@@ -152,7 +156,7 @@ class MultipleRepoUnitsMixin(object):
     def __init__(self, exception_class):
         self.exception_class = exception_class
 
-    def get_units(self, repo_id, criteria=None):
+    def get_units(self, repo_id, criteria=None, as_generator=False):
         """
         Returns the collection of content units associated with the given
         repository.
@@ -164,10 +168,14 @@ class MultipleRepoUnitsMixin(object):
                the Criteria class can be imported from this module
         @type  criteria: L{UnitAssociationCriteria}
 
+        @param as_generator: if true, return a generator that loads the units
+               as they are iterated instead of a list
+        @type  as_generator: bool
+
         @return: list of unit instances
-        @rtype:  list of L{AssociatedUnit}
+        @rtype:  list or generator of L{AssociatedUnit}
         """
-        return do_get_repo_units(repo_id, criteria, self.exception_class)
+        return do_get_repo_units(repo_id, criteria, self.exception_class, as_generator)
 
 
 class SearchUnitsMixin(object):
@@ -593,13 +601,18 @@ class PublishReportMixin(object):
 
 # -- utilities ----------------------------------------------------------------
 
-def do_get_repo_units(repo_id, criteria, exception_class):
+def do_get_repo_units(repo_id, criteria, exception_class, as_generator=False):
     """
     Performs a repo unit association query. This is split apart so we can have
     custom mixins with different signatures.
     """
     try:
         association_query_manager = manager_factory.repo_unit_association_query_manager()
+
+        if as_generator:
+            units = association_query_manager.get_units(repo_id, criteria=criteria, as_generator=True)
+            return _transfer_units_generator(repo_id, units, exception_class)
+
         units = association_query_manager.get_units(repo_id, criteria=criteria)
 
         all_units = []
@@ -623,3 +636,21 @@ def do_get_repo_units(repo_id, criteria, exception_class):
         _LOG.exception('Exception from server requesting all content units for repository [%s]' % repo_id)
         raise exception_class(e), None, sys.exc_info()[2]
 
+
+def _transfer_units_generator(repo_id, units, exception_class):
+    """
+    Converts the units yielded by the association query into plugin transfer
+    objects as they are consumed. Type definitions are loaded the first time
+    each type is encountered.
+    """
+    type_defs = {}
+    try:
+        for unit in units:
+            type_id = unit['unit_type_id']
+            if type_id not in type_defs:
+                type_defs[type_id] = types_db.type_definition(type_id)
+            yield common_utils.to_plugin_associated_unit(unit, type_defs[type_id])
+
+    except Exception, e:
+        _LOG.exception('Exception from server requesting all content units for repository [%s]' % repo_id)
+        raise exception_class(e), None, sys.exc_info()[2]
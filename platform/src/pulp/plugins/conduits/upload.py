@@ -18,8 +18,26 @@ from pulp.plugins.conduits.mixins import (
 class UploadConduit(AddUnitMixin, SingleRepoUnitsMixin, SearchUnitsMixin):
 
     def __init__(self, repo_id, importer_id, association_owner_type,
-                 association_owner_id):
+                 association_owner_id, upload_checksums=None):
         AddUnitMixin.__init__(self, repo_id, importer_id,
                               association_owner_type, association_owner_id)
         SingleRepoUnitsMixin.__init__(self, repo_id, ImporterConduitException)
         SearchUnitsMixin.__init__(self, ImporterConduitException)
+
+        self.upload_checksums = upload_checksums or {}
+
+    def get_upload_checksum(self, checksum_type):
+        """
+        Returns the checksum of the uploaded file, if the server calculated it
+        as the file was uploaded. Importers should use it rather than reading
+        the whole file again and only calculate the checksum themselves when
+        it is not available.
+
+        @param checksum_type: checksum algorithm, as accepted by hashlib.new
+               (for example "sha256")
+        @type  checksum_type: str
+
+        @return: hex digest of the uploaded file; None if it is not available
+        @rtype:  str or None
+        """
+        return self.upload_checksums.get(checksum_type)
@@ -17,7 +17,9 @@ This module covers both the ContentType collection itself as well as any
 type-specific collections that exist to suit the type needs.
 """
 
+import copy
 import logging
+import threading
 
 from pymongo import ASCENDING
 
@@ -62,6 +64,136 @@ class MissingDefinitions(Exception):
     def __str__(self):
         return 'MissingDefinitions [%s]' % ', '.join(self.missing_type_ids)
 
+# -- type definition cache ----------------------------------------------------
+
+class TypeDefinitionCache(object):
+    """
+    In-process cache of the content type definitions and the handles to their
+    unit collections. Type definitions only change when update_database or
+    clean is run, both of which invalidate the cache; every invalidation
+    increments the cache version.
+
+    Definitions are loaded from the database in a single query the first time
+    they are needed after an invalidation. A type that is not in the cache is
+    looked up individually and, if found, added to the cache, which covers a
+    type being added by another process.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._definitions = None # type ID -> type definition SON
+        self._type_ids = None # type IDs in database order
+        self._collections = {} # type ID -> unit collection
+
+    def invalidate(self):
+        """
+        Discards all cached definitions and collection handles.
+        """
+        with self._lock:
+            self.version += 1
+            self._definitions = None
+            self._type_ids = None
+            self._collections = {}
+
+    def all_definitions(self):
+        """
+        @return: list of all cached definitions in database order; these are
+                 the cached instances and must not be modified
+        @rtype:  list of SON
+        """
+        with self._lock:
+            if self._load():
+                self.misses += 1
+            else:
+                self.hits += 1
+            return [self._definitions[t] for t in self._type_ids]
+
+    def definition(self, type_id):
+        """
+        @return: cached definition for the given type, None if not found; this
+                 is the cached instance and must not be modified
+        @rtype:  SON or None
+        """
+        with self._lock:
+            loaded = self._load()
+
+            type_def = self._definitions.get(type_id)
+            if type_def is not None:
+                if loaded:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                return type_def
+
+            self.misses += 1
+            type_def = ContentType.get_collection().find_one({'id': type_id})
+            if type_def is not None:
+                self._definitions[type_id] = type_def
+                self._type_ids.append(type_id)
+            return type_def
+
+    def units_collection(self, type_id):
+        """
+        @return: cached handle to the collection holding units of the given type
+        @rtype:  L{pymongo.collection.Collection}
+        """
+        with self._lock:
+            collection = self._collections.get(type_id)
+            if collection is not None:
+                self.hits += 1
+                return collection
+
+            self.misses += 1
+            collection_name = unit_collection_name(type_id)
+            collection = pulp_db.get_collection(collection_name, create=False)
+            self._collections[type_id] = collection
+            return collection
+
+    def statistics(self):
+        """
+        @return: cache version and hit/miss counters
+        @rtype:  dict
+        """
+        with self._lock:
+            return {'version': self.version, 'hits': self.hits, 'misses': self.misses}
+
+    def _load(self):
+        """
+        Loads all definitions if they are not already cached.
+
+        @return: True if the definitions were loaded from the database
+        @rtype:  bool
+        """
+        if self._definitions is not None:
+            return False
+
+        all_defs = list(ContentType.get_collection().find())
+        self._definitions = dict((t['id'], t) for t in all_defs)
+        self._type_ids = [t['id'] for t in all_defs]
+        return True
+
+
+_TYPE_CACHE = TypeDefinitionCache()
+
+
+def invalidate_cache():
+    """
+    Discards the cached type definitions. This only needs to be called if the
+    content_types collection is changed outside of this module.
+    """
+    _TYPE_CACHE.invalidate()
+
+
+def cache_statistics():
+    """
+    @return: current version and hit/miss counters of the type definition cache
+    @rtype:  dict
+    """
+    return _TYPE_CACHE.statistics()
+
 # -- public -------------------------------------------------------------------
 
 def update_database(definitions, error_on_missing_definitions=False):
@@ -82,6 +214,17 @@ def update_database(definitions, error_on_missing_definitions=False):
 
     LOG.info('Updating the database with types [%s]' % ', '.join(all_type_ids))
 
+    # Start from the definitions actually in the database and make sure no
+    # stale definitions survive the update, successful or not
+    _TYPE_CACHE.invalidate()
+    try:
+        _update_database(definitions, error_on_missing_definitions)
+    finally:
+        _TYPE_CACHE.invalidate()
+
+
+def _update_database(definitions, error_on_missing_definitions):
+
     # Get a list of all type collections now so we can figure out which
     # previously existed but are not in the new list
     existing_type_names = [t[len(TYPE_COLLECTION_PREFIX):] for t in all_type_collection_names()]
@@ -152,6 +295,8 @@ def clean():
     type_collection = ContentType.get_collection()
     type_collection.remove(safe=True)
 
+    _TYPE_CACHE.invalidate()
+
 
 def type_units_collection(type_id):
     """
@@ -163,9 +308,7 @@ def type_units_collection(type_id):
     @return: database collection holding units of the given type
     @rtype:  L{pymongo.collection.Collection}
     """
-    collection_name = unit_collection_name(type_id)
-    collection = pulp_db.get_collection(collection_name, create=False)
-    return collection
+    return _TYPE_CACHE.units_collection(type_id)
 
 
 def all_type_ids():
@@ -175,10 +318,7 @@ def all_type_ids():
     @rtype:  list of str
     """
 
-    collection = ContentType.get_collection()
-    type_id_son = list(collection.find(fields={'id' : 1}))
-    type_ids = [t['id'] for t in type_id_son]
-
+    type_ids = [t['id'] for t in _TYPE_CACHE.all_definitions()]
     return type_ids
 
 
@@ -188,12 +328,9 @@ def all_type_collection_names():
     @rtype:  list of str
     """
 
-    collection = ContentType.get_collection()
-    type_ids = list(collection.find(fields={'id' : 1}))
-
     type_collection_names = []
-    for id in type_ids:
-        type_collection_names.append(unit_collection_name(id['id']))
+    for type_def in _TYPE_CACHE.all_definitions():
+        type_collection_names.append(unit_collection_name(type_def['id']))
 
     return type_collection_names
 
@@ -204,8 +341,7 @@ def all_type_definitions():
     @rtype:  list of dict
     """
 
-    coll = ContentType.get_collection()
-    types = list(coll.find())
+    types = copy.deepcopy(_TYPE_CACHE.all_definitions())
     return types
 
 
@@ -217,8 +353,7 @@ def type_definition(type_id):
     @return: corresponding type definition, None if not found
     @rtype: SON or None
     """
-    collection = ContentType.get_collection()
-    type_ = collection.find_one({'id': type_id})
+    type_ = copy.deepcopy(_TYPE_CACHE.definition(type_id))
     return type_
 
 
@@ -246,11 +381,10 @@ def type_units_unit_key(type_id):
              content type collection
     @rtype: list of str or None
     """
-    collection = ContentType.get_collection()
-    type_def = collection.find_one({'id': type_id})
+    type_def = _TYPE_CACHE.definition(type_id)
     if type_def is None:
         return None
-    return type_def['unit_key']
+    return copy.copy(type_def['unit_key'])
 
 # -- private -----------------------------------------------------------------
 
@@ -274,6 +408,8 @@ def _create_or_update_type(type_def):
     # XXX this still causes a potential race condition when 2 users are updating the same type
     content_type_collection.save(content_type, safe=True)
 
+    _TYPE_CACHE.invalidate()
+
 def _update_indexes(type_def, unique):
 
     collection_name = unit_collection_name(type_def.id)
@@ -34,11 +34,15 @@ _default_values = {
         'repo_sync_history': '60',
         'repo_publish_history': '60',
         'repo_group_publish_history': '60',
+        'archived_calls_max': '0',
+        'batch_size': '1000',
+        'batch_pause': '0.1',
     },
     'database': {
         'name': 'pulp_database',
         'seeds': 'localhost:27017',
         'operation_retries': '2',
+        'operation_timing': 'false',
     },
     'email': {
         'host': 'localhost',
@@ -71,6 +75,7 @@ _default_values = {
     },
     'scheduler': {
         'dispatch_interval': '30',
+        'batched': 'false',
     },
     'security': {
         'cacert': '/etc/pki/pulp/ca.crt',
@@ -95,6 +100,8 @@ _default_values = {
         'create_weight': '0',
         'publish_weight': '1',
         'sync_weight': '2',
+        'archive_buffer_size': '0',
+        'archive_flush_interval': '5',
     },
 }
 
@@ -12,6 +12,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import logging
+import threading
 import time
 from gettext import gettext as _
 
@@ -29,6 +30,14 @@ from pulp.server.exceptions import PulpException
 _connection = None
 _database = None
 
+# Per-process registry of collection handles by name; handles are only bound
+# to the database, so they are shared and rebuilt when it is re-initialized
+_collections = {}
+_collections_lock = threading.Lock()
+
+# Whether PulpCollection operations are timed
+_operation_timing = False
+
 _log = logging.getLogger(__name__)
 
 # connection api ---------------------------------------------------------------
@@ -37,7 +46,7 @@ def initialize(name=None, seeds=None):
     """
     Initialize the connection pool and top-level database for pulp.
     """
-    global _connection, _database
+    global _connection, _database, _operation_timing
     try:
         if not name:
             name = config.config.get('database', 'name')
@@ -48,12 +57,15 @@ def initialize(name=None, seeds=None):
         _database = getattr(_connection, name)
         _database.add_son_manipulator(NamespaceInjector())
         _database.add_son_manipulator(AutoReference(_database))
+        _operation_timing = config.config.getboolean('database', 'operation_timing')
         _log.info("Database connection established with: seeds = %s, name = %s" % (seeds, name))
     except Exception:
         _log.critical('Database initialization failed')
         _connection = None
         _database = None
         raise
+    finally:
+        _reset_collections()
 
 # collection wrapper class -----------------------------------------------------
 
@@ -66,30 +78,67 @@ class PulpCollectionFailure(PulpException):
 
 def _retry_decorator(method):
     """
-    Collection instance method decorator providing retry support for pymongo
-    AutoReconnect exceptions
+    Collection method decorator providing retry support for pymongo
+    AutoReconnect exceptions and, if enabled, timing of the operation
     """
-    # 'self' is not passed into the method below as the super call in the
-    # constructor has already bound self to the method
-    self = method.im_self
+    name = method.__name__
     @wraps(method)
-    def retry(*args, **kwargs):
+    def retry(self, *args, **kwargs):
+        if _operation_timing:
+            start = time.time()
         tries = 0
         while tries <= self.retries:
             try:
-                return method(*args, **kwargs)
+                result = method(self, *args, **kwargs)
+                if _operation_timing:
+                    self.timing.record(name, time.time() - start)
+                return result
             except AutoReconnect:
                 tries += 1
                 _log.warn(_('%s operation failed on %s: tries remaining: %d') %
-                          (method.__name__, self.full_name, self.retries - tries + 1))
+                          (name, self.full_name, self.retries - tries + 1))
                 if tries <= self.retries:
                     time.sleep(0.3)
         raise PulpCollectionFailure(
             _('%s operation failed on %s: database connection still down after %d tries') %
-            (method.__name__, self.full_name, (self.retries + 1)))
+            (name, self.full_name, (self.retries + 1)))
     return retry
 
 
+class OperationTiming(object):
+    """
+    Per operation count, total and maximum latency of the operations on a
+    collection. Note that find only creates the cursor; the time spent
+    iterating over the results is not included.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def record(self, operation, elapsed):
+        with self._lock:
+            timing = self._operations.get(operation)
+            if timing is None:
+                timing = self._operations[operation] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            timing['count'] += 1
+            timing['total'] += elapsed
+            timing['max'] = max(timing['max'], elapsed)
+
+    def statistics(self):
+        """
+        @return: dict of operation name to dict of count, total and max
+                 latency in seconds
+        @rtype:  dict
+        """
+        with self._lock:
+            return dict((o, dict(t)) for o, t in self._operations.items())
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
 class PulpCollection(Collection):
     """
     pymongo.collection.Collection wrapper that provides support for retries when
@@ -99,13 +148,12 @@ class PulpCollection(Collection):
     _retry_methods = ('insert', 'save', 'update', 'remove', 'drop', 'find',
                       'find_one', 'count', 'create_index', 'ensure_index',
                       'drop_index', 'drop_indexes', 'group', 'rename',
-                      'map_reduce')
+                      'map_reduce', 'aggregate')
 
     def __init__(self, database, name, create=False, retries=0, **kwargs):
         super(PulpCollection, self).__init__(database, name, create=create, **kwargs)
         self.retries = retries
-        for m in self._retry_methods:
-            setattr(self, m, _retry_decorator(getattr(self, m)))
+        self.timing = OperationTiming()
 
     def __getstate__(self):
         return {'name': self.name}
@@ -131,18 +179,63 @@ class PulpCollection(Collection):
             cursor.limit(criteria.limit)
         return cursor
 
+# the retry support is added once to the class rather than to every instance
+for _method in PulpCollection._retry_methods:
+    # aggregate is only available as of pymongo 2.3
+    if hasattr(Collection, _method):
+        setattr(PulpCollection, _method, _retry_decorator(getattr(Collection, _method).im_func))
+
 # -- public --------------------------------------------------------------------
 
 def get_collection(name, create=False):
     """
-    Factory function to instantiate PulpConnection objects using configurable
-    parameters.
+    Factory function to retrieve PulpCollection objects using configurable
+    parameters. Collection handles are created once per process and shared.
     """
     global _database
     if _database is None:
         raise PulpCollectionFailure(_('Cannot get collection from uninitialized database'))
-    retries = config.config.getint('database', 'operation_retries')
-    return PulpCollection(_database, name, retries=retries, create=create)
+    collection = _collections.get(name)
+    if collection is not None and not create:
+        return collection
+    with _collections_lock:
+        collection = _collections.get(name)
+        if collection is None or create:
+            retries = config.config.getint('database', 'operation_retries')
+            collection = PulpCollection(_database, name, retries=retries, create=create)
+            _collections[name] = collection
+        return collection
+
+def operation_timing_statistics():
+    """
+    Returns the operation timing counters of the collections retrieved through
+    get_collection. Operations are only timed if the operation_timing option
+    of the database section of the server configuration is enabled.
+    @return: dict of collection name to dict of operation name to dict of
+             count, total and max latency in seconds
+    @rtype:  dict
+    """
+    with _collections_lock:
+        collections = _collections.items()
+    statistics = {}
+    for name, collection in collections:
+        timing = collection.timing.statistics()
+        if timing:
+            statistics[name] = timing
+    return statistics
+
+def reset_operation_timing():
+    """
+    Resets the operation timing counters of all collections.
+    """
+    with _collections_lock:
+        collections = _collections.values()
+    for collection in collections:
+        collection.timing.reset()
+
+def _reset_collections():
+    with _collections_lock:
+        _collections.clear()
 
 def database():
     """
@@ -73,7 +73,7 @@ class ScheduledCall(Model):
 
     collection_name = 'scheduled_calls'
     unique_indices = ()
-    search_indices = ('serialized_call_request.tags', 'last_run', 'next_run')
+    search_indices = ('serialized_call_request.tags', 'last_run', 'next_run', 'claim_id')
 
     def __init__(self, call_request, schedule, failure_threshold=None, last_run=None, enabled=True):
         super(ScheduledCall, self).__init__()
@@ -114,5 +114,22 @@ class ArchivedCall(Model):
         self.timestamp = dateutils.now_utc_timestamp()
         self.call_request_string = str(call_request)
         self.serialized_call_report = call_report.serialize()
+        # set when the result is stored separately in an ArchivedCallResult
+        self.result_archived = False
+
+
+class ArchivedCallResult(Model):
+    """
+    Result of an archived call, stored apart from the call summary
+    """
+
+    collection_name = 'archived_call_results'
+    unique_indices = ()
+    search_indices = ('call_request_id',)
+
+    def __init__(self, call_request_id, result):
+        super(ArchivedCallResult, self).__init__()
+        self.call_request_id = call_request_id
+        self.result = result
 
 
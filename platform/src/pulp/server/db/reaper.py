@@ -35,15 +35,28 @@ class CollectionsReaper(object):
     If any documents in a collection have a custom _id field, this reaper will
     not work with that collection.
 
+    Old documents are removed in batches of at most batch_size documents, with
+    a pause of batch_pause seconds between batches, so that reaping a large
+    collection does not stall the database.
+
     :ivar reap_interval: time, in seconds, between checks for old documents
     :type reap_interval: int or float
+    :ivar batch_size: maximum number of documents removed at once
+    :type batch_size: int
+    :ivar batch_pause: time, in seconds, to wait between batches
+    :type batch_pause: int or float
     :ivar collections: dictionary of collections and the time delta which constitutes an old document
     :type collections: dict
+    :ivar collection_limits: dictionary of collections and the maximum number of documents to keep
+    :type collection_limits: dict
     """
 
-    def __init__(self, reap_interval):
+    def __init__(self, reap_interval, batch_size=1000, batch_pause=0):
         self.reap_interval = reap_interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
         self.collections = {}
+        self.collection_limits = {}
 
         self.__exit = False
         self.__lock = threading.RLock()
@@ -70,7 +83,11 @@ class CollectionsReaper(object):
     def _reap_expired_collection_entries(self):
         for collection, delta in self.collections.items():
             expired_object_id = self._create_expired_object_id(delta)
-            self._remove_expired_entries(collection, expired_object_id)
+            if not self._remove_expired_entries(collection, expired_object_id):
+                return
+        for collection, max_documents in self.collection_limits.items():
+            if not self._remove_excess_entries(collection, max_documents):
+                return
 
     def _create_expired_object_id(self, delta):
         now = datetime.now(dateutils.utc_tz())
@@ -79,7 +96,58 @@ class CollectionsReaper(object):
         return expired_object_id
 
     def _remove_expired_entries(self, collection, expired_object_id):
-        collection.remove({'_id': {'$lte': expired_object_id}})
+        """
+        Remove the documents created up to the time in the given ObjectId,
+        oldest first, in batches.
+
+        :return: False if the reaper was stopped before all of the documents
+                 were removed, True otherwise
+        :rtype: bool
+        """
+        query = {'_id': {'$lte': expired_object_id}}
+        while True:
+            cursor = collection.find(query, fields=['_id']).sort('_id', 1).skip(self.batch_size - 1).limit(1)
+            last = list(cursor)
+            if not last:
+                # the rest fits in a single batch
+                collection.remove(query, safe=True)
+                return True
+            collection.remove({'_id': {'$lte': last[0]['_id']}}, safe=True)
+            if not self._pause():
+                return False
+
+    def _remove_excess_entries(self, collection, max_documents):
+        """
+        Remove the oldest documents of a collection that has more than the
+        given number of documents.
+
+        :return: False if the reaper was stopped before all of the documents
+                 were removed, True otherwise
+        :rtype: bool
+        """
+        excess = collection.count() - max_documents
+        if excess <= 0:
+            return True
+        cursor = collection.find(fields=['_id']).sort('_id', 1).skip(excess - 1).limit(1)
+        last = list(cursor)
+        if not last:
+            return True
+        return self._remove_expired_entries(collection, last[0]['_id'])
+
+    def _pause(self):
+        """
+        Wait between batches without keeping the reaper from being stopped.
+
+        :return: False if the reaper is being stopped, True otherwise
+        :rtype: bool
+        """
+        self.__lock.acquire()
+        try:
+            if self.batch_pause > 0 and not self.__exit:
+                self.__condition.wait(timeout=self.batch_pause)
+            return not self.__exit
+        finally:
+            self.__lock.release()
 
     def start(self):
         """
@@ -140,6 +208,25 @@ class CollectionsReaper(object):
         self.__lock.acquire()
         try:
             self.collections.pop(collection, None)
+            self.collection_limits.pop(collection, None)
+        finally:
+            self.__lock.release()
+
+    def limit_collection(self, collection, max_documents):
+        """
+        Keep at most the given number of documents in a collection, reaping the
+        oldest documents first.
+        :param collection: database collection to limit
+        :type collection: pymongo.collection.Collection
+        :param max_documents: maximum number of documents to keep; None for no limit
+        :type max_documents: int or None
+        """
+        self.__lock.acquire()
+        try:
+            if max_documents is None:
+                self.collection_limits.pop(collection, None)
+            else:
+                self.collection_limits[collection] = max_documents
         finally:
             self.__lock.release()
 
@@ -153,15 +240,21 @@ def initialize():
     global _REAPER
     assert _REAPER is None
     reaper_interval = pulp_config.config.getfloat('data_reaping', 'reaper_interval')
-    _REAPER = CollectionsReaper(int(reaper_interval * dateutils.SECONDS_IN_A_DAY))
+    batch_size = pulp_config.config.getint('data_reaping', 'batch_size')
+    batch_pause = pulp_config.config.getfloat('data_reaping', 'batch_pause')
+    _REAPER = CollectionsReaper(int(reaper_interval * dateutils.SECONDS_IN_A_DAY), batch_size, batch_pause)
     _REAPER.start()
 
     # NOTE add collections to reap here:
 
-    # dispatch archived calls
-    archive_call_collection = dispatch.ArchivedCall.get_collection()
+    # dispatch archived calls and their results
     archived_call_lifetime = pulp_config.config.getfloat('data_reaping', 'archived_calls')
-    _REAPER.add_collection(archive_call_collection, days=archived_call_lifetime)
+    archived_calls_max = pulp_config.config.getint('data_reaping', 'archived_calls_max')
+    for archive_collection in (dispatch.ArchivedCall.get_collection(),
+                               dispatch.ArchivedCallResult.get_collection()):
+        _REAPER.add_collection(archive_collection, days=archived_call_lifetime)
+        if archived_calls_max > 0:
+            _REAPER.limit_collection(archive_collection, archived_calls_max)
 
     # consumer event history
     consumer_event_collection = consumer.ConsumerHistoryEvent.get_collection()
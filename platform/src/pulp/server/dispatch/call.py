@@ -23,13 +23,19 @@ from pulp.common import dateutils
 from pulp.common.util import encode_unicode
 from pulp.server.db.model.auth import User
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import serialization
 from pulp.server.managers import factory as managers_factory
+from pulp.server.managers.auth.user.system import SystemUser
 
 
 _LOG = logging.getLogger(__name__)
 
 OBFUSCATED_VALUE = '****'
 
+# version of the serialized call request format; records without a version
+# have all of their non-copied fields pickled
+SERIALIZATION_VERSION = 2
+
 # call request class -----------------------------------------------------------
 
 class CallRequest(object):
@@ -200,20 +206,28 @@ class CallRequest(object):
         @rtype: dict
         """
 
-        data = {'callable_name': self.callable_name()}
+        data = {'callable_name': self.callable_name(),
+                'serialization_version': SERIALIZATION_VERSION}
 
         for field in self.copied_fields:
             data[field] = getattr(self, field)
 
-        for field in self.pickled_fields:
-            try:
-                data[field] = pickle.dumps(getattr(self, field))
+        # callables are stored by name and arguments as they are, whenever
+        # possible, falling back to pickling them otherwise
+        try:
+            data['call'] = serialization.encode_callable(self.call)
+            data['args'] = serialization.encode_value(self.args)
+            data['kwargs'] = serialization.encode_value(self.kwargs)
+            data['principal'] = serialization.encode_value(self.principal)
+            data['execution_hooks'] = [[serialization.encode_callable(h) for h in hooks]
+                                       for hooks in self.execution_hooks]
+            data['control_hooks'] = [serialization.encode_callable(h) for h in self.control_hooks]
 
-            except Exception, e:
-                msg =_('Exception encountered while pickling: %(f)s') % {'f': field}
-                _LOG.error(msg)
-                _LOG.exception(e)
-                return None
+        except Exception, e:
+            msg = _('Exception encountered while serializing: %(c)s') % {'c': data['callable_name']}
+            _LOG.error(msg)
+            _LOG.exception(e)
+            return None
 
         return data
 
@@ -232,13 +246,25 @@ class CallRequest(object):
 
         constructor_kwargs = dict(data)
         constructor_kwargs.pop('callable_name', None) # added for search
+        version = constructor_kwargs.pop('serialization_version', 1)
 
         for key, value in constructor_kwargs.items():
             constructor_kwargs[encode_unicode(key)] = constructor_kwargs.pop(key)
 
         try:
-            for field in cls.pickled_fields:
-                constructor_kwargs[field] = pickle.loads(data[field].encode('ascii'))
+            if version < SERIALIZATION_VERSION:
+                for field in cls.pickled_fields:
+                    constructor_kwargs[field] = pickle.loads(data[field].encode('ascii'))
+
+            else:
+                constructor_kwargs['call'] = serialization.decode_callable(data['call'])
+                constructor_kwargs['args'] = serialization.decode_value(data['args'])
+                constructor_kwargs['kwargs'] = _encode_keys(serialization.decode_value(data['kwargs']))
+                constructor_kwargs['principal'] = _principal(serialization.decode_value(data['principal']))
+                constructor_kwargs['execution_hooks'] = [[serialization.decode_callable(h) for h in hooks]
+                                                         for hooks in data['execution_hooks']]
+                constructor_kwargs['control_hooks'] = [serialization.decode_callable(h)
+                                                       for h in data['control_hooks']]
 
         except Exception, e:
             _LOG.exception(e)
@@ -272,6 +298,18 @@ class CallRequest(object):
 
         return instance
 
+
+def _encode_keys(kwargs):
+    # keyword argument names loaded from the database are unicode
+    return dict((encode_unicode(k), v) for k, v in kwargs.items())
+
+
+def _principal(principal):
+    # the system user is a singleton that is compared by identity
+    if isinstance(principal, dict) and principal == SystemUser():
+        return SystemUser()
+    return principal
+
 # call report class ------------------------------------------------------------
 
 class CallReport(object):
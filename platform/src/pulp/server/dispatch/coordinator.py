@@ -14,7 +14,7 @@
 import copy
 import datetime
 import logging
-import time
+import threading
 import types
 import uuid
 from gettext import gettext as _
@@ -39,13 +39,103 @@ _VALID_SEARCH_CRITERIA = frozenset(('call_request_id', 'call_request_group_id',
                                     'resources', 'tags'))
 
 
+# resource lock table ----------------------------------------------------------
+
+class ResourceLockTable(object):
+    """
+    In-memory mirror of the call resources collection, indexed by resource,
+    used to detect conflicting operations without querying the database.
+    The call resources collection remains the persisted record; every write to
+    it must also be applied here.
+    """
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        # (resource_type, resource_id) -> {call_request_id: operation}
+        self.__locks = {}
+        # call_request_id -> list of (resource_type, resource_id)
+        self.__resources_by_call_request = {}
+
+    def add(self, call_resources):
+        """
+        Record the resource operations held by queued call requests.
+        @param call_resources: call resources with their call_request_id set
+        @type  call_resources: iterable of L{CallResource} instances or dicts
+        """
+        self.__lock.acquire()
+        try:
+            for call_resource in call_resources:
+                key = (call_resource['resource_type'], call_resource['resource_id'])
+                call_request_id = call_resource['call_request_id']
+                self.__locks.setdefault(key, {})[call_request_id] = call_resource['operation']
+                self.__resources_by_call_request.setdefault(call_request_id, []).append(key)
+        finally:
+            self.__lock.release()
+
+    def remove(self, call_request_id):
+        """
+        Drop all of the resource operations held by the given call request.
+        @param call_request_id: id of the call request to release
+        @type  call_request_id: str
+        """
+        self.__lock.acquire()
+        try:
+            for key in self.__resources_by_call_request.pop(call_request_id, []):
+                holders = self.__locks.get(key)
+                if holders is None:
+                    continue
+                holders.pop(call_request_id, None)
+                if not holders:
+                    self.__locks.pop(key)
+        finally:
+            self.__lock.release()
+
+    def clear(self):
+        """
+        Drop all of the recorded resource operations.
+        """
+        self.__lock.acquire()
+        try:
+            self.__locks.clear()
+            self.__resources_by_call_request.clear()
+        finally:
+            self.__lock.release()
+
+    def find(self, resource_type, resource_id):
+        """
+        Find the queued operations on the given resource.
+        @param resource_type: type of the resource
+        @type  resource_type: str
+        @param resource_id: id of the resource
+        @type  resource_id: str
+        @return: list of (call_request_id, operation) tuples
+        @rtype:  list
+        """
+        self.__lock.acquire()
+        try:
+            return self.__locks.get((resource_type, resource_id), {}).items()
+        finally:
+            self.__lock.release()
+
+    def __len__(self):
+        self.__lock.acquire()
+        try:
+            return len(self.__locks)
+        finally:
+            self.__lock.release()
+
+
+_RESOURCE_LOCK_TABLE = ResourceLockTable()
+
 # coordinator class ------------------------------------------------------------
 
 class Coordinator(object):
     """
     Coordinator class that runs call requests in the task queue and detects and
     resolves conflicting operations on resources.
-    @ivar task_state_poll_interval: sleep interval to use while polling a "synchronous" task
+    @ivar task_state_poll_interval: no longer used, synchronous tasks signal
+                                    their completion; kept for configuration
+                                    compatibility
     @type task_state_poll_interval: float
     """
 
@@ -53,6 +143,7 @@ class Coordinator(object):
 
         self.task_state_poll_interval = task_state_poll_interval
         self.call_resource_collection = CallResource.get_collection()
+        self.resource_lock_table = _RESOURCE_LOCK_TABLE
 
     # explicit initialization --------------------------------------------------
 
@@ -63,6 +154,7 @@ class Coordinator(object):
         """
         # drop all previous knowledge of previous calls
         self.call_resource_collection.remove(safe=True)
+        self.resource_lock_table.clear()
 
         # re-start interrupted tasks
         queued_call_collection = QueuedCall.get_collection()
@@ -248,6 +340,7 @@ class Coordinator(object):
 
             if call_resource_list:
                 self.call_resource_collection.insert(call_resource_list, safe=True)
+                self.resource_lock_table.add(call_resource_list)
 
             for task in task_list:
                 task_queue.enqueue(task)
@@ -266,19 +359,18 @@ class Coordinator(object):
         """
         task_queue = dispatch_factory._task_queue()
         valid_states = [dispatch_constants.CALL_RUNNING_STATE]
-        # it's perfectly legitimate for the call to complete before the first poll
+        # it's perfectly legitimate for the call to complete before we start waiting
         valid_states.extend(dispatch_constants.CALL_COMPLETE_STATES)
 
         try:
-            wait_for_task(task, valid_states, poll_interval=self.task_state_poll_interval, timeout=timeout)
+            wait_for_task(task, valid_states, timeout=timeout)
 
         except OperationTimedOut:
             task_queue.dequeue(task) # dequeue or cancel? really need timed out support
             raise
 
         else:
-            wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES,
-                          poll_interval=self.task_state_poll_interval)
+            wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES)
 
     def _generate_call_request_group_id(self):
         """
@@ -338,35 +430,44 @@ class Coordinator(object):
         postponing_reasons = []
         rejecting_call_requests = set()
         rejecting_reasons = []
+        # (resource_type, resource_id, operation) of reasons already recorded
+        postponing_reason_keys = set()
+        rejecting_reason_keys = set()
 
-        call_resource_collection = CallResource.get_collection()
         call_resources = resource_dict_to_call_resources(resources)
-        or_query = filter_dicts(call_resources, ('resource_type', 'resource_id'))
-        cursor = call_resource_collection.find({'$or': or_query})
 
-        for call_resource in cursor:
-            proposed_operation = resources[call_resource['resource_type']][call_resource['resource_id']]
-            queued_operation = call_resource['operation']
+        for call_resource in call_resources:
+            resource_type = call_resource['resource_type']
+            resource_id = call_resource['resource_id']
+            queued_operations = self.resource_lock_table.find(resource_type, resource_id)
 
-            postponing_operations = get_postponing_operations(proposed_operation)
+            if not queued_operations:
+                continue
 
-            if queued_operation in postponing_operations:
-                postponing_call_requests.add(call_resource['call_request_id'])
-                reason = filter_dicts([call_resource], ('resource_type', 'resource_id'))[0]
-                reason['operation'] = queued_operation
+            proposed_operation = call_resource['operation']
+            postponing_operations = get_postponing_operations(proposed_operation)
+            rejecting_operations = get_rejecting_operations(proposed_operation)
 
-                if reason not in postponing_reasons:
-                    postponing_reasons.append(reason)
+            for call_request_id, queued_operation in queued_operations:
+                if queued_operation in postponing_operations:
+                    postponing_call_requests.add(call_request_id)
+                    reason_key = (resource_type, resource_id, queued_operation)
 
-            rejecting_operations = get_rejecting_operations(proposed_operation)
+                    if reason_key not in postponing_reason_keys:
+                        postponing_reason_keys.add(reason_key)
+                        postponing_reasons.append({'resource_type': resource_type,
+                                                   'resource_id': resource_id,
+                                                   'operation': queued_operation})
 
-            if queued_operation in rejecting_operations:
-                rejecting_call_requests.add(call_resource['call_request_id'])
-                reason = filter_dicts([call_resource], ('resource_type', 'resource_id'))[0]
-                reason['operation'] = queued_operation
+                if queued_operation in rejecting_operations:
+                    rejecting_call_requests.add(call_request_id)
+                    reason_key = (resource_type, resource_id, queued_operation)
 
-                if reason not in rejecting_reasons:
-                    rejecting_reasons.append(reason)
+                    if reason_key not in rejecting_reason_keys:
+                        rejecting_reason_keys.add(reason_key)
+                        rejecting_reasons.append({'resource_type': resource_type,
+                                                  'resource_id': resource_id,
+                                                  'operation': queued_operation})
 
         if rejecting_call_requests:
             return dispatch_constants.CALL_REJECTED_RESPONSE, rejecting_call_requests, rejecting_reasons, call_resources
@@ -430,7 +531,16 @@ class Coordinator(object):
         tasks = []
         task_queue = dispatch_factory._task_queue()
 
-        for task in task_queue.all_tasks():
+        # narrow the candidates down using the task queue indexes when possible
+        if 'call_request_id' in criteria:
+            task = task_queue.get(criteria['call_request_id'])
+            candidate_tasks = task is not None and [task] or []
+        elif criteria.get('tags'):
+            candidate_tasks = task_queue.find(*criteria['tags'])
+        else:
+            candidate_tasks = task_queue.all_tasks()
+
+        for task in candidate_tasks:
             if task_matches_criteria(task, criteria):
                 tasks.append(task)
 
@@ -611,31 +721,23 @@ def set_call_request_id_on_call_resources(call_request_id, call_resources):
         call_resource['call_request_id'] = call_request_id
 
 
-def wait_for_task(task, states, poll_interval=0.5, timeout=None):
+def wait_for_task(task, states, timeout=None):
     """
     Wait for a task to be in a certain set of states
+    The task signals every state transition, so this returns as soon as the
+    task reaches one of the states instead of polling it.
     @param task: task to wait for
     @type  task: L{Task}
     @param states: set of valid states
     @type  states: list or tuple
-    @param poll_interval: time, in seconds, to wait in between polling the task
-    @type  poll_interval: float or int
-    @param timeout: maximum amount of time to poll task, None means indefinitely
+    @param timeout: maximum amount of time to wait for the task, None means indefinitely
     @type  timeout: None or datetime.timedelta
     """
     assert isinstance(task, Task)
     assert isinstance(states, (list, set, tuple))
-    assert isinstance(poll_interval, (float, int))
     assert isinstance(timeout, (datetime.timedelta, types.NoneType))
 
-    start = datetime.datetime.now()
-    while task.call_report.state not in states:
-        time.sleep(poll_interval)
-        if timeout is None:
-            continue
-        now = datetime.datetime.now()
-        if now - start < timeout:
-            continue
+    if not task.wait_for_state(states, timeout):
         raise OperationTimedOut(timeout)
 
 # query utility functions ------------------------------------------------------
@@ -686,4 +788,5 @@ def coordinator_dequeue_callback(call_request, call_report):
     """
     collection = CallResource.get_collection()
     collection.remove({'call_request_id': call_request.id}, safe=True)
+    _RESOURCE_LOCK_TABLE.remove(call_request.id)
 
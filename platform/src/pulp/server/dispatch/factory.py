@@ -36,7 +36,8 @@ def _initialize_scheduler():
     assert _SCHEDULER is None
     from pulp.server.dispatch.scheduler import Scheduler
     dispatch_interval = pulp_config.config.getfloat('scheduler', 'dispatch_interval')
-    _SCHEDULER = Scheduler(dispatch_interval)
+    batched = pulp_config.config.getboolean('scheduler', 'batched')
+    _SCHEDULER = Scheduler(dispatch_interval, batched)
     _SCHEDULER.start()
 
 
@@ -54,6 +55,8 @@ def initialize():
     # order sensitive
     from pulp.server.dispatch import pickling
     pickling.initialize()
+    from pulp.server.dispatch import history
+    history.initialize()
     _initialize_task_queue()
     _initialize_coordinator()
     _initialize_scheduler()
@@ -87,6 +90,8 @@ def finalize(clear_queued_calls=False):
     _finalize_scheduler()
     _finalize_coordinator()
     _finalize_task_queue(clear_queued_calls)
+    from pulp.server.dispatch import history
+    history.finalize()
 
 # factory functions ------------------------------------------------------------
 
@@ -11,7 +11,114 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
-from pulp.server.db.model.dispatch import ArchivedCall
+import logging
+import threading
+
+from pulp.server import config as pulp_config
+from pulp.server.db.model.dispatch import ArchivedCall, ArchivedCallResult
+
+
+_LOG = logging.getLogger(__name__)
+
+_ARCHIVE_BUFFER = None
+
+# archive buffer ---------------------------------------------------------------
+
+class ArchiveBuffer(object):
+    """
+    Buffer of archived calls that are inserted into the database in batches,
+    once the buffer is full or once the oldest buffered call has waited for the
+    flush interval.
+
+    :ivar size: maximum number of buffered calls
+    :type size: int
+    :ivar flush_interval: maximum time, in seconds, a call stays buffered
+    :type flush_interval: int or float
+    """
+
+    def __init__(self, size, flush_interval):
+        self.size = size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._archived_calls = []
+        self._archived_results = []
+        self._timer = None
+
+    def add(self, archived_call, archived_result=None):
+        """
+        Buffer an archived call and, optionally, its separately stored result.
+
+        :param archived_call: archived call summary
+        :type archived_call: pulp.server.db.model.dispatch.ArchivedCall
+        :param archived_result: archived call result
+        :type archived_result: pulp.server.db.model.dispatch.ArchivedCallResult or None
+        """
+        with self._lock:
+            self._archived_calls.append(archived_call)
+            if archived_result is not None:
+                self._archived_results.append(archived_result)
+
+            if len(self._archived_calls) >= self.size:
+                self.flush()
+
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.setDaemon(True)
+                self._timer.start()
+
+    def flush(self):
+        """
+        Insert all of the buffered calls into the database.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            archived_calls = self._archived_calls
+            archived_results = self._archived_results
+            self._archived_calls = []
+            self._archived_results = []
+
+            try:
+                # insert the results first so that every summary can find its result
+                if archived_results:
+                    ArchivedCallResult.get_collection().insert(archived_results, safe=True)
+                if archived_calls:
+                    ArchivedCall.get_collection().insert(archived_calls, safe=True)
+
+            except Exception, e:
+                _LOG.error('Failed to archive %d calls' % len(archived_calls))
+                _LOG.exception(e)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._archived_calls)
+
+# archive initialization -------------------------------------------------------
+
+def initialize():
+    """
+    Set up buffering of archived calls, if it is configured.
+    """
+    global _ARCHIVE_BUFFER
+    buffer_size = pulp_config.config.getint('tasks', 'archive_buffer_size')
+    if buffer_size <= 0:
+        return
+    flush_interval = pulp_config.config.getfloat('tasks', 'archive_flush_interval')
+    _ARCHIVE_BUFFER = ArchiveBuffer(buffer_size, flush_interval)
+
+
+def finalize():
+    """
+    Write out any buffered archived calls and stop buffering.
+    """
+    global _ARCHIVE_BUFFER
+    if _ARCHIVE_BUFFER is None:
+        return
+    _ARCHIVE_BUFFER.flush()
+    _ARCHIVE_BUFFER = None
 
 # public api -------------------------------------------------------------------
 
@@ -19,14 +126,33 @@ def archive_call(call_request, call_report):
     """
     Store a completed call request in the database.
 
+    The call summary and the call result are stored separately, so that
+    searching and reaping the summaries does not have to go through the
+    results.
+
     :param call_request: call request to store
     :type call_request: pulp.server.dispatch.call.CallRequest
     :param call_report: call report corresponding to the call request
     :type call_report: pulp.server.dispatch.call.CallReport
     """
     archived_call = ArchivedCall(call_request, call_report)
-    collection = ArchivedCall.get_collection()
-    collection.insert(archived_call, safe=True)
+    serialized_call_report = archived_call['serialized_call_report']
+
+    archived_result = None
+    if serialized_call_report['result'] is not None:
+        archived_result = ArchivedCallResult(serialized_call_report['call_request_id'],
+                                             serialized_call_report['result'])
+        serialized_call_report['result'] = None
+        archived_call['result_archived'] = True
+
+    archive_buffer = _ARCHIVE_BUFFER
+    if archive_buffer is not None:
+        archive_buffer.add(archived_call, archived_result)
+        return
+
+    if archived_result is not None:
+        ArchivedCallResult.get_collection().insert(archived_result, safe=True)
+    ArchivedCall.get_collection().insert(archived_call, safe=True)
 
 
 def find_archived_calls(**criteria):
@@ -38,9 +164,17 @@ def find_archived_calls(**criteria):
      * call_request_id
      * call_request_group_id
 
+    The serialized call reports of the archived calls do not include the call
+    results; use archived_call_report to get the complete call report.
+
     :return: (possibly empty) mongo collection cursor containing the matching archived calls
     :rtype: pymongo.cursor.Cursor
     """
+    # buffered calls must be found too
+    archive_buffer = _ARCHIVE_BUFFER
+    if archive_buffer is not None:
+        archive_buffer.flush()
+
     query = {}
     if 'call_request_id' in criteria:
         query['serialized_call_report.call_request_id'] = criteria['call_request_id']
@@ -51,3 +185,23 @@ def find_archived_calls(**criteria):
     cursor = collection.find(query)
     return cursor
 
+
+def archived_call_report(archived_call):
+    """
+    Get the complete serialized call report of an archived call, including
+    its result.
+
+    :param archived_call: archived call as returned by find_archived_calls
+    :type archived_call: dict
+    :return: serialized call report
+    :rtype: dict
+    """
+    serialized_call_report = archived_call['serialized_call_report']
+    if not archived_call.get('result_archived', False):
+        return serialized_call_report
+
+    collection = ArchivedCallResult.get_collection()
+    archived_result = collection.find_one({'call_request_id': serialized_call_report['call_request_id']})
+    if archived_result is not None:
+        serialized_call_report['result'] = archived_result['result']
+    return serialized_call_report
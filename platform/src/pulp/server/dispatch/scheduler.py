@@ -14,6 +14,7 @@
 import datetime
 import logging
 import threading
+import uuid
 from gettext import gettext as _
 from pprint import pformat
 
@@ -26,6 +27,7 @@ from pulp.server.db.model.dispatch import ScheduledCall
 from pulp.server.dispatch import call
 from pulp.server.dispatch import constants as dispatch_constants
 from pulp.server.dispatch import factory as dispatch_factory
+from pulp.server.managers import factory as managers_factory
 from pulp.server.util import subdict
 
 
@@ -37,18 +39,32 @@ SCHEDULE_MUTABLE_FIELDS = ('call_request', 'schedule', 'failure_threshold',
 SCHEDULE_REPORT_FIELDS = ('schedule', 'consecutive_failures', 'failure_threshold',
                           'first_run', 'last_run', 'next_run', 'remaining_runs',
                           'enabled')
+
+# seconds a batch of scheduled calls stays claimed by a scheduler that fails to
+# release it, before another scheduler may claim the calls again
+CLAIM_TIMEOUT = 300
 # scheduler --------------------------------------------------------------------
 
 class Scheduler(object):
     """
     Scheduler class
     Manager and dispatcher of scheduled call requests
+
+    In batched mode, the due scheduled calls are claimed in bulk with a single
+    update and the schedules with calls still running are tracked in memory
+    instead of being looked up in the task queue for every scheduled call.
+    Itineraries are also expanded in the scheduler's thread instead of being
+    run synchronously through the coordinator.
+
     @ivar dispatch_interval: time, in seconds, between schedule checks
     @type dispatch_interval: int
+    @ivar batched: toggle batched mode
+    @type batched: bool
     """
 
-    def __init__(self, dispatch_interval=30):
+    def __init__(self, dispatch_interval=30, batched=False):
         self.dispatch_interval = dispatch_interval
+        self.batched = batched
         self.scheduled_call_collection = ScheduledCall.get_collection()
 
         self.__exit = False
@@ -56,6 +72,10 @@ class Scheduler(object):
         self.__condition = threading.Condition(self.__lock)
         self.__dispatcher = None
 
+        # number of calls in the tasking system by schedule id, batched mode only
+        self.__in_flight = None
+        self.__in_flight_lock = threading.Lock()
+
     # scheduled calls dispatch methods -----------------------------------------
 
     def __dispatch(self):
@@ -97,11 +117,27 @@ class Scheduler(object):
             call_group[0].add_life_cycle_callback(dispatch_constants.CALL_COMPLETE_LIFE_CYCLE_CALLBACK,
                                                   scheduler_complete_callback)
 
+            # the schedule is marked before the calls are queued, as they may
+            # complete before the coordinator returns; it stays marked until
+            # the last call of the group completes
+            schedule_id = call_group[0].schedule_id
+            if self.batched:
+                for call_request in call_group:
+                    call_request.add_life_cycle_callback(dispatch_constants.CALL_COMPLETE_LIFE_CYCLE_CALLBACK,
+                                                         scheduler_release_callback)
+                self._add_in_flight(schedule_id, len(call_group))
+
             if len(call_group) == 1:
                 call_report_list = [coordinator.execute_call_asynchronously(call_group[0])]
             else:
                 call_report_list = coordinator.execute_multiple_calls(call_group)
 
+            if self.batched:
+                # rejected calls never complete
+                rejected = [r for r in call_report_list
+                            if r.response is dispatch_constants.CALL_REJECTED_RESPONSE]
+                if rejected:
+                    self.release(schedule_id, len(rejected))
 
             for call_request, call_report in zip(call_group, call_report_list):
                 log_msg = _('Scheduled %(c)s: %(r)s [reasons: %(s)s]') % {'c': str(call_request),
@@ -118,6 +154,11 @@ class Scheduler(object):
         Get call requests, by call group, that are currently scheduled to run
         """
 
+        if self.batched:
+            for call_request_group in self._get_batched_call_groups():
+                yield call_request_group
+            return
+
         coordinator = dispatch_factory.coordinator()
 
         now = datetime.datetime.utcnow()
@@ -155,6 +196,122 @@ class Scheduler(object):
             map(lambda r: setattr(r, 'schedule_id', str(scheduled_call['_id'])), call_request_group)
             yield  call_request_group
 
+    def _get_batched_call_groups(self):
+        """
+        Get call requests, by call group, that are currently scheduled to run
+        by claiming all of the due scheduled calls at once
+        """
+
+        now = datetime.datetime.utcnow()
+        claim_id = str(uuid.uuid4())
+        claim_expires = now + datetime.timedelta(seconds=CLAIM_TIMEOUT)
+
+        # claiming the scheduled calls keeps other schedulers from finding
+        # them again before their next run times are updated
+        query = {'next_run': {'$lte': now}, 'claim_expires': {'$not': {'$gt': now}}}
+        claim = {'$set': {'claim_id': claim_id, 'claim_expires': claim_expires}}
+        self.scheduled_call_collection.update(query, claim, multi=True, safe=True)
+
+        scheduled_calls = list(self.scheduled_call_collection.find({'claim_id': claim_id}))
+        if not scheduled_calls:
+            return
+
+        # it's also important to update the next run time for disabled calls
+        self.update_next_runs(scheduled_calls)
+
+        in_flight = self._in_flight()
+
+        for scheduled_call in scheduled_calls:
+
+            if not scheduled_call['enabled']:
+                continue
+
+            schedule_id = str(scheduled_call['_id'])
+
+            if schedule_id in in_flight:
+                log_msg = _('Schedule %(s)s skipped: last scheduled call still running') % {'s': scheduled_call['id']}
+                _LOG.info(log_msg)
+                continue
+
+            call_request_group = self._expand_itinerary(scheduled_call)
+            if not call_request_group:
+                continue
+
+            map(lambda r: setattr(r, 'schedule_id', schedule_id), call_request_group)
+            yield call_request_group
+
+    def _expand_itinerary(self, scheduled_call):
+        """
+        Run the itinerary call of a scheduled call in the current thread
+        @param scheduled_call: scheduled call
+        @type  scheduled_call: dict
+        @return: call requests generated by the itinerary or None on error
+        @rtype:  list or None
+        """
+        serialized_call_request = scheduled_call['serialized_call_request']
+        itinerary_call_request = call.CallRequest.deserialize(serialized_call_request)
+
+        if itinerary_call_request is None:
+            _LOG.error(_('Schedule %(s)s skipped: cannot load the scheduled call') % {'s': scheduled_call['id']})
+            return None
+
+        principal_manager = managers_factory.principal_manager()
+        principal_manager.set_principal(itinerary_call_request.principal)
+
+        try:
+            return itinerary_call_request.call(*itinerary_call_request.args,
+                                               **itinerary_call_request.kwargs)
+
+        except Exception, e:
+            _LOG.error(_('Schedule %(s)s skipped: itinerary failed') % {'s': scheduled_call['id']})
+            _LOG.exception(e)
+            return None
+
+        finally:
+            principal_manager.clear_principal()
+
+    # in flight schedules, batched mode only -----------------------------------
+
+    def _in_flight(self):
+        """
+        @return: set of ids of schedules with calls still running
+        @rtype:  set
+        """
+        with self.__in_flight_lock:
+            if self.__in_flight is None:
+                # calls from before a restart are still in the task queue
+                coordinator = dispatch_factory.coordinator()
+                self.__in_flight = {}
+                for call_report in coordinator.find_call_reports():
+                    if call_report.schedule_id is None:
+                        continue
+                    count = self.__in_flight.get(call_report.schedule_id, 0)
+                    self.__in_flight[call_report.schedule_id] = count + 1
+            return set(self.__in_flight)
+
+    def _add_in_flight(self, schedule_id, count):
+        self._in_flight() # make sure the counts are seeded
+        with self.__in_flight_lock:
+            self.__in_flight[schedule_id] = self.__in_flight.get(schedule_id, 0) + count
+
+    def release(self, schedule_id, count=1):
+        """
+        Mark calls of a schedule as no longer running; the schedule is no
+        longer running once all of its calls are released
+        @param schedule_id: id of the schedule
+        @type  schedule_id: str
+        @param count: number of calls to release
+        @type  count: int
+        """
+        with self.__in_flight_lock:
+            if self.__in_flight is None or schedule_id not in self.__in_flight:
+                return
+            remaining = self.__in_flight[schedule_id] - count
+            if remaining > 0:
+                self.__in_flight[schedule_id] = remaining
+            else:
+                del self.__in_flight[schedule_id]
+
     def start(self):
         """
         Start the scheduler
@@ -242,6 +399,29 @@ class Scheduler(object):
         update = {'$set': {'next_run': next_run}}
         self.scheduled_call_collection.update({'_id': schedule_id}, update, safe=True)
 
+    def update_next_runs(self, scheduled_calls):
+        """
+        Update the metadata for a list of scheduled calls that will be run again,
+        grouping the updates by next run time, and release their claims
+        @param scheduled_calls: scheduled calls to be updated
+        @type  scheduled_calls: list of dict
+        """
+        ids_by_next_run = {}
+        for scheduled_call in scheduled_calls:
+            next_run = self.calculate_next_run(scheduled_call)
+            ids_by_next_run.setdefault(next_run, []).append(scheduled_call['_id'])
+
+        # remove the scheduled calls if there are no more
+        expired_ids = ids_by_next_run.pop(None, None)
+        if expired_ids:
+            self.scheduled_call_collection.remove({'_id': {'$in': expired_ids}}, safe=True)
+
+        for next_run, schedule_ids in ids_by_next_run.items():
+            update = {'$set': {'next_run': next_run},
+                      '$unset': {'claim_id': 1, 'claim_expires': 1}}
+            self.scheduled_call_collection.update({'_id': {'$in': schedule_ids}}, update,
+                                                  multi=True, safe=True)
+
     def calculate_next_run(self, scheduled_call):
         """
         Calculate the next run datetime of a scheduled call
@@ -594,3 +774,10 @@ def scheduler_complete_callback(call_request, call_report):
     scheduler = dispatch_factory.scheduler()
     scheduler.update_last_run(scheduled_call, call_report)
 
+
+def scheduler_release_callback(call_request, call_report):
+    """
+    Call back for each call of a scheduled call group in batched mode
+    """
+    dispatch_factory.scheduler().release(call_report.schedule_id)
+
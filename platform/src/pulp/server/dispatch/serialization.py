@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compact serialization of call request fields for storage in the database.
+
+Callables are recorded by their dotted name and values that BSON can store
+natively are stored as they are. Anything else falls back to a pickle of the
+individual callable or value.
+"""
+
+import pickle
+import sys
+import threading
+import types
+
+from pulp.server.compat import ObjectId
+
+# constants --------------------------------------------------------------------
+
+# callable kinds
+FUNCTION = 'function'
+METHOD = 'method'
+CLASS_METHOD = 'classmethod'
+
+# keys of an encoded callable
+NAME_KEY = 'name'
+KIND_KEY = 'kind'
+PICKLE_KEY = 'pickle'
+
+# scalar types that are stored as they are
+_NATIVE_TYPES = (types.NoneType, bool, float, unicode, ObjectId)
+
+# range of integers BSON can store
+_MIN_INT64 = -2 ** 63
+_MAX_INT64 = 2 ** 63 - 1
+
+# callable registry ------------------------------------------------------------
+
+class CallableRegistry(object):
+    """
+    Two-way mapping between callables and their dotted names.
+
+    Module level functions, class methods and methods of instances without any
+    instance state are named implicitly the first time they are seen and
+    resolved by importing their module the first time they are loaded. Other
+    callables may be registered explicitly under a name of their choosing.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._names = {} # (im_class or None, function) -> (name, kind)
+        self._class_names = {} # class -> name
+        self._callables = {} # (name, kind) -> function or class
+
+    def register(self, call, name):
+        """
+        Explicitly register a function or class under the given name.
+        @param call: function or class
+        @type  call: callable
+        @param name: name the callable is stored under
+        @type  name: str
+        """
+        if isinstance(call, (type, types.ClassType)):
+            kind = METHOD
+        else:
+            kind = FUNCTION
+        with self._lock:
+            self._callables[(name, kind)] = call
+            if kind == FUNCTION:
+                self._names[(None, call)] = (name, kind)
+            else:
+                self._class_names[call] = name
+            # names already given to methods of a registered class are stale
+            for key in [k for k in self._names if k[0] is call]:
+                del self._names[key]
+
+    def name(self, call):
+        """
+        @param call: callable to name
+        @type  call: callable
+        @return: tuple of name and kind of the callable or None if the callable
+                 cannot be recorded by name
+        @rtype:  tuple or None
+        """
+        if isinstance(call, types.FunctionType):
+            key = (None, call)
+        elif isinstance(call, types.MethodType) and call.im_self is not None:
+            if isinstance(call.im_self, (type, types.ClassType)):
+                key = (call.im_self, call.im_func)
+            elif not _stateless(call.im_self):
+                # the instance has state that the name cannot capture
+                return None
+            else:
+                key = (call.im_self.__class__, call.im_func)
+        else:
+            return None
+
+        with self._lock:
+            name = self._names.get(key)
+            if name is None:
+                name = self._implicit_name(call)
+                # callables that cannot be named are not kept around
+                if name is not None:
+                    self._names[key] = name
+            return name
+
+    def load(self, name, kind):
+        """
+        @param name: name of a callable
+        @type  name: str
+        @param kind: kind of the callable
+        @type  kind: str
+        @return: the named callable
+        @rtype:  callable
+        @raise ValueError: if the name cannot be resolved
+        """
+        if kind == FUNCTION:
+            return self._resolve(name, kind)
+
+        class_name, method_name = name.rsplit('.', 1)
+        cls = self._resolve(class_name, METHOD)
+        if kind == CLASS_METHOD:
+            return getattr(cls, method_name)
+        # the instance is rebuilt the same way unpickling would rebuild it
+        return getattr(cls.__new__(cls), method_name)
+
+    def _resolve(self, name, kind):
+        with self._lock:
+            call = self._callables.get((name, kind))
+            if call is None:
+                call = _import(name)
+                self._callables[(name, kind)] = call
+            return call
+
+    def _implicit_name(self, call):
+        if isinstance(call, types.FunctionType):
+            name = '.'.join((call.__module__, call.__name__))
+            kind = FUNCTION
+        else:
+            if isinstance(call.im_self, (type, types.ClassType)):
+                cls = call.im_self
+                kind = CLASS_METHOD
+            else:
+                cls = call.im_class
+                kind = METHOD
+            class_name = self._class_names.get(cls) or '.'.join((cls.__module__, cls.__name__))
+            name = '.'.join((class_name, call.im_func.__name__))
+
+        # only accept names that load back the same callable
+        try:
+            loaded = self.load(name, kind)
+        except Exception:
+            return None
+        if getattr(loaded, 'im_func', loaded) is not getattr(call, 'im_func', call):
+            return None
+        return name, kind
+
+
+def _stateless(obj):
+    """
+    Determine if an object carries no state of its own, so that a new instance
+    of its class can stand in for it.
+    """
+    if getattr(obj, '__dict__', None):
+        return False
+    for cls in type(obj).__mro__[:-1]:
+        # builtin bases (e.g. dict) and slots hold state outside of __dict__
+        if cls.__module__ == '__builtin__' or '__slots__' in cls.__dict__:
+            return False
+    return True
+
+
+def _import(name):
+    """
+    Import the module attribute identified by the given dotted name.
+    """
+    module_name, attribute = name.rsplit('.', 1)
+    if module_name not in sys.modules:
+        __import__(module_name)
+    try:
+        return getattr(sys.modules[module_name], attribute)
+    except AttributeError:
+        raise ValueError(name)
+
+
+_REGISTRY = CallableRegistry()
+
+
+def register_callable(call, name):
+    """
+    Register a function or class under the given name.
+    @param call: function or class
+    @type  call: callable
+    @param name: name the callable is stored under
+    @type  name: str
+    """
+    _REGISTRY.register(call, name)
+
+# callable encoding ------------------------------------------------------------
+
+def encode_callable(call):
+    """
+    @param call: callable to encode
+    @type  call: callable or None
+    @return: dictionary recording the callable by name or as a pickle
+    @rtype:  dict or None
+    """
+    if call is None:
+        return None
+    name = _REGISTRY.name(call)
+    if name is None:
+        return {PICKLE_KEY: pickle.dumps(call)}
+    return {NAME_KEY: name[0], KIND_KEY: name[1]}
+
+
+def decode_callable(data):
+    """
+    @param data: encoded callable
+    @type  data: dict or None
+    @return: callable
+    @rtype:  callable or None
+    """
+    if data is None:
+        return None
+    if PICKLE_KEY in data:
+        return pickle.loads(data[PICKLE_KEY].encode('ascii'))
+    return _REGISTRY.load(data[NAME_KEY], data[KIND_KEY])
+
+# value encoding ---------------------------------------------------------------
+
+def is_native(value):
+    """
+    Determine if a value is stored by BSON as-is and loaded back unchanged.
+    Tuples, datetimes, byte strings that are not UTF-8, integers outside of
+    64 bits and dictionaries with keys the database rejects are not.
+    @param value: value to check
+    @return: True if the value is BSON native, False otherwise
+    @rtype:  bool
+    """
+    if isinstance(value, _NATIVE_TYPES):
+        return True
+    if isinstance(value, (int, long)):
+        return _MIN_INT64 <= value <= _MAX_INT64
+    if isinstance(value, str):
+        return _is_utf_8(value)
+    if isinstance(value, list):
+        for v in value:
+            if not is_native(v):
+                return False
+        return True
+    if isinstance(value, dict):
+        for k, v in value.iteritems():
+            if not isinstance(k, basestring) or k.startswith('$') or '.' in k:
+                return False
+            if isinstance(k, str) and not _is_utf_8(k):
+                return False
+            if not is_native(v):
+                return False
+        return True
+    return False
+
+
+def _is_utf_8(value):
+    try:
+        value.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def encode_value(value):
+    """
+    @param value: value to encode
+    @return: the value itself if it is BSON native, a pickle of it otherwise
+    """
+    if is_native(value):
+        return value
+    return pickle.dumps(value)
+
+
+def decode_value(data):
+    """
+    Only values that are never strings when stored natively, such as argument
+    lists or dictionaries, can be decoded.
+    @param data: encoded value
+    @return: decoded value
+    """
+    if isinstance(data, basestring):
+        return pickle.loads(data.encode('ascii'))
+    return data
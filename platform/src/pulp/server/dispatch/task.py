@@ -56,9 +56,12 @@ class Task(object):
         assert isinstance(call_request, call.CallRequest)
         assert isinstance(call_report, (types.NoneType, call.CallReport))
 
+        # notified on every state transition of the call report
+        self._state_condition = threading.Condition()
+
         self.call_request = call_request
         self.call_report = call_report or call.CallReport.from_call_request(call_request)
-        self.call_report.state = dispatch_constants.CALL_WAITING_STATE
+        self._set_state(dispatch_constants.CALL_WAITING_STATE)
 
         self.call_request_exit_state = None
         self.queued_call_id = None
@@ -72,6 +75,50 @@ class Task(object):
             raise TypeError('No comparison defined between task and %s' % type(other))
         return self.call_request.id == other.call_request.id
 
+    # task state ---------------------------------------------------------------
+
+    def _set_state(self, state):
+        """
+        Set the state of the call report and wake up any threads waiting on it.
+        @param state: new state of the call
+        @type  state: str
+        """
+        self._state_condition.acquire()
+        try:
+            self.call_report.state = state
+            self._state_condition.notifyAll()
+        finally:
+            self._state_condition.release()
+
+    def wait_for_state(self, states, timeout=None):
+        """
+        Block until the call report is in one of the given states.
+        @param states: states to wait for
+        @type  states: list, set or tuple
+        @param timeout: maximum amount of time to wait, None means indefinitely
+        @type  timeout: None or datetime.timedelta
+        @return: True if the call report reached one of the states, False if
+                 the timeout expired first
+        @rtype:  bool
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = datetime.datetime.now() + timeout
+
+        self._state_condition.acquire()
+        try:
+            while self.call_report.state not in states:
+                if deadline is None:
+                    self._state_condition.wait()
+                    continue
+                remaining = deadline - datetime.datetime.now()
+                if remaining <= datetime.timedelta(0):
+                    return False
+                self._state_condition.wait(timedelta_to_seconds(remaining))
+            return True
+        finally:
+            self._state_condition.release()
+
     # in-context task control --------------------------------------------------
 
     def _report_progress(self, progress):
@@ -104,7 +151,7 @@ class Task(object):
 
         # NOTE using run wrapper so that state transition is protected by the
         # task queue lock and doesn't occur in another thread
-        self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+        self._set_state(dispatch_constants.CALL_RUNNING_STATE)
 
         task_thread = threading.Thread(target=self._run)
         task_thread.start()
@@ -124,7 +171,7 @@ class Task(object):
 
         # generally set in the wrapper, but not when called directly
         if self.call_report.state in dispatch_constants.CALL_READY_STATES:
-            self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
 
         self.call_report.start_time = datetime.datetime.now(dateutils.utc_tz())
 
@@ -194,7 +241,7 @@ class Task(object):
         self._call_complete_callback()
 
         # don't set the state to complete in the report until the task is actually complete
-        self.call_report.state = state
+        self._set_state(state)
 
         self.call_life_cycle_callbacks(dispatch_constants.CALL_COMPLETE_LIFE_CYCLE_CALLBACK)
         if not self.call_request.archive:
@@ -304,7 +351,7 @@ class AsyncTask(Task):
 
         # usually set in the wrapper, unless called directly
         if self.call_report.state in dispatch_constants.CALL_READY_STATES:
-            self.call_report.state = dispatch_constants.CALL_RUNNING_STATE
+            self._set_state(dispatch_constants.CALL_RUNNING_STATE)
 
         self.call_report.start_time = datetime.datetime.now(dateutils.utc_tz())
 
@@ -332,3 +379,15 @@ class AsyncTask(Task):
             principal_manager.clear_principal()
             dispatch_context.CONTEXT.clear_task_attributes()
 
+# utility functions ------------------------------------------------------------
+
+def timedelta_to_seconds(delta):
+    """
+    Convert a timedelta to a number of seconds.
+    (timedelta.total_seconds is not available in Python 2.6)
+    @param delta: time delta to convert
+    @type  delta: datetime.timedelta
+    @return: number of seconds represented by the delta
+    @rtype:  float
+    """
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
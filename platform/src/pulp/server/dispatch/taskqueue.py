@@ -16,6 +16,7 @@ import logging
 import sys
 import threading
 import traceback
+from collections import deque
 from datetime import datetime, timedelta
 from gettext import gettext as _
 
@@ -34,6 +35,13 @@ class TaskQueue(object):
     TaskQueue class
     Manager and dispatcher of concurrent, asynchronous task execution
 
+    Waiting tasks are split between blocked tasks (that still have unresolved
+    dependencies) and ready tasks, which are bucketed by weight in the order
+    they were enqueued. Selecting the tasks to run only looks at the heads of
+    the ready buckets that fit in the available concurrency, so blocked tasks
+    are never rescanned by the dispatcher. All tasks are also indexed by call
+    request id and by the call request tags present when they were enqueued.
+
     @ivar concurrency_threshold: measurement of total allowed concurrency
     @type concurrency_threshold: int
     @ivar dispatch_interval: time, in seconds, between checks for ready tasks
@@ -53,10 +61,17 @@ class TaskQueue(object):
 
         self.queued_call_collection = QueuedCall.get_collection()
 
-        self.__waiting_tasks = []
+        self.__waiting_tasks = {} # call request id: task, for all waiting tasks
+        self.__blocked_tasks = {} # call request id: task, for waiting tasks with dependencies
+        self.__ready_tasks = {} # weight: deque of unblocked waiting tasks in enqueue order
         self.__running_tasks = []
         self.__completed_tasks = []
 
+        self.__task_sequence = {} # call request id: order in which the task was queued
+        self.__sequence_counter = itertools.count()
+        self.__tasks_by_id = {} # call request id: task, for all tasks in the queue
+        self.__task_ids_by_tag = {} # tag: set of call request ids
+
         self.__running_weight = 0
         self.__exit = False
 
@@ -97,13 +112,31 @@ class TaskQueue(object):
         try:
             tasks = []
             available_weight = self.concurrency_threshold - self.__running_weight
-            for task in self.__waiting_tasks:
-                if task.call_request.dependencies:
-                    continue
-                if task.call_request.weight > available_weight:
+
+            # this is equivalent to walking all the unblocked tasks in enqueue
+            # order and taking each one that fits in the available weight: the
+            # next task taken is always the oldest head of the buckets that fit
+            heads = {} # weight: [next task in the bucket, bucket iterator]
+            for weight, bucket in self.__ready_tasks.items():
+                if weight > available_weight:
                     continue
-                available_weight -= task.call_request.weight
+                iterator = iter(bucket)
+                heads[weight] = [iterator.next(), iterator]
+
+            while heads:
+                weight = min(heads, key=lambda w: self._task_sequence(heads[w][0]))
+                task, iterator = heads[weight]
                 tasks.append(task)
+                available_weight -= weight
+
+                try:
+                    heads[weight][0] = iterator.next()
+                except StopIteration:
+                    heads.pop(weight)
+
+                for w in [w for w in heads if w > available_weight]:
+                    heads.pop(w)
+
             return tasks
         finally:
             self.__lock.release()
@@ -114,7 +147,7 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            self.__waiting_tasks.remove(task)
+            self._remove_waiting_task(task)
             self.__running_tasks.append(task)
             self.__running_weight += task.call_request.weight
             task.run()
@@ -132,8 +165,103 @@ class TaskQueue(object):
             if task.call_report.finish_time > expired_cutoff:
                 index = i
                 break
+        for task in self.__completed_tasks[:index]:
+            self._unindex_task(task)
         self.__completed_tasks = self.__completed_tasks[index:]
 
+    # task bookkeeping methods -------------------------------------------------
+
+    def _task_sequence(self, task):
+        """
+        Get the order in which the task was added to the queue.
+        """
+        return self.__task_sequence[task.call_request.id]
+
+    def _sorted_tasks(self, tasks):
+        """
+        Sort tasks in the order in which they were added to the queue.
+        """
+        return sorted(tasks, key=self._task_sequence)
+
+    def _index_task(self, task):
+        """
+        Add the task to the id and tag indexes.
+        """
+        call_request_id = task.call_request.id
+        if call_request_id not in self.__task_sequence:
+            self.__task_sequence[call_request_id] = self.__sequence_counter.next()
+        self.__tasks_by_id[call_request_id] = task
+        for tag in task.call_request.tags:
+            self.__task_ids_by_tag.setdefault(tag, set()).add(call_request_id)
+
+    def _unindex_task(self, task):
+        """
+        Remove the task from the id and tag indexes.
+        """
+        call_request_id = task.call_request.id
+        if self.__tasks_by_id.get(call_request_id) is not task:
+            return
+        self.__tasks_by_id.pop(call_request_id)
+        self.__task_sequence.pop(call_request_id, None)
+        for tag in task.call_request.tags:
+            task_ids = self.__task_ids_by_tag.get(tag)
+            if task_ids is None:
+                continue
+            task_ids.discard(call_request_id)
+            if not task_ids:
+                self.__task_ids_by_tag.pop(tag)
+
+    def _add_waiting_task(self, task):
+        """
+        Add a task to the waiting tasks, either blocked or ready.
+        """
+        self._index_task(task)
+        self.__waiting_tasks[task.call_request.id] = task
+        if task.call_request.dependencies:
+            self.__blocked_tasks[task.call_request.id] = task
+        else:
+            self._ready_task(task)
+
+    def _ready_task(self, task):
+        """
+        Move a waiting task whose dependencies have been resolved to the ready
+        tasks, keeping its weight bucket in enqueue order.
+        """
+        self.__blocked_tasks.pop(task.call_request.id, None)
+        bucket = self.__ready_tasks.setdefault(task.call_request.weight, deque())
+        sequence = self._task_sequence(task)
+        # tasks are usually readied in enqueue order, so this is usually the tail
+        position = len(bucket)
+        while position > 0 and self._task_sequence(bucket[position - 1]) > sequence:
+            position -= 1
+        if position == len(bucket):
+            bucket.append(task)
+            return
+        # python 2 deques have no insert
+        bucket.rotate(-position)
+        bucket.appendleft(task)
+        bucket.rotate(position)
+
+    def _remove_waiting_task(self, task):
+        """
+        Remove a task from the waiting tasks, either blocked or ready.
+        """
+        call_request_id = task.call_request.id
+        self.__waiting_tasks.pop(call_request_id)
+
+        if self.__blocked_tasks.pop(call_request_id, None) is not None:
+            return
+
+        weight = task.call_request.weight
+        bucket = self.__ready_tasks[weight]
+        # ready tasks are generally run in order, so this is usually the head
+        if bucket[0] is task:
+            bucket.popleft()
+        else:
+            bucket.remove(task)
+        if not bucket:
+            self.__ready_tasks.pop(weight)
+
     # queue control methods ----------------------------------------------------
 
     def start(self):
@@ -205,7 +333,7 @@ class TaskQueue(object):
             self.queued_call_collection.save(queued_call, safe=True)
             task.complete_callback = self._complete
             self._validate_call_request_dependencies(task)
-            self.__waiting_tasks.append(task)
+            self._add_waiting_task(task)
             task.call_life_cycle_callbacks(dispatch_constants.CALL_ENQUEUE_LIFE_CYCLE_CALLBACK)
             self.__condition.notify()
         finally:
@@ -222,10 +350,11 @@ class TaskQueue(object):
         self.__lock.acquire()
         try:
             valid_call_request_dependency_ids = []
-            for potential_blocking_task in itertools.chain(self.__running_tasks, self.__waiting_tasks):
-                if potential_blocking_task.call_request.id not in task.call_request.dependencies:
+            running_task_ids = set(t.call_request.id for t in self.__running_tasks)
+            for call_request_id in task.call_request.dependencies:
+                if call_request_id not in self.__waiting_tasks and call_request_id not in running_task_ids:
                     continue
-                valid_call_request_dependency_ids.append(potential_blocking_task.call_request.id)
+                valid_call_request_dependency_ids.append(call_request_id)
             # DANGER this ignores valid call complete states of dependencies!!
             task.call_request.dependencies = subdict(task.call_request.dependencies, valid_call_request_dependency_ids)
         finally:
@@ -243,10 +372,11 @@ class TaskQueue(object):
             task.complete_callback = None
             self.queued_call_collection.remove({'_id': task.queued_call_id}, safe=True)
             task.queued_call_id = None
-            if task in self.__waiting_tasks:
-                self.__waiting_tasks.remove(task)
+            if task.call_request.id in self.__waiting_tasks:
+                self._remove_waiting_task(task)
             if task in self.__running_tasks:
                 self.__running_tasks.remove(task)
+            self._unindex_task(task)
             self._unblock_tasks(task)
             task.call_life_cycle_callbacks(dispatch_constants.CALL_DEQUEUE_LIFE_CYCLE_CALLBACK)
         finally:
@@ -260,7 +390,12 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            for potentially_blocked_task in self.__waiting_tasks[:]:
+            # only blocked tasks can have dependencies
+            for potentially_blocked_task in self.__blocked_tasks.values():
+
+                # skipping a task may have already dequeued others
+                if potentially_blocked_task.call_request.id not in self.__blocked_tasks:
+                    continue
 
                 if task.call_request.id not in potentially_blocked_task.call_request.dependencies:
                     continue
@@ -274,6 +409,8 @@ class TaskQueue(object):
                 else:
                     # remove the task from the blocking_tasks dict
                     potentially_blocked_task.call_request.dependencies.pop(task.call_request.id)
+                    if not potentially_blocked_task.call_request.dependencies:
+                        self._ready_task(potentially_blocked_task)
 
         finally:
             self.__lock.release()
@@ -291,13 +428,14 @@ class TaskQueue(object):
             self.__running_weight -= task.call_request.weight
             self.dequeue(task)
             self.__completed_tasks.append(task)
+            self._index_task(task)
         finally:
             self.__lock.release()
 
     def skip(self, task):
         self.__lock.acquire()
         try:
-            if task not in self.__waiting_tasks:
+            if task.call_request.id not in self.__waiting_tasks:
                 return
             return task.skip()
         finally:
@@ -327,19 +465,15 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            for task in itertools.chain(self.__completed_tasks,
-                                        self.__running_tasks,
-                                        self.__waiting_tasks):
-                if task.call_request.id != call_request_id:
-                    continue
-                return task
-            return None
+            return self.__tasks_by_id.get(call_request_id)
         finally:
             self.__lock.release()
 
     def find(self, *tags):
         """
         Find tasks that match the given call request tags
+        NOTE: only the tags present on the call request when it was enqueued are
+              indexed
         @param tags: list of tags to match
         @type  tags: list of str
         @return: (potentially empty) list of tasks with matching tags
@@ -347,16 +481,14 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            tasks = []
-            for task in itertools.chain(self.__completed_tasks,
-                                        self.__running_tasks,
-                                        self.__waiting_tasks):
-                for tag in tags:
-                    if tag not in task.call_request.tags:
-                        break
-                else:
-                    tasks.append(task)
-            return tasks
+            if not tags:
+                return self._sorted_tasks(self.__tasks_by_id.values())
+            task_id_sets = [self.__task_ids_by_tag.get(tag, set()) for tag in tags]
+            task_id_sets.sort(key=len)
+            task_ids = task_id_sets[0].intersection(*task_id_sets[1:])
+            # the tags may have changed since the tasks were indexed
+            tasks = [self.__tasks_by_id[i] for i in task_ids if i in self.__tasks_by_id]
+            return self._sorted_tasks(t for t in tasks if all(tag in t.call_request.tags for tag in tags))
         finally:
             self.__lock.release()
 
@@ -368,7 +500,7 @@ class TaskQueue(object):
         """
         self.__lock.acquire()
         try:
-            return self.__waiting_tasks[:]
+            return self._sorted_tasks(self.__waiting_tasks.values())
         finally:
             self.__lock.release()
 
@@ -393,7 +525,7 @@ class TaskQueue(object):
         self.__lock.acquire()
         try:
             return itertools.chain(self.__running_tasks[:],
-                                   self.__waiting_tasks[:])
+                                   self._sorted_tasks(self.__waiting_tasks.values()))
         finally:
             self.__lock.release()
 
@@ -419,6 +551,6 @@ class TaskQueue(object):
         try:
             return itertools.chain(self.__completed_tasks[:],
                                    self.__running_tasks[:],
-                                   self.__waiting_tasks[:])
+                                   self._sorted_tasks(self.__waiting_tasks.values()))
         finally:
             self.__lock.release()
@@ -22,9 +22,11 @@ url
 Eventually this should be enhanced to support authentication credentials as well.
 """
 
+import Queue
 import base64
 import httplib
 import logging
+import socket
 import threading
 
 from pulp.server.compat import json
@@ -35,11 +37,24 @@ TYPE_ID = 'http'
 
 LOG = logging.getLogger(__name__)
 
+# Number of threads delivering events
+WORKER_COUNT = 4
+
+# Maximum number of events waiting to be delivered
+QUEUE_SIZE = 1000
+
+# Seconds to wait for room in a full queue before the event is dropped
+QUEUE_TIMEOUT = 1
+
+# Maximum number of queued events a worker takes at once; events in a batch
+# going to the same server are sent back to back over the same connection
+BATCH_SIZE = 50
+
 # -- framework hook -----------------------------------------------------------
 
 def handle_event(notifier_config, event):
-    # fire the actual http push function off in a separate thread to keep
-    # pulp from blocking or deadlocking due to the tasking subsystem
+    # the actual http push happens in a worker thread to keep pulp from
+    # blocking or deadlocking due to the tasking subsystem
 
     data = event.data()
 
@@ -47,13 +62,205 @@ def handle_event(notifier_config, event):
 
     body = json.dumps(data)
 
-    thread = threading.Thread(target=_send_post, args=[notifier_config, body])
-    thread.setDaemon(True)
-    thread.start()
+    _DISPATCHER.dispatch(notifier_config, body)
+
+
+def statistics():
+    """
+    @return: delivery counters and current queue depth of the HTTP notifier
+    @rtype:  dict
+    """
+    return _DISPATCHER.statistics()
+
+# -- dispatcher ---------------------------------------------------------------
+
+class EventDispatcher(object):
+    """
+    Delivers event POSTs from a bounded queue using a fixed pool of daemon
+    worker threads, started when the first event is dispatched.
+
+    Each worker keeps one connection per server open while there are events
+    queued and closes them once the queue is empty. When the queue is full,
+    dispatching blocks for up to queue_timeout seconds before the event is
+    dropped.
+    """
+
+    def __init__(self, worker_count=WORKER_COUNT, queue_size=QUEUE_SIZE,
+                 queue_timeout=QUEUE_TIMEOUT, batch_size=BATCH_SIZE):
+        self.worker_count = worker_count
+        self.queue_timeout = queue_timeout
+        self.batch_size = batch_size
+        self.queue = Queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._workers = []
+        self._counters = {'queued': 0, 'delivered': 0, 'failed': 0,
+                          'dropped': 0, 'batches': 0, 'connections': 0,
+                          'max_depth': 0}
+
+    def dispatch(self, notifier_config, body):
+        """
+        Queue a POST of the given body to the URL in the notifier configuration.
+
+        @param notifier_config: http notifier configuration
+        @type  notifier_config: dict
+        @param body: json encoded event
+        @type  body: str
+        """
+        post = _parse_post(notifier_config, body)
+        if post is None:
+            return
+
+        self._start()
+
+        try:
+            self.queue.put(post, True, self.queue_timeout)
+        except Queue.Full:
+            self.count('dropped')
+            LOG.warn('HTTP notifier queue is full; dropping event for %(u)s' % {'u': notifier_config['url']})
+            return
+
+        depth = self.queue.qsize()
+        with self._lock:
+            self._counters['queued'] += 1
+            self._counters['max_depth'] = max(self._counters['max_depth'], depth)
+
+    def count(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def statistics(self):
+        """
+        @return: delivery counters, current queue depth and number of workers
+        @rtype:  dict
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['depth'] = self.queue.qsize()
+            stats['workers'] = len(self._workers)
+            return stats
+
+    def _start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.worker_count):
+                worker = EventWorker(self)
+                worker.start()
+                self._workers.append(worker)
+
+
+class EventWorker(threading.Thread):
+    """
+    Worker thread that delivers the POSTs queued in an event dispatcher.
+    """
+
+    def __init__(self, dispatcher):
+        super(EventWorker, self).__init__()
+        self.setDaemon(True)
+        self.dispatcher = dispatcher
+        self.connections = {} # (scheme, server) -> connection
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            self.dispatcher.count('batches')
+
+            # group the batch by server, keeping the order within each server
+            endpoints = []
+            posts_by_endpoint = {}
+            for post in batch:
+                endpoint = post[0]
+                if endpoint not in posts_by_endpoint:
+                    endpoints.append(endpoint)
+                    posts_by_endpoint[endpoint] = []
+                posts_by_endpoint[endpoint].append(post)
+
+            for endpoint in endpoints:
+                for post in posts_by_endpoint[endpoint]:
+                    try:
+                        self._send(*post)
+                    except Exception:
+                        self.dispatcher.count('failed')
+                        LOG.exception('Exception from HTTP notifier')
+                    self.dispatcher.queue.task_done()
+
+    def _next_batch(self):
+        queue = self.dispatcher.queue
+        try:
+            post = queue.get_nowait()
+        except Queue.Empty:
+            # idle; don't hold on to connections while waiting for work
+            self._close_connections()
+            post = queue.get()
+        batch = [post]
+        while len(batch) < self.dispatcher.batch_size:
+            try:
+                batch.append(queue.get_nowait())
+            except Queue.Empty:
+                break
+        return batch
+
+    def _send(self, endpoint, path, headers, body):
+        for attempt in (1, 2):
+            reused = endpoint in self.connections
+            connection = self._connection(endpoint)
+            sent = False
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                # the response must be read before the connection is reused
+                response_body = response.read()
+            except (httplib.HTTPException, socket.error), e:
+                self._close_connection(endpoint)
+                # the server may have closed a kept-alive connection, so retry
+                # once on a new connection; once the POST has been sent the
+                # listener may already have received it, so it is not re-sent
+                if reused and not sent and attempt == 1:
+                    continue
+                self.dispatcher.count('failed')
+                LOG.warn('Error sending event to HTTP notifier: %(e)s' % {'e': e})
+                return
+            break
+
+        if response.status != httplib.OK:
+            self.dispatcher.count('failed')
+            LOG.warn('Error response from HTTP notifier: %(e)s' % {'e': response_body})
+        else:
+            self.dispatcher.count('delivered')
+
+    def _connection(self, endpoint):
+        connection = self.connections.get(endpoint)
+        if connection is None:
+            connection = _create_connection(*endpoint)
+            self.connections[endpoint] = connection
+            self.dispatcher.count('connections')
+        return connection
+
+    def _close_connection(self, endpoint):
+        connection = self.connections.pop(endpoint, None)
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            LOG.exception('Exception closing HTTP notifier connection')
+
+    def _close_connections(self):
+        for endpoint in self.connections.keys():
+            self._close_connection(endpoint)
+
+
+_DISPATCHER = EventDispatcher()
 
 # -- private ------------------------------------------------------------------
 
-def _send_post(notifier_config, body):
+def _parse_post(notifier_config, body):
+    """
+    @return: tuple of (scheme, server), path, headers and body for the POST or
+             None if the notifier configuration is invalid
+    @rtype:  tuple or None
+    """
 
     # Basic headers
     headers = {'Accept': 'application/json',
@@ -62,7 +269,7 @@ def _send_post(notifier_config, body):
     # Parse the URL for the pieces we need
     if 'url' not in notifier_config or not notifier_config['url']:
         LOG.warn('HTTP notifier configured without a URL; cannot fire event')
-        return
+        return None
 
     url = notifier_config['url']
 
@@ -70,9 +277,7 @@ def _send_post(notifier_config, body):
         scheme, empty, server, path = url.split('/', 3)
     except ValueError:
         LOG.warn('Improperly configured post_sync_url: %(u)s' % {'u': url})
-        return
-
-    connection = _create_connection(scheme, server)
+        return None
 
     # Process authentication
     if 'username' in notifier_config and 'password' in notifier_config:
@@ -80,12 +285,7 @@ def _send_post(notifier_config, body):
         encoded = base64.encodestring(raw)[:-1]
         headers['Authorization'] = 'Basic ' + encoded
 
-    connection.request('POST', '/' + path, body=body, headers=headers)
-    response = connection.getresponse()
-    if response.status != httplib.OK:
-        error_msg = response.read()
-        LOG.warn('Error response from HTTP notifier: %(e)s' % {'e': error_msg})
-    connection.close()
+    return (scheme, server), '/' + path, headers, body
 
 def _create_connection(scheme, server):
     if scheme.startswith('https'):
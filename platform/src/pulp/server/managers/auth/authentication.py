@@ -9,7 +9,13 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import calendar
+import hashlib
+import hmac
 import logging
+import os
+import threading
+import time
 
 import oauth2
 
@@ -23,6 +29,258 @@ from pulp.server.exceptions import PulpException
 
 _LOG = logging.getLogger(__name__)
 
+# Successful username/password checks are remembered for this many seconds,
+# for at most this many users, so that clients sending their credentials on
+# every request do not pay for the password hashing every time.
+CREDENTIAL_CACHE_TTL = 30
+CREDENTIAL_CACHE_SIZE = 1000
+
+# Maximum number of verified client certificates remembered. Entries expire
+# with the certificates themselves.
+CERTIFICATE_CACHE_SIZE = 10000
+
+# -- credential cache ---------------------------------------------------------
+
+
+class CredentialCache(object):
+    """
+    Short-lived, bounded cache of successful username/password checks.
+    Passwords are never kept; an entry records a keyed digest of the
+    credentials, with a key that is random for each process.
+    """
+
+    def __init__(self, ttl=CREDENTIAL_CACHE_TTL, size=CREDENTIAL_CACHE_SIZE):
+        self._lock = threading.RLock()
+        self._key = os.urandom(32)
+        self._entries = {} # username -> (digest, login, expiration)
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username, password):
+        """
+        @type username: str
+        @param username: login given by the client
+
+        @type password: str
+        @param password: password given by the client
+
+        @rtype: str or None
+        @return: user login the credentials were last verified for, None if
+                 they have not been verified recently
+        """
+        digest = self._digest(username, password)
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[2] < time.time() or entry[0] != digest:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def add(self, username, password, login):
+        """
+        Remember that the credentials were verified for the given login.
+
+        @type username: str
+        @param username: login given by the client
+
+        @type password: str
+        @param password: password given by the client
+
+        @type login: str
+        @param login: login of the user the credentials belong to
+        """
+        digest = self._digest(username, password)
+        with self._lock:
+            if username not in self._entries and len(self._entries) >= self.size:
+                self._evict()
+            self._entries[username] = (digest, login, time.time() + self.ttl)
+
+    def invalidate(self, login=None):
+        """
+        Forget the verified credentials of a user or, if no login is given,
+        of all users.
+
+        @type login: str or None
+        @param login: login of the user
+        """
+        with self._lock:
+            if login is None:
+                self._entries.clear()
+                return
+            for username, entry in self._entries.items():
+                if login in (username, entry[1]):
+                    del self._entries[username]
+
+    def statistics(self):
+        """
+        @rtype: dict
+        @return: number of cached entries and hit/miss counters of the cache
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _digest(self, username, password):
+        if isinstance(password, unicode):
+            password = password.encode('utf-8')
+        if isinstance(username, unicode):
+            username = username.encode('utf-8')
+        return hmac.new(self._key, '%s:%s' % (username, password), hashlib.sha256).digest()
+
+    def _evict(self):
+        now = time.time()
+        for username, entry in self._entries.items():
+            if entry[2] < now:
+                del self._entries[username]
+        if len(self._entries) >= self.size:
+            oldest = min(self._entries, key=lambda u: self._entries[u][2])
+            del self._entries[oldest]
+
+
+_CREDENTIAL_CACHE = CredentialCache()
+
+
+def invalidate_credential_cache(login=None):
+    """
+    Forget the verified credentials of a user or, if no login is given, of all
+    users. This must be called whenever a user's password changes or a user
+    is deleted.
+
+    :type login: str or None
+    :param login: login of the user
+    """
+    _CREDENTIAL_CACHE.invalidate(login)
+
+
+def credential_cache_statistics():
+    """
+    :rtype: dict
+    :return: number of cached entries and hit/miss counters of the credential cache
+    """
+    return _CREDENTIAL_CACHE.statistics()
+
+
+# -- certificate cache --------------------------------------------------------
+
+
+class CertificateCache(object):
+    """
+    Bounded LRU cache of client certificates verified against the CA, keyed by
+    the SHA-256 fingerprint of their PEM encoding. Each entry records the
+    common name of the certificate and expires with the certificate's valid
+    range.
+    """
+
+    def __init__(self, size=CERTIFICATE_CACHE_SIZE):
+        self._lock = threading.RLock()
+        self._entries = {} # fingerprint -> [previous, next, fingerprint, cn, expiration]
+        # sentinel of the circular list of entries, most recently used first
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None, None]
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fingerprint):
+        """
+        :type fingerprint: str
+        :param fingerprint: fingerprint of a PEM encoded certificate
+
+        :rtype: str or None
+        :return: common name of the certificate if it has been verified and has
+                 not expired, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._unlink(entry)
+            if entry[4] < time.time():
+                del self._entries[fingerprint]
+                self.misses += 1
+                return None
+            self._link(entry)
+            self.hits += 1
+            return entry[3]
+
+    def add(self, fingerprint, cn, expiration):
+        """
+        :type fingerprint: str
+        :param fingerprint: fingerprint of a PEM encoded certificate
+
+        :type cn: str
+        :param cn: common name of the certificate
+
+        :type expiration: float
+        :param expiration: time, in seconds since the epoch, the certificate expires at
+        """
+        if expiration < time.time():
+            return
+        with self._lock:
+            entry = self._entries.pop(fingerprint, None)
+            if entry is not None:
+                self._unlink(entry)
+            while len(self._entries) >= self.size:
+                oldest = self._root[0]
+                self._unlink(oldest)
+                del self._entries[oldest[2]]
+                self.evictions += 1
+            entry = [None, None, fingerprint, cn, expiration]
+            self._link(entry)
+            self._entries[fingerprint] = entry
+
+    def invalidate(self):
+        """
+        Forget all verified certificates.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._root[:] = [self._root, self._root, None, None, None]
+
+    def statistics(self):
+        """
+        :rtype: dict
+        :return: number of cached entries and hit, miss and eviction counters
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def _link(self, entry):
+        # insert as the most recently used entry
+        first = self._root[1]
+        entry[0] = self._root
+        entry[1] = first
+        first[0] = entry
+        self._root[1] = entry
+
+    def _unlink(self, entry):
+        entry[0][1] = entry[1]
+        entry[1][0] = entry[0]
+
+
+_CERTIFICATE_CACHE = CertificateCache()
+
+
+def invalidate_certificate_cache():
+    """
+    Forget all verified client certificates. This must be called whenever the
+    CA used to verify them changes.
+    """
+    _CERTIFICATE_CACHE.invalidate()
+
+
+def certificate_cache_statistics():
+    """
+    :rtype: dict
+    :return: number of cached entries and hit, miss and eviction counters of
+             the certificate cache
+    """
+    return _CERTIFICATE_CACHE.statistics()
 
 # -- classes ------------------------------------------------------------------
 
@@ -109,14 +367,55 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
+        if password is not None:
+            login = _CREDENTIAL_CACHE.get(username, password)
+            if login is not None:
+                return login
+
         user = self._check_username_password_local(username, password)
         if user is None and config.getboolean('ldap', 'enabled'):
             user = self._check_username_password_ldap(username, password)
-        if user is not None:
-            return user['login']
-        return None
+        if user is None:
+            return None
+
+        if password is not None:
+            _CREDENTIAL_CACHE.add(username, password, user['login'])
+        return user['login']
 
     # -- ssl cert authentication ---------------------------------------------------
+
+    def _check_cert(self, cert_pem):
+        """
+        Verify a client ssl certificate against the CA, unless it has already
+        been verified and has not expired since.
+        Return None if the certificate is not valid
+
+        :type cert_pem: str
+        :param cert_pem: pem encoded ssl certificate
+
+        :rtype: str or None
+        :return: common name of the certificate
+        """
+        fingerprint = hashlib.sha256(cert_pem).hexdigest()
+        cn = _CERTIFICATE_CACHE.get(fingerprint)
+        if cn is not None:
+            return cn
+
+        cert = factory.certificate_manager(content=cert_pem)
+        subject = cert.subject()
+        cn = subject.get('CN', None)
+
+        if not cn:
+            return None
+
+        cert_gen_manager = factory.cert_generation_manager()
+        if not cert_gen_manager.verify_cert(cert_pem):
+            _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' % cn)
+            return None
+
+        expiration = calendar.timegm(cert.validRange().end().utctimetuple())
+        _CERTIFICATE_CACHE.add(fingerprint, cn, expiration)
+        return cn
     
     def check_user_cert(self, cert_pem):
         """
@@ -129,21 +428,13 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
-        cert = factory.certificate_manager(content=cert_pem)
-        subject = cert.subject()
-        encoded_user = subject.get('CN', None)
+        encoded_user = self._check_cert(cert_pem)
     
         if not encoded_user:
             return None
     
-        cert_gen_manager = factory.cert_generation_manager()
-        if not cert_gen_manager.verify_cert(cert_pem):
-            _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' %
-                       encoded_user)
-            return None
-    
         try:
-            username, id = cert_gen_manager.decode_admin_user(encoded_user)
+            username, id = factory.cert_generation_manager().decode_admin_user(encoded_user)
         except PulpException:
             return None
     
@@ -160,20 +451,7 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: id of a consumer corresponding to the credentials
         """
-        cert = factory.certificate_manager(content=cert_pem)
-        subject = cert.subject()
-        consumerid = subject.get('CN', None)
-    
-        if consumerid is None:
-            return None
-    
-        cert_gen_manager = factory.cert_generation_manager()
-        if not cert_gen_manager.verify_cert(cert_pem):
-            _LOG.error('Auth certificate with CN [%s] is signed by a foreign CA' %
-                       consumerid)
-            return None
-    
-        return consumerid
+        return self._check_cert(cert_pem)
     
     # oauth authentication --------------------------------------------------------
     
@@ -18,7 +18,6 @@ Functions taken from stackoverflow.com : http://tinyurl.com/2f6gx7s
 """
 
 import random
-from hmac import HMAC
 
 from pulp.server.compat import digestmod
 
@@ -26,6 +25,9 @@ from pulp.server.compat import digestmod
 
 NUM_ITERATIONS = 5000
 
+_TRANS_5C = ''.join(chr(x ^ 0x5C) for x in xrange(256))
+_TRANS_36 = ''.join(chr(x ^ 0x36) for x in xrange(256))
+
 # -- classes ------------------------------------------------------------------
 
 class PasswordManager(object):
@@ -39,7 +41,7 @@ class PasswordManager(object):
     def pbkdf_sha256(self, password, salt, iterations):
         result = password
         for i in xrange(iterations):
-            result = HMAC(result, salt, digestmod).digest() # use HMAC to apply the salt
+            result = _hmac_digest(result, salt) # use HMAC to apply the salt
         return result
 
     def hash_password(self, plain_password):
@@ -52,8 +54,19 @@ class PasswordManager(object):
         salt, hashed_password = saved_password_entry.split(",")
         salt = salt.decode("base64")
         hashed_password = hashed_password.decode("base64")
-        pbkdbf = self.pbkdf_sha256(plain_password, salt, NUM_ITERATIONS)
+        pbkdbf = self.pbkdf_sha256(str(plain_password), salt, NUM_ITERATIONS)
         return hashed_password == pbkdbf
-    
 
+# -- utilities ----------------------------------------------------------------
 
+def _hmac_digest(key, msg):
+    """
+    Same result as HMAC(key, msg, digestmod).digest() without the overhead of
+    building an HMAC object for every call.
+    """
+    block_size = digestmod().block_size
+    if len(key) > block_size:
+        key = digestmod(key).digest()
+    key += chr(0) * (block_size - len(key))
+    inner = digestmod(key.translate(_TRANS_36) + msg).digest()
+    return digestmod(key.translate(_TRANS_5C) + inner).digest()
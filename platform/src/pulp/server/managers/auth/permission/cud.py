@@ -26,6 +26,7 @@ from pulp.server.exceptions import (
     PulpExecutionException)
 from pulp.server.managers import factory
 from pulp.server.managers.auth.user import system
+from pulp.server.managers.auth.user.query import invalidate_permission_cache
 
 
 # -- constants ----------------------------------------------------------------
@@ -87,16 +88,20 @@ class PermissionManager(object):
         if found is None:
             raise MissingResource(resource_uri)
 
+        affected_logins = set(found['users'])
         for key, value in delta.items():
             # simple changes
             if key in ('users',):
                 found[key] = value
+                affected_logins.update(value)
                 continue
 
             # unsupported
             raise PulpDataException(_("Update Keyword [%s] is not supported" % key))
 
         Permission.get_collection().save(found, safe=True)
+        for login in affected_logins:
+            invalidate_permission_cache(login)
 
     def delete_permission(self, resource_uri):
         """
@@ -118,6 +123,8 @@ class PermissionManager(object):
             raise MissingResource(resource_uri)
 
         Permission.get_collection().remove({'resource' : resource_uri}, safe=True)
+        for login in found['users']:
+            invalidate_permission_cache(login)
 
     def grant(self, resource, login, operations):
         """
@@ -156,6 +163,7 @@ class PermissionManager(object):
             current_ops.append(o)
 
         Permission.get_collection().save(permission, safe=True)
+        invalidate_permission_cache(login)
 
     def revoke(self, resource, login, operations):
         """
@@ -201,6 +209,7 @@ class PermissionManager(object):
             return
 
         Permission.get_collection().save(permission, safe=True)
+        invalidate_permission_cache(login)
 
     def grant_automatic_permissions_for_resource(self, resource):
         """
@@ -270,7 +279,9 @@ class PermissionManager(object):
             del permission['users'][login]
             if permission['users']:
                 Permission.get_collection().save(permission, safe=True)
+                invalidate_permission_cache(login)
             else:
                 # Delete entire permission if there are no more users
                 Permission.get_collection().remove({'resource':permission['resource']}, safe=True)
+                invalidate_permission_cache(login)
 
@@ -25,6 +25,8 @@ from pulp.server import config
 from pulp.server.db.model.auth import User
 from pulp.server.exceptions import PulpDataException, DuplicateResource, InvalidValue, MissingResource
 from pulp.server.managers import factory
+from pulp.server.managers.auth.authentication import invalidate_credential_cache
+from pulp.server.managers.auth.user.query import invalidate_permission_cache
 
 # -- constants ----------------------------------------------------------------
 
@@ -87,6 +89,8 @@ class UserManager(object):
         # Creation
         create_me = User(login=login, password=hashed_password, name=name, roles=roles)
         User.get_collection().save(create_me, safe=True)
+        invalidate_permission_cache(login)
+        invalidate_credential_cache(login)
         
         # Grant permissions
         permission_manager = factory.permission_manager()
@@ -155,6 +159,8 @@ class UserManager(object):
             raise InvalidValue(invalid_values)
 
         User.get_collection().save(user, safe=True)
+        invalidate_permission_cache(login)
+        invalidate_credential_cache(login)
 
         # Retrieve the user to return the SON object
         updated = User.get_collection().find_one({'login' : login})
@@ -192,6 +198,8 @@ class UserManager(object):
         permission_manager.revoke_all_permissions_from_user(login)
         
         User.get_collection().remove({'login' : login}, safe=True)
+        invalidate_permission_cache(login)
+        invalidate_credential_cache(login)
 
 
     def ensure_admin(self):
@@ -15,6 +15,8 @@
 Contains users query classes
 """
 
+import threading
+import time
 from gettext import gettext as _
 from logging import getLogger
 
@@ -27,6 +29,229 @@ from pulp.server.managers import factory
 
 _LOG = getLogger(__name__)
 
+# Maximum age, in seconds, of the cached permissions. Changes made through the
+# user, role and permission managers invalidate the cache immediately; this
+# only bounds how long changes made by another process go unnoticed.
+PERMISSION_CACHE_TTL = 10
+
+# -- permission cache ---------------------------------------------------------
+
+
+class ResourceTrie(object):
+    """
+    Prefix tree of resource paths, by path segment, to the operations allowed
+    on them. An operation allowed on a resource is allowed on all of the
+    resources below it.
+    """
+
+    def __init__(self):
+        self.operations = set()
+        self.children = {}
+
+    def add(self, resource, operations):
+        """
+        @type resource: str
+        @param resource: pulp resource path
+
+        @type operations: list of int
+        @param operations: operations allowed on the resource
+        """
+        node = self
+        for part in _resource_parts(resource):
+            node = node.children.setdefault(part, ResourceTrie())
+        node.operations.update(operations)
+
+    def allows(self, resource, operation):
+        """
+        @type resource: str
+        @param resource: pulp resource path
+
+        @type operation: int
+        @param operation: operation to be performed on resource
+
+        @rtype: bool
+        @return: True if the operation is allowed on the resource or on any of
+                 its parents, False otherwise
+        """
+        node = self
+        if operation in node.operations:
+            return True
+        for part in _resource_parts(resource):
+            node = node.children.get(part)
+            if node is None:
+                return False
+            if operation in node.operations:
+                return True
+        return False
+
+
+def _resource_parts(resource):
+    return [p for p in resource.split('/') if p]
+
+
+class PermissionCache(object):
+    """
+    In-process cache of the effective permissions of users. The permissions of
+    a user are loaded with a single indexed query and indexed in a resource
+    trie the first time they are needed after the user's entry was invalidated
+    or once the cached copy is older than PERMISSION_CACHE_TTL.
+    """
+
+    def __init__(self, ttl=PERMISSION_CACHE_TTL):
+        self._lock = threading.RLock()
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._loaded_at = None
+        self._cleared_version = 0 # version at which all entries were last discarded
+        self._login_versions = {} # login -> version at which its entries were last discarded
+        self._tries = {} # login -> ResourceTrie
+        self._superusers = {} # login -> bool
+
+    def invalidate(self, login=None):
+        """
+        Discards the cached permissions of a user or, if no login is given,
+        of all users.
+
+        @type login: str or None
+        @param login: login of the user
+        """
+        with self._lock:
+            self.version += 1
+            if login is None:
+                self._loaded_at = None
+                self._cleared_version = self.version
+                self._login_versions = {}
+                self._tries = {}
+                self._superusers = {}
+                return
+            self._login_versions[login] = self.version
+            self._tries.pop(login, None)
+            self._superusers.pop(login, None)
+
+    def is_superuser(self, login):
+        """
+        @type login: str
+        @param login: login of user to check
+
+        @rtype: bool
+        @return: True if the user is a super user, False otherwise
+
+        @raise MissingResource: if the user does not exist
+        """
+        with self._lock:
+            self._check_expired()
+            superuser = self._superusers.get(login)
+            if superuser is not None:
+                self.hits += 1
+                return superuser
+            self.misses += 1
+            version = self.version
+
+        # the database is queried without holding the lock so that other
+        # checks are not held up
+        user = User.get_collection().find_one({'login' : login}, fields=['roles'])
+        if user is None:
+            raise MissingResource(login)
+        superuser = factory.role_manager().super_user_role in user['roles']
+
+        with self._lock:
+            if self._is_current(login, version):
+                self._superusers[login] = superuser
+        return superuser
+
+    def is_authorized(self, resource, login, operation):
+        """
+        @type resource: str
+        @param resource: pulp resource path
+
+        @type login: str
+        @param login: login of user to check permissions for
+
+        @type operation: int
+        @param operation: operation to be performed on resource
+
+        @rtype: bool
+        @return: True if the user has been granted the operation on the
+                 resource or on any of its parents, False otherwise
+        """
+        with self._lock:
+            self._check_expired()
+            trie = self._tries.get(login)
+            if trie is not None:
+                self.hits += 1
+                return trie.allows(resource, operation)
+            self.misses += 1
+            version = self.version
+
+        trie = self._load(login)
+
+        with self._lock:
+            if self._is_current(login, version):
+                self._tries[login] = trie
+        return trie.allows(resource, operation)
+
+    def statistics(self):
+        """
+        @rtype: dict
+        @return: current version and hit/miss counters of the cache
+        """
+        with self._lock:
+            return {'version': self.version, 'hits': self.hits, 'misses': self.misses}
+
+    def _check_expired(self):
+        if self._loaded_at is None:
+            self._loaded_at = time.time()
+        elif time.time() - self._loaded_at > self.ttl:
+            self.invalidate()
+            self._loaded_at = time.time()
+
+    def _is_current(self, login, version):
+        """
+        Determine if data loaded for the user at the given version is still
+        valid, i.e. the user's entries have not been discarded since.
+        """
+        return max(self._cleared_version, self._login_versions.get(login, 0)) <= version
+
+    def _load(self, login):
+        """
+        Build the resource trie of the permissions granted to the user.
+        """
+        trie = ResourceTrie()
+        user_key = 'users.%s' % login
+        spec = {user_key : {'$exists' : True}}
+        for permission in Permission.get_collection().find(spec, fields=['resource', user_key]):
+            resource_uri = permission['resource']
+            # only resources in the form is_authorized builds are ever matched
+            if resource_uri != '/' and resource_uri != '/%s/' % '/'.join(_resource_parts(resource_uri)):
+                continue
+            trie.add(resource_uri, permission['users'][login])
+        return trie
+
+
+_PERMISSION_CACHE = PermissionCache()
+
+
+def invalidate_permission_cache(login=None):
+    """
+    Discards the cached permissions of a user or, if no login is given, of all
+    users. This must be called whenever a user, or the permissions granted to
+    a user, are changed.
+
+    @type login: str or None
+    @param login: login of the user
+    """
+    _PERMISSION_CACHE.invalidate(login)
+
+
+def permission_cache_statistics():
+    """
+    @rtype: dict
+    @return: current version and hit/miss counters of the permission cache
+    """
+    return _PERMISSION_CACHE.statistics()
+
 # -- manager ------------------------------------------------------------------
 
 
@@ -111,12 +336,7 @@ class UserQueryManager(object):
         @rtype: bool
         @return: True if the user is a super user, False otherwise
         """
-        user = User.get_collection().find_one({'login' : login})
-        if user is None:
-            raise MissingResource(login)
-
-        role_manager = factory.role_manager()
-        return role_manager.super_user_role in user['roles']
+        return _PERMISSION_CACHE.is_superuser(login)
 
 
     def is_authorized(self, resource, login, operation):
@@ -139,20 +359,7 @@ class UserQueryManager(object):
         if self.is_superuser(login):
             return True
 
-        permission_query_manager = factory.permission_query_manager()
-
-        parts = [p for p in resource.split('/') if p]
-        while parts:
-            current_resource = '/%s/' % '/'.join(parts)
-            permission = permission_query_manager.find_by_resource(current_resource)
-            if permission is not None:
-                if operation in permission['users'].get(login, []):
-                    return True
-            parts = parts[:-1]
-
-        permission = Permission.get_collection().find_one({'resource' : '/'})
-        return (permission is not None and
-                operation in permission['users'].get(login, []))
+        return _PERMISSION_CACHE.is_authorized(resource, login, operation)
 
 
     def is_last_super_user(self, login):
@@ -26,6 +26,10 @@ from pulp.server.db.model.repository import RepoContentUnit
 
 _LOG = logging.getLogger(__name__)
 
+# Number of content units checked against the repo associations per query and
+# removed per delete when deleting orphans
+ORPHAN_BATCH_SIZE = 1000
+
 
 class OrphanManager(object):
 
@@ -106,17 +110,53 @@ class OrphanManager(object):
         """
 
         fields = fields if fields is not None else ['_id']
+
+        for content_units in self._generate_orphan_batches(content_type_id, fields):
+            for content_unit in content_units:
+                yield content_unit
+
+    def _generate_orphan_batches(self, content_type_id, fields):
+        """
+        Return a generator of lists of orphaned content units of the given type.
+
+        The content type collection is walked once; for every ORPHAN_BATCH_SIZE
+        units, the ids referenced by repository associations are retrieved in
+        a single query and the orphans are determined by set difference. This
+        keeps both the number of database queries and the memory used
+        proportional to the batch size rather than the number of units.
+
+        :param content_type_id: id of the content type
+        :type content_type_id: basestring
+        :param fields: list of fields to include in each content unit
+        :type fields: list
+        :return: generator of lists of orphaned content units
+        :rtype: generator
+        """
+
         content_units_collection = content_types_db.type_units_collection(content_type_id)
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, fields=fields):
+        def _orphans(content_units):
+            unit_ids = [u['_id'] for u in content_units]
+            spec = {'unit_id': {'$in': unit_ids}}
+            associated_ids = set(repo_content_units_collection.find(spec, fields=['unit_id']).distinct('unit_id'))
+            return [u for u in content_units if u['_id'] not in associated_ids]
 
-            repo_content_units_cursor = repo_content_units_collection.find({'unit_id': content_unit['_id']})
+        content_units = []
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+        for content_unit in content_units_collection.find({}, fields=fields):
+            content_units.append(content_unit)
+
+            if len(content_units) >= ORPHAN_BATCH_SIZE:
+                orphans = _orphans(content_units)
+                content_units = []
+                if orphans:
+                    yield orphans
 
-            yield content_unit
+        if content_units:
+            orphans = _orphans(content_units)
+            if orphans:
+                yield orphans
 
     def generate_orphans_by_type_with_unit_keys(self, content_type_id):
         """
@@ -151,11 +191,13 @@ class OrphanManager(object):
                                  given content type and unit id
         """
 
-        for content_unit in self.generate_orphans_by_type(content_type_id):
+        content_units_collection = content_types_db.type_units_collection(content_type_id)
+        repo_content_units_collection = RepoContentUnit.get_collection()
 
-            if content_unit['_id'] != content_unit_id:
-                continue
+        content_unit = content_units_collection.find_one({'_id': content_unit_id}, fields=['_id'])
 
+        if content_unit is not None and \
+                repo_content_units_collection.find_one({'unit_id': content_unit_id}) is None:
             return content_unit
 
         raise pulp_exceptions.MissingResource(content_type=content_type_id, content_unit=content_unit_id)
@@ -226,16 +268,24 @@ class OrphanManager(object):
 
         content_units_collection = content_types_db.type_units_collection(content_type_id)
 
-        for content_unit in self.generate_orphans_by_type(content_type_id, fields=['_id', '_storage_path']):
+        if content_unit_ids is not None:
+            content_unit_ids = set(content_unit_ids)
+
+        for orphans in self._generate_orphan_batches(content_type_id, ['_id', '_storage_path']):
+
+            if content_unit_ids is not None:
+                orphans = [u for u in orphans if u['_id'] in content_unit_ids]
 
-            if content_unit_ids is not None and content_unit['_id'] not in content_unit_ids:
+            if not orphans:
                 continue
 
-            content_units_collection.remove(content_unit['_id'], safe=False)
+            orphan_ids = [u['_id'] for u in orphans]
+            content_units_collection.remove({'_id': {'$in': orphan_ids}}, safe=False)
 
-            storage_path = content_unit.get('_storage_path', None)
-            if storage_path is not None:
-                self.delete_orphaned_file(storage_path)
+            for content_unit in orphans:
+                storage_path = content_unit.get('_storage_path', None)
+                if storage_path is not None:
+                    self.delete_orphaned_file(storage_path)
 
         # this forces the database to flush any cached changes to the disk
         # in the background; for example: the unsafe deletes in the loop above
@@ -11,9 +11,12 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
 import logging
 import os
 import sys
+import threading
+import time
 from uuid import uuid4
 
 from pulp.plugins.conduits.upload import UploadConduit
@@ -30,6 +33,198 @@ import pulp.server.managers.repo._common as repo_common_utils
 
 _LOG = logging.getLogger(__name__)
 
+# Checksums calculated as the bits of an upload arrive
+UPLOAD_CHECKSUM_TYPES = ('sha256',)
+
+# Maximum number of upload files kept open and seconds an upload file is kept
+# open without receiving any bits
+UPLOAD_FILE_CACHE_SIZE = 32
+UPLOAD_FILE_IDLE_TIMEOUT = 60
+
+# Size of the reads used to checksum bits that arrived out of order
+_READ_BLOCK_SIZE = 1048576
+
+# -- upload files -------------------------------------------------------------
+
+class UploadFile(object):
+    """
+    Open file backing an upload request. Records the ranges of the file that
+    have been written and calculates the checksums of the file incrementally,
+    as long as the bits from the start of the file are written only once.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: full path to the file backing the upload
+        @type  path: str
+        """
+        self.path = path
+        self.lock = threading.RLock()
+        self.ranges = [] # sorted, non-overlapping [start, end) ranges written
+        self.hashers = dict((t, hashlib.new(t)) for t in UPLOAD_CHECKSUM_TYPES)
+        self.hashed = 0 # bits before this offset have been checksummed
+        self.last_used = time.time()
+        self.file = None
+        self._open()
+
+    def write(self, offset, data):
+        """
+        Writes bits into the file starting at an offset.
+
+        @param offset: area in the uploaded file to start writing at
+        @type  offset: int
+
+        @param data: content to write to the file
+        @type  data: str
+        """
+        self.lock.acquire()
+        try:
+            if self.file is None:
+                self._open()
+                self.hashers = None # the bits written before may not be known
+            self.file.seek(offset)
+            self.file.write(data)
+            self.last_used = time.time()
+            self._add_range(offset, offset + len(data))
+            self._update_checksums(offset, data)
+        finally:
+            self.lock.release()
+
+    def checksums(self):
+        """
+        @return: hex digests of the file's contents by checksum type; None if
+                 they could not be calculated as the bits arrived
+        @rtype:  dict or None
+        """
+        self.lock.acquire()
+        try:
+            if self.hashers is None or self.hashed != os.path.getsize(self.path):
+                return None
+            return dict((t, h.hexdigest()) for t, h in self.hashers.items())
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        finally:
+            self.lock.release()
+
+    def _open(self):
+        # unbuffered, so the bits are visible to readers of the file as soon
+        # as they are written
+        self.file = open(self.path, 'r+b', 0)
+
+    def _add_range(self, start, end):
+        ranges = []
+        for r in sorted(self.ranges + [[start, end]]):
+            if ranges and r[0] <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], r[1])
+            else:
+                ranges.append(list(r))
+        self.ranges = ranges
+
+    def _update_checksums(self, offset, data):
+        if self.hashers is None:
+            return
+        if offset < self.hashed:
+            # bits already checksummed were rewritten and may have changed
+            self.hashers = None
+            return
+        if offset == self.hashed:
+            for h in self.hashers.values():
+                h.update(data)
+            self.hashed += len(data)
+
+        # checksum bits that arrived earlier, out of order, and now follow
+        # the checksummed bits
+        if self.ranges and self.ranges[0][0] == 0 and self.ranges[0][1] > self.hashed:
+            end = self.ranges[0][1]
+            self.file.seek(self.hashed)
+            while self.hashed < end:
+                block = self.file.read(min(_READ_BLOCK_SIZE, end - self.hashed))
+                for h in self.hashers.values():
+                    h.update(block)
+                self.hashed += len(block)
+
+
+class UploadFileCache(object):
+    """
+    Least recently used cache of open upload files, so segments of an upload
+    are written without opening the file for each one.
+    """
+
+    def __init__(self, size=UPLOAD_FILE_CACHE_SIZE, idle_timeout=UPLOAD_FILE_IDLE_TIMEOUT):
+        self.lock = threading.Lock()
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.files = {} # upload_id -> UploadFile
+
+    def get(self, upload_id, path):
+        """
+        @param upload_id: upload request ID
+        @type  upload_id: str
+
+        @param path: full path to the file backing the upload
+        @type  path: str
+
+        @return: open file backing the upload
+        @rtype:  UploadFile
+
+        @raise MissingResource: if the file does not exist
+        """
+        self.lock.acquire()
+        try:
+            upload_file = self.files.get(upload_id)
+            if upload_file is not None:
+                upload_file.last_used = time.time()
+                return upload_file
+
+            # Make sure the upload was initialized first and hasn't been deleted
+            if not os.path.exists(path):
+                raise MissingResource(upload_request=upload_id)
+
+            self._close_idle()
+            upload_file = UploadFile(path)
+            self.files[upload_id] = upload_file
+            return upload_file
+        finally:
+            self.lock.release()
+
+    def pop(self, upload_id):
+        """
+        Removes an upload from the cache and closes its file.
+
+        @param upload_id: upload request ID
+        @type  upload_id: str
+
+        @return: the closed upload file; None if it was not open
+        @rtype:  UploadFile or None
+        """
+        self.lock.acquire()
+        try:
+            upload_file = self.files.pop(upload_id, None)
+        finally:
+            self.lock.release()
+        if upload_file is not None:
+            upload_file.close()
+        return upload_file
+
+    def _close_idle(self):
+        now = time.time()
+        idle = [u for u, f in self.files.items() if now - f.last_used > self.idle_timeout]
+        if len(self.files) - len(idle) >= self.size:
+            by_use = sorted(self.files.items(), key=lambda i: i[1].last_used)
+            idle = [u for u, f in by_use[:len(self.files) - self.size + 1]]
+        for upload_id in idle:
+            self.files.pop(upload_id).close()
+
+
+_UPLOAD_FILES = UploadFileCache()
+
 # -- manager ------------------------------------------------------------------
 
 class ContentUploadManager(object):
@@ -82,15 +277,8 @@ class ContentUploadManager(object):
         """
 
         file_path = self._upload_file_path(upload_id)
-
-        # Make sure the upload was initialized first and hasn't been deleted
-        if not os.path.exists(file_path):
-            raise MissingResource(upload_request=upload_id)
-
-        f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        upload_file = _UPLOAD_FILES.get(upload_id, file_path)
+        upload_file.write(offset, data)
 
     def delete_upload(self, upload_id):
         """
@@ -102,6 +290,8 @@ class ContentUploadManager(object):
         @type  upload_id: str
         """
 
+        _UPLOAD_FILES.pop(upload_id)
+
         file_path = self._upload_file_path(upload_id)
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -213,8 +403,16 @@ class ContentUploadManager(object):
         except plugin_exceptions.PluginNotFound:
             raise MissingResource(repo_id), None, sys.exc_info()[2]
 
+        # The importer is free to move the file, so it is no longer kept open
+        upload_file = _UPLOAD_FILES.pop(upload_id)
+        checksums = None
+        if upload_file is not None:
+            checksums = upload_file.checksums()
+
         # Assemble the data needed for the import
-        conduit = UploadConduit(repo_id, repo_importer['id'], RepoContentUnit.OWNER_TYPE_USER, manager_factory.principal_manager().get_principal()['login'])
+        conduit = UploadConduit(repo_id, repo_importer['id'], RepoContentUnit.OWNER_TYPE_USER,
+                                manager_factory.principal_manager().get_principal()['login'],
+                                upload_checksums=checksums)
 
         call_config = PluginCallConfiguration(plugin_config, repo_importer['config'], None)
         transfer_repo = repo_common_utils.to_transfer_repo(repo)
@@ -19,6 +19,8 @@ in a consistent event format for that type.
 """
 
 import logging
+import threading
+import time
 
 from pulp.server.db.model.event import EventListener
 from pulp.server.event import notifiers
@@ -27,6 +29,99 @@ from pulp.server.managers import factory
 
 _LOG = logging.getLogger(__name__)
 
+# Maximum age, in seconds, of the cached listeners. Changes made through the
+# event listener manager invalidate the cache immediately; this only bounds how
+# long changes made by another process go unnoticed.
+LISTENER_CACHE_TTL = 60
+
+
+class EventListenerCache(object):
+    """
+    In-process cache of the event listeners, indexed by event type. All of the
+    listeners are loaded in a single query the first time they are needed after
+    an invalidation or once the cached copy is older than LISTENER_CACHE_TTL.
+    """
+
+    def __init__(self, ttl=LISTENER_CACHE_TTL):
+        self._lock = threading.RLock()
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._loaded_at = None
+        self._listeners = None # event type -> list of listeners
+
+    def invalidate(self):
+        """
+        Discards the cached listeners.
+        """
+        with self._lock:
+            self.version += 1
+            self._loaded_at = None
+            self._listeners = None
+
+    def listeners(self, event_type):
+        """
+        @param event_type: type of event being fired
+        @type  event_type: str
+        @return: listeners for the given event type, including those listening
+                 to all events; these are the cached instances and must not be
+                 modified
+        @rtype:  list of dict
+        """
+        with self._lock:
+            if self._expired():
+                self._load()
+                self.misses += 1
+            else:
+                self.hits += 1
+            return self._listeners.get(event_type, []) + self._listeners.get('*', [])
+
+    def statistics(self):
+        """
+        @return: current version and hit/miss counters of the cache
+        @rtype:  dict
+        """
+        with self._lock:
+            return {'version': self.version, 'hits': self.hits, 'misses': self.misses}
+
+    def _expired(self):
+        if self._listeners is None:
+            return True
+        return time.time() - self._loaded_at > self.ttl
+
+    def _load(self):
+        listeners = {}
+        for listener in EventListener.get_collection().find():
+            event_types = listener['event_types']
+            # a listener to all events matches only once
+            if '*' in event_types:
+                event_types = ['*']
+            for event_type in event_types:
+                listeners.setdefault(event_type, []).append(listener)
+        self._listeners = listeners
+        self._loaded_at = time.time()
+
+
+_LISTENER_CACHE = EventListenerCache()
+
+
+def invalidate_listener_cache():
+    """
+    Discards the cached event listeners. This must be called whenever the
+    event_listeners collection is changed.
+    """
+    _LISTENER_CACHE.invalidate()
+
+
+def listener_cache_statistics():
+    """
+    @return: current version and hit/miss counters of the event listener cache
+    @rtype:  dict
+    """
+    return _LISTENER_CACHE.statistics()
+
+
 class EventFireManager(object):
 
     # -- specific event fire methods ------------------------------------------
@@ -79,8 +174,7 @@ class EventFireManager(object):
         @type  event: pulp.server.event.data.Event
         """
         # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types' : event.event_type}, {'event_types' : '*'})}))
+        listeners = _LISTENER_CACHE.listeners(event.event_type)
 
         # For each listener, retrieve the notifier and invoke it. Be sure that
         # an exception from a notifier is logged but does not interrupt the
@@ -25,6 +25,7 @@ import shutil
 import sys
 
 import pymongo
+from pymongo.collection import Collection
 
 from pulp.server.db.model.repository import Repo, RepoDistributor, RepoImporter, RepoContentUnit, RepoSyncResult, RepoPublishResult
 from pulp.server.dispatch import factory as dispatch_factory
@@ -39,6 +40,14 @@ _DISTRIBUTOR_ID_REGEX = _REPO_ID_REGEX # for now, use the same constraints
 
 _LOG = logging.getLogger(__name__)
 
+# The aggregation framework is used to count associations when available
+# (pymongo 2.3 and later); otherwise the group command is used
+_HAS_AGGREGATE = hasattr(Collection, 'aggregate')
+
+# Maximum number of repositories set to the same content unit counts with a
+# single update
+COUNT_UPDATE_BATCH_SIZE = 1000
+
 # -- classes ------------------------------------------------------------------
 
 class RepoManager(object):
@@ -465,40 +474,69 @@ class RepoManager(object):
         repo_coll.save(repo, safe=True)
 
     @staticmethod
-    def rebuild_content_unit_counts(repo_ids=None):
+    def rebuild_content_unit_counts(repo_ids=None, incremental=False):
         """
-        WARNING: This might take a long time, and it should not be used unless
-        absolutely necessary. Not responsible for melted servers.
+        This will recalculate the content unit counts for each content type of
+        the given repositories, which defaults to ALL repositories.
+
+        The associations of all of the repositories are counted with a single
+        grouped aggregation and repositories ending up with the same counts
+        (e.g. empty ones) are updated together. This still reads every
+        association of the repositories, so it should not be used unless
+        necessary.
 
-        This will iterate through the given repositories, which defaults to ALL
-        repositories, and recalculate the content unit counts for each content
-        type.
+        In incremental mode, the counts stored on each repository are first
+        verified against (indexed) counts of its associations and only the
+        repositories whose associations changed without their counts being
+        updated accordingly are recalculated.
 
         This method is called from platform migration 0004, so consult that
         migration before changing this method.
 
         :param repo_ids:    list of repository IDs. DEFAULTS TO ALL REPO IDs!!!
         :type  repo_ids:    list
+        :param incremental: if true, only repositories whose stored counts do
+                            not match their associations are recalculated
+        :type  incremental: bool
+        :return:    IDs of the repositories whose counts were recalculated
+        :rtype:     list
         """
         association_collection = RepoContentUnit.get_collection()
         repo_collection = Repo.get_collection()
 
-        # default to all repos if none were specified
-        if not repo_ids:
+        # default to all repos if none were specified; the associations of all
+        # repos are counted without filtering on their IDs
+        count_spec = {}
+        if repo_ids:
+            count_spec['repo_id'] = {'$in' : repo_ids}
+        else:
             repo_ids = [repo['id'] for repo in repo_collection.find(fields=['id'])]
 
+        if incremental:
+            repo_ids = _stale_content_unit_counts(repo_collection, association_collection, repo_ids)
+            _LOG.info('found %d repositories with stale content unit counts' % len(repo_ids))
+            if not repo_ids:
+                return repo_ids
+            count_spec['repo_id'] = {'$in' : repo_ids}
+
         _LOG.info('regenerating content unit counts for %d repositories' % len(repo_ids))
 
-        for repo_id in repo_ids:
-            _LOG.debug('regenerating content unit count for repository "%s"' % repo_id)
-            counts = {}
-            cursor = association_collection.find({'repo_id':repo_id})
-            type_ids = cursor.distinct('unit_type_id')
-            cursor.close()
-            for type_id in type_ids:
-                spec = {'repo_id': repo_id, 'unit_type_id': type_id}
-                counts[type_id] = association_collection.find(spec).count()
-            repo_collection.update({'id': repo_id}, {'$set':{'content_unit_counts': counts}}, safe=True)
+        counts = dict((repo_id, {}) for repo_id in repo_ids)
+        for repo_id, type_id, count in _count_associations(association_collection, count_spec):
+            if repo_id in counts:
+                counts[repo_id][type_id] = count
+
+        repo_ids_by_counts = {}
+        for repo_id, repo_counts in counts.items():
+            repo_ids_by_counts.setdefault(tuple(sorted(repo_counts.items())), []).append(repo_id)
+
+        for repo_counts, ids in repo_ids_by_counts.items():
+            for i in range(0, len(ids), COUNT_UPDATE_BATCH_SIZE):
+                spec = {'id' : {'$in' : ids[i:i + COUNT_UPDATE_BATCH_SIZE]}}
+                operation = {'$set' : {'content_unit_counts' : dict(repo_counts)}}
+                repo_collection.update(spec, operation, multi=True, safe=True)
+
+        return repo_ids
 
 
 # -- functions ----------------------------------------------------------------
@@ -510,3 +548,63 @@ def is_repo_id_valid(repo_id):
     """
     result = _REPO_ID_REGEX.match(repo_id) is not None
     return result
+
+
+def _count_associations(association_collection, spec):
+    """
+    Counts the associations matching the given spec by repository and content
+    type.
+
+    :return:    list of (repository ID, content type ID, count) for each pair
+                with at least one association
+    :rtype:     list of tuple
+    """
+    if _HAS_AGGREGATE:
+        pipeline = [{'$match' : spec},
+                    {'$group' : {'_id' : {'repo_id' : '$repo_id', 'unit_type_id' : '$unit_type_id'},
+                                 'count' : {'$sum' : 1}}}]
+        try:
+            result = association_collection.aggregate(pipeline)
+        except pymongo.errors.OperationFailure:
+            # the database does not support aggregation (mongo < 2.2)
+            _LOG.debug('aggregation not supported by the database, falling back to group')
+        else:
+            if isinstance(result, dict):
+                result = result['result']
+            return [(r['_id']['repo_id'], r['_id']['unit_type_id'], r['count']) for r in result]
+
+    groups = association_collection.group(['repo_id', 'unit_type_id'], spec, {'count' : 0},
+                                          'function(doc, out) { out.count += 1; }')
+    return [(g['repo_id'], g['unit_type_id'], int(g['count'])) for g in groups]
+
+
+def _stale_content_unit_counts(repo_collection, association_collection, repo_ids):
+    """
+    Determines which of the given repositories have content unit counts that
+    do not match their associations. Only indexed counts are used, so no
+    association documents are read.
+
+    :return:    IDs of the repositories with stale counts
+    :rtype:     list
+    """
+    stale = []
+    repos = repo_collection.find({'id' : {'$in' : repo_ids}}, fields=['id', 'content_unit_counts'])
+    for repo in repos:
+        counts = repo.get('content_unit_counts')
+        if counts is None:
+            stale.append(repo['id'])
+            continue
+
+        # the total catches associations of types not in the counts
+        spec = {'repo_id' : repo['id']}
+        if association_collection.find(spec).count() != sum(counts.values()):
+            stale.append(repo['id'])
+            continue
+
+        for type_id, count in counts.items():
+            spec = {'repo_id' : repo['id'], 'unit_type_id' : type_id}
+            if association_collection.find(spec).count() != count:
+                stale.append(repo['id'])
+                break
+
+    return stale
@@ -56,6 +56,10 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Maximum number of unit IDs in a single $in query and of associations saved
+# in a single insert when operating on many units at once
+ASSOCIATION_BATCH_SIZE = 1000
+
 # -- manager ------------------------------------------------------------------
 
 class RepoUnitAssociationManager(object):
@@ -159,15 +163,53 @@ class RepoUnitAssociationManager(object):
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
+        if owner_type not in _OWNER_TYPES:
+            raise exceptions.InvalidValue(['owner_type'])
 
-        unique_count = 0
+        # Remove duplicates while preserving the requested order
+        unique_unit_ids = []
+        seen = set()
         for unit_id in unit_id_list:
-            if not self.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, owner_type, owner_id, False)
+            if unit_id not in seen:
+                seen.add(unit_id)
+                unique_unit_ids.append(unit_id)
+
+        collection = RepoContentUnit.get_collection()
+
+        unique_count = 0
+        for i in range(0, len(unique_unit_ids), ASSOCIATION_BATCH_SIZE):
+            batch_ids = unique_unit_ids[i:i + ASSOCIATION_BATCH_SIZE]
+
+            # Units associated with the repo by any owner don't change the count;
+            # only those associated by this owner don't need a new association
+            spec = {'repo_id' : repo_id,
+                    'unit_type_id' : unit_type_id,
+                    'unit_id' : {'$in' : batch_ids}}
+            fields = ['unit_id', 'owner_type', 'owner_id']
+
+            associated_ids = set()
+            owned_ids = set()
+            for association in collection.find(spec, fields=fields):
+                associated_ids.add(association['unit_id'])
+                if association['owner_type'] == owner_type and association['owner_id'] == owner_id:
+                    owned_ids.add(association['unit_id'])
+
+            unique_count += len([u for u in batch_ids if u not in associated_ids])
+
+            new_associations = [RepoContentUnit(repo_id, u, unit_type_id, owner_type, owner_id)
+                                for u in batch_ids if u not in owned_ids]
+            if not new_associations:
+                continue
+
+            try:
+                collection.insert(new_associations, safe=True)
+            except pymongo.errors.DuplicateKeyError:
+                # Another call created some of these associations after they
+                # were looked up; fall back to the idempotent single calls,
+                # which will skip the existing ones.
+                for association in new_associations:
+                    self.associate_unit_by_id(repo_id, unit_type_id, association['unit_id'],
+                                              owner_type, owner_id, False)
 
         # update the count of associated units on the repo object
         if unique_count:
@@ -385,8 +427,10 @@ class RepoUnitAssociationManager(object):
                     'owner_id': owner_id}
             collection.remove(spec, safe=True)
 
-            unique_count = sum(1 for unit_id in unit_ids
-                               if not self.association_exists(repo_id, unit_id, unit_type_id))
+            # Only units that are no longer associated by any owner change the count
+            unit_ids = set(unit_ids)
+            still_associated = self._associated_unit_ids(repo_id, unit_type_id, unit_ids)
+            unique_count = len(unit_ids - still_associated)
             if not unique_count:
                 continue
 
@@ -435,6 +479,38 @@ class RepoUnitAssociationManager(object):
         existing_count = unit_coll.find(spec).count()
         return bool(existing_count)
 
+    @staticmethod
+    def _associated_unit_ids(repo_id, unit_type_id, unit_ids):
+        """
+        Determines which of the given units are associated with the repo, by
+        any owner, using one query per ASSOCIATION_BATCH_SIZE units.
+
+        @param repo_id: identifies the repo
+        @type  repo_id: str
+
+        @param unit_type_id: identifies the type of the units
+        @type  unit_type_id: str
+
+        @param unit_ids: unique identifiers of units within the given type
+        @type  unit_ids: iterable of str
+
+        @return: IDs of the given units that have at least one association
+        @rtype:  set
+        """
+        unit_ids = list(unit_ids)
+        unit_coll = RepoContentUnit.get_collection()
+
+        associated_ids = set()
+        for i in range(0, len(unit_ids), ASSOCIATION_BATCH_SIZE):
+            spec = {
+                'repo_id' : repo_id,
+                'unit_type_id' : unit_type_id,
+                'unit_id' : {'$in' : unit_ids[i:i + ASSOCIATION_BATCH_SIZE]},
+            }
+            associated_ids.update(unit_coll.find(spec, fields=['unit_id']).distinct('unit_id'))
+
+        return associated_ids
+
 # -- extracted for brevity above ----------------------------------------------
 
 def load_associated_units(source_repo_id, criteria):
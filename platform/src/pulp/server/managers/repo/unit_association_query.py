@@ -15,12 +15,16 @@
 Contains the manager class for performing queries for repo-unit associations.
 """
 
+import base64
 import copy
+import itertools
 import logging
 import pymongo
 
 import pulp.plugins.types.database as types_db
+from pulp.server.compat import json, json_util
 from pulp.server.db.model.criteria import UnitAssociationCriteria
+from pulp.server.exceptions import InvalidValue
 from pulp.server.db.model.repository import RepoContentUnit
 
 # -- constants ----------------------------------------------------------------
@@ -41,6 +45,19 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Maximum number of unit IDs passed in a single $in clause when looking up
+# unit metadata for a page of associations
+UNIT_METADATA_BATCH_SIZE = 500
+
+# Maximum number of associated unit IDs matched against the units collection
+# with a single $in clause when sorting on unit metadata; above this the sorted
+# units collection is scanned and joined with the associations instead, which
+# keeps the query document well under Mongo's document size limit
+UNIT_ID_QUERY_LIMIT = 50000
+
+# Number of units returned by get_units_by_type_page if not specified
+DEFAULT_PAGE_SIZE = 1000
+
 # -- manager ------------------------------------------------------------------
 
 class RepoUnitAssociationQueryManager(object):
@@ -96,7 +113,7 @@ class RepoUnitAssociationQueryManager(object):
 
         return unit_ids
 
-    def get_units(self, repo_id, criteria=None):
+    def get_units(self, repo_id, criteria=None, as_generator=False):
         """
         Delegates to the appropriate get_units_* call depending on the contents
         of the criteria.
@@ -106,6 +123,10 @@ class RepoUnitAssociationQueryManager(object):
 
         @param criteria: if specified will drive the query
         @type  criteria: L{UnitAssociationCriteria}
+
+        @param as_generator: if true, the units are returned as a generator
+                             rather than a list
+        @type  as_generator: bool
         """
 
         if criteria is not None and\
@@ -113,11 +134,16 @@ class RepoUnitAssociationQueryManager(object):
            len(criteria.type_ids) == 1:
 
             type_id = criteria.type_ids[0]
-            return self.get_units_by_type(repo_id, type_id, criteria=criteria)
+            units = self.get_units_by_type(repo_id, type_id, criteria=criteria)
+            if as_generator:
+                return (u for u in units)
+            return units
         else:
+            if as_generator:
+                return self.get_units_across_types(repo_id, criteria=criteria, as_generator=True)
             return self.get_units_across_types(repo_id, criteria=criteria)
 
-    def get_units_across_types(self, repo_id, criteria=None):
+    def get_units_across_types(self, repo_id, criteria=None, as_generator=False):
         """
         Retrieves data describing units associated with the given repository
         along with information on the association itself.
@@ -133,11 +159,19 @@ class RepoUnitAssociationQueryManager(object):
         Multiple sort fields from the above list are supported. If no sort is
         provided, units will be sorted by unit_type_id and created (in order).
 
+        Unit metadata is looked up in batches of UNIT_METADATA_BATCH_SIZE
+        units per type. When as_generator is true, units are yielded one
+        batch at a time so the caller never holds the full result in memory.
+
         @param repo_id: identifies the repository
         @type  repo_id: str
 
         @param criteria: if specified will drive the query
         @type  criteria: L{UnitAssociationCriteria}
+
+        @param as_generator: if true, a generator of units is returned
+                             instead of a list
+        @type  as_generator: bool
         """
 
         # For simplicity, create a criteria if one is not provided and use its defaults
@@ -180,6 +214,9 @@ class RepoUnitAssociationQueryManager(object):
         if criteria.skip is not None:
             cursor.skip(criteria.skip)
 
+        if as_generator:
+            return self._units_across_types_generator(cursor, criteria)
+
         # Finally do the query and assemble the associations structure
         units = list(cursor)
 
@@ -194,13 +231,73 @@ class RepoUnitAssociationQueryManager(object):
         # We simply need to look up the unit metadata itself and merge it into the
         # combined association and unit metadata dictionary.
 
-        for u in units:
-            type_collection = types_db.type_units_collection(u['unit_type_id'])
-            metadata = type_collection.find_one({'_id' : u['unit_id']})
-            u['metadata'] = metadata
+        for i in range(0, len(units), UNIT_METADATA_BATCH_SIZE):
+            self._merge_unit_metadata(units[i:i + UNIT_METADATA_BATCH_SIZE])
 
         return units
 
+    def _units_across_types_generator(self, cursor, criteria):
+        """
+        Generator counterpart to the unit lookup phase of get_units_across_types.
+        Associations are read from the cursor and merged with their unit
+        metadata one batch at a time.
+
+        Removing duplicate associations requires knowledge of every
+        association, so in that case the (comparatively small) association
+        documents are loaded up front and only the unit metadata is streamed.
+
+        @param cursor: sorted, limited cursor over the associations
+        @type  cursor: pymongo.cursor.Cursor
+
+        @param criteria: criteria the cursor was built from
+        @type  criteria: L{UnitAssociationCriteria}
+        """
+
+        if criteria.remove_duplicates:
+            cursor = self._remove_duplicate_associations(list(cursor))
+
+        batch = []
+        for association in cursor:
+            batch.append(association)
+
+            if len(batch) >= UNIT_METADATA_BATCH_SIZE:
+                self._merge_unit_metadata(batch)
+                for u in batch:
+                    yield u
+                batch = []
+
+        if batch:
+            self._merge_unit_metadata(batch)
+            for u in batch:
+                yield u
+
+    def _merge_unit_metadata(self, units):
+        """
+        Looks up the unit metadata for the given associations and stores it
+        in each association under the "metadata" key. The associations are
+        grouped by unit type so that only a single query per type is made;
+        the order of the given list is not affected.
+
+        Associations whose unit cannot be found will have their metadata set
+        to None.
+
+        @param units: association documents retrieved from the database
+        @type  units: list of dict
+        """
+
+        unit_ids_by_type = {}
+        for u in units:
+            unit_ids_by_type.setdefault(u['unit_type_id'], set()).add(u['unit_id'])
+
+        metadata_by_type = {}
+        for type_id, unit_ids in unit_ids_by_type.items():
+            type_collection = types_db.type_units_collection(type_id)
+            spec = {'_id' : {'$in' : list(unit_ids)}}
+            metadata_by_type[type_id] = dict((m['_id'], m) for m in type_collection.find(spec))
+
+        for u in units:
+            u['metadata'] = metadata_by_type[u['unit_type_id']].get(u['unit_id'])
+
     def get_units_by_type(self, repo_id, type_id, criteria=None):
         """
         Retrieves data describing units of the given type associated with the
@@ -287,32 +384,15 @@ class RepoUnitAssociationQueryManager(object):
             # list yet, so we're not guaranteed that everything in unit_associations
             # is going to be part of the result.
 
-            # The first step is to figure out which associations actually match the
-            # unit filters. This only applies if there is unit filtering.
-            if len(unit_spec) > 0:
-                association_unit_ids = [u['unit_id'] for u in unit_associations]
-                unit_id_spec = copy.copy(unit_spec)
-                unit_id_spec['_id'] = {'$in' : association_unit_ids}
-                matching_unit_id_cursor = type_collection.find(unit_id_spec, fields=['_id'])
-                matching_unit_ids = [u['_id'] for u in matching_unit_id_cursor] # unpack mongo format
-
-                # Remove all associations didn't match the units after the filter was applied
-                unit_associations = [u for u in unit_associations if u['unit_id'] in matching_unit_ids]
-
-            # Batch look up all of the units. This seems like it'd be rough on memory, but since
-            # we have to ultimately return all of this data to the caller, it's going to end up there
-            # anyway.
-            all_unit_ids = [u['unit_id'] for u in unit_associations]
-            spec = {'_id' : {'$in' : all_unit_ids}}
-            all_metadata = type_collection.find(spec, fields=criteria.unit_fields)
-
-            # Convert to dict by unit_id for simple lookup
-            metadata_by_id = dict([(u['_id'], u) for u in all_metadata])
-            def merge_metadata(association):
-                association['metadata'] = metadata_by_id[association['unit_id']]
-            map(merge_metadata, unit_associations)
-            
-            return unit_associations
+            # Both the unit filters and the metadata lookup are applied in
+            # batches so the $in clause stays bounded regardless of repo size.
+            units = []
+            for i in range(0, len(unit_associations), UNIT_METADATA_BATCH_SIZE):
+                batch = unit_associations[i:i + UNIT_METADATA_BATCH_SIZE]
+                units.extend(self._merge_type_metadata(type_collection, batch, unit_spec,
+                                                       criteria.unit_fields))
+
+            return units
 
         else:
             # Sorting will be done in the units collection. Since the type is
@@ -324,32 +404,48 @@ class RepoUnitAssociationQueryManager(object):
             # so we have a list of all unit IDs to pass as a filter.
             associations_by_id = dict([(u['unit_id'], u) for u in unit_associations])
 
-            # We only want to return units with an association, so add in all of
-            # the unit IDs we found earlier.
-            unit_spec['_id'] = {'$in' : associations_by_id.keys()}
-
-            cursor = type_collection.find(unit_spec, fields=criteria.unit_fields)
-
             # Determine what our sort criteria will look like
             if criteria.unit_sort is None:
                 # Default the sort to the unit key
                 unit_key_fields = types_db.type_units_unit_key(type_id)
                 sort_spec = [(u, SORT_ASCENDING) for u in unit_key_fields]
-                cursor.sort(sort_spec)
             else:
-                cursor.sort(criteria.unit_sort)
+                sort_spec = criteria.unit_sort
 
-            # Since the sorting is done here, this is the only place we can
-            # apply the limit/skip.
-            if criteria.limit is not None:
-                cursor.limit(criteria.limit)
+            if len(associations_by_id) <= UNIT_ID_QUERY_LIMIT:
+                # We only want to return units with an association, so add in all of
+                # the unit IDs we found earlier.
+                unit_spec['_id'] = {'$in' : associations_by_id.keys()}
 
-            if criteria.skip is not None:
-                cursor.skip(criteria.skip)
+                cursor = type_collection.find(unit_spec, fields=criteria.unit_fields)
+                cursor.sort(sort_spec)
+
+                # Since the sorting is done here, this is the only place we can
+                # apply the limit/skip.
+                if criteria.limit is not None:
+                    cursor.limit(criteria.limit)
+
+                if criteria.skip is not None:
+                    cursor.skip(criteria.skip)
+
+                # This will load all of the units and they will be filtered,
+                # limited, and sorted.
+                units = list(cursor)
+
+            else:
+                # Too many units to list in the query itself; walk the sorted
+                # units and keep the ones associated with the repository.
+                cursor = type_collection.find(unit_spec, fields=criteria.unit_fields)
+                cursor.sort(sort_spec)
+                cursor.batch_size(UNIT_METADATA_BATCH_SIZE)
+
+                units = (u for u in cursor if u['_id'] in associations_by_id)
 
-            # This will load all of the units and they will be filtered,
-            # limited, and sorted.
-            units = list(cursor)
+                skip = criteria.skip or 0
+                stop = None
+                if criteria.limit is not None:
+                    stop = skip + criteria.limit
+                units = list(itertools.islice(units, skip, stop))
 
             # Now we just need to merge in the association data
             merged_units = []
@@ -360,6 +456,241 @@ class RepoUnitAssociationQueryManager(object):
 
             return merged_units
 
+    def get_units_by_type_page(self, repo_id, type_id, criteria=None,
+                               page_size=DEFAULT_PAGE_SIZE, resume_token=None):
+        """
+        Retrieves a single page of the units returned by get_units_by_type.
+        Pages are resumed from the sort key of the last unit of the previous
+        page (keyset pagination) rather than by skipping, so each page costs
+        the same regardless of how deep into the results it is, and at most
+        one page of associations and unit metadata is held in memory.
+
+        The sort is the same as for get_units_by_type, with the document ID
+        appended as a tie breaker. The limit and skip values of the criteria
+        are not used; the page size bounds each page instead. When duplicate
+        associations are removed, the earliest association of each unit across
+        the whole result set is returned.
+
+        @param repo_id: identifies the repository
+        @type  repo_id: str
+
+        @param type_id: limits returned units to the given type
+        @type  type_id: str
+
+        @param criteria: if specified will drive the query
+        @type  criteria: L{UnitAssociationCriteria}
+
+        @param page_size: maximum number of units to return
+        @type  page_size: int
+
+        @param resume_token: token returned with the previous page; if None
+                             the first page is returned
+        @type  resume_token: str or None
+
+        @return: tuple of the units in the page and the token to retrieve the
+                 next page with; the token is None once the last page has been
+                 returned (the last page may be empty)
+        @rtype:  tuple of (list, str or None)
+
+        @raise InvalidValue: if the page size or resume token is invalid
+        """
+
+        if criteria is None:
+            criteria = UnitAssociationCriteria()
+
+        if not isinstance(page_size, (int, long)) or page_size < 1:
+            raise InvalidValue(['page_size'])
+
+        spec = {'repo_id' : repo_id,
+                'unit_type_id' : type_id}
+
+        association_spec = criteria.association_filters
+        association_spec.pop('unit_type_id', None)
+        association_spec.pop('repo_id', None)
+        spec.update(association_spec)
+
+        type_collection = types_db.type_units_collection(type_id)
+
+        if criteria.association_sort is not None:
+            sort = _keyset_sort(criteria.association_sort)
+            units, last = self._association_sorted_page(spec, type_collection, criteria,
+                                                        sort, page_size, resume_token)
+        else:
+            if criteria.unit_sort is None:
+                unit_key_fields = types_db.type_units_unit_key(type_id)
+                sort = _keyset_sort([(u, SORT_ASCENDING) for u in unit_key_fields])
+            else:
+                sort = _keyset_sort(criteria.unit_sort)
+            units, last = self._unit_sorted_page(spec, type_collection, criteria,
+                                                 sort, page_size, resume_token)
+
+        next_token = None
+        if len(units) >= page_size:
+            next_token = _encode_resume_token(sort, last)
+
+        return units, next_token
+
+    def _association_sorted_page(self, spec, type_collection, criteria, sort, page_size, resume_token):
+        """
+        Page of get_units_by_type_page when sorting on association fields.
+        Associations are read in sort order and joined with their unit
+        metadata one batch at a time until the page is full.
+
+        @return: tuple of the units in the page and the sort values of the last one
+        @rtype:  tuple of (list, list)
+        """
+
+        association_spec = _resume_spec(spec, sort, resume_token)
+
+        # the sort values and creation date are needed in the returned documents
+        # even if the caller asked for other fields only
+        fields, strip = _projection(criteria.association_fields,
+                                    [f for f, d in sort] + ['created'])
+
+        cursor = RepoContentUnit.get_collection().find(association_spec, fields=fields)
+        cursor.sort(sort)
+        batch_size = min(page_size, UNIT_METADATA_BATCH_SIZE)
+        cursor.batch_size(batch_size)
+
+        units = []
+        for batch in _batches(cursor, batch_size):
+            if criteria.remove_duplicates:
+                batch = self._remove_later_associations(spec, batch)
+            batch = self._merge_type_metadata(type_collection, batch, criteria.unit_filters,
+                                              criteria.unit_fields)
+            units.extend(batch[:page_size - len(units)])
+            if len(units) >= page_size:
+                break
+
+        last = None
+        if units:
+            last = _sort_values(units[-1], sort)
+        for u in units:
+            _strip_fields(u, strip)
+
+        return units, last
+
+    def _unit_sorted_page(self, spec, type_collection, criteria, sort, page_size, resume_token):
+        """
+        Page of get_units_by_type_page when sorting on unit fields. Units are
+        read in sort order and joined with their associations one batch at a
+        time until the page is full.
+
+        @return: tuple of the units in the page and the sort values of the last one
+        @rtype:  tuple of (list, list)
+        """
+
+        association_collection = RepoContentUnit.get_collection()
+
+        unit_spec = copy.copy(criteria.unit_filters)
+
+        # Repositories of a modest size are narrowed down to their own units up
+        # front; otherwise the units of the type are walked and only the ones
+        # with an association are kept.
+        if association_collection.find(spec).count() <= UNIT_ID_QUERY_LIMIT:
+            cursor = association_collection.find(spec, fields=['unit_id'])
+            unit_spec['_id'] = {'$in' : list(set(a['unit_id'] for a in cursor))}
+
+        unit_spec = _resume_spec(unit_spec, sort, resume_token)
+
+        unit_fields, unit_strip = _projection(criteria.unit_fields, [f for f, d in sort])
+        association_fields, association_strip = _projection(criteria.association_fields,
+                                                            ['created'])
+
+        cursor = type_collection.find(unit_spec, fields=unit_fields)
+        cursor.sort(sort)
+        batch_size = min(page_size, UNIT_METADATA_BATCH_SIZE)
+        cursor.batch_size(batch_size)
+
+        units = []
+        last = None
+        for batch in _batches(cursor, batch_size):
+            association_spec = copy.copy(spec)
+            association_spec['unit_id'] = {'$in' : [u['_id'] for u in batch]}
+            associations = association_collection.find(association_spec, fields=association_fields)
+            associations_by_id = _earliest_associations(associations)
+
+            for u in batch:
+                association = associations_by_id.get(u['_id'])
+                if association is None:
+                    continue
+                last = _sort_values(u, sort)
+                _strip_fields(u, unit_strip)
+                _strip_fields(association, association_strip)
+                association['metadata'] = u
+                units.append(association)
+                if len(units) >= page_size:
+                    break
+
+            if len(units) >= page_size:
+                break
+
+        return units, last
+
+    def _merge_type_metadata(self, type_collection, associations, unit_spec, unit_fields):
+        """
+        Looks up the units of a single type for the given associations,
+        applying the given unit filters, and stores them in each association
+        under the "metadata" key. Associations whose unit does not match the
+        filters (or no longer exists) are dropped; the order of the rest is
+        preserved.
+
+        @param type_collection: collection of units of the associations' type
+        @type  type_collection: pymongo.collection.Collection
+
+        @param associations: association documents of at most
+                             UNIT_METADATA_BATCH_SIZE units
+        @type  associations: list of dict
+
+        @param unit_spec: mongo spec the units must match
+        @type  unit_spec: dict
+
+        @param unit_fields: unit fields to return; None for all of them
+        @type  unit_fields: list of str or None
+
+        @return: associations that matched, with their metadata merged in
+        @rtype:  list of dict
+        """
+
+        if not associations:
+            return []
+
+        spec = copy.copy(unit_spec)
+        spec['_id'] = {'$in' : list(set(a['unit_id'] for a in associations))}
+        metadata_by_id = dict((u['_id'], u) for u in type_collection.find(spec, fields=unit_fields))
+
+        merged = []
+        for association in associations:
+            metadata = metadata_by_id.get(association['unit_id'])
+            if metadata is not None:
+                association['metadata'] = metadata
+                merged.append(association)
+        return merged
+
+    def _remove_later_associations(self, spec, associations):
+        """
+        Removes the associations that are not the earliest created association
+        of their unit among all of the unit's associations matching the spec,
+        including the ones not in the given list. The order of the remaining
+        associations is preserved.
+
+        @param spec: association spec the associations were found with
+        @type  spec: dict
+
+        @param associations: association documents of at most
+                             UNIT_METADATA_BATCH_SIZE units
+        @type  associations: list of dict
+
+        @rtype: list of dict
+        """
+
+        earliest_spec = copy.copy(spec)
+        earliest_spec['unit_id'] = {'$in' : list(set(a['unit_id'] for a in associations))}
+        cursor = RepoContentUnit.get_collection().find(earliest_spec, fields=['unit_id', 'created'])
+
+        earliest = _earliest_associations(cursor)
+        return [a for a in associations if earliest[a['unit_id']]['_id'] == a['_id']]
+
     def _remove_duplicate_associations(self, units):
         """
         For units that are associated with a repository more than once, this
@@ -418,3 +749,153 @@ class RepoUnitAssociationQueryManager(object):
         @rtype:     list
         """
         return RepoContentUnit.get_collection().query(criteria)
+
+# -- keyset pagination utilities ----------------------------------------------
+
+def _batches(cursor, size):
+    """
+    Yields the documents of the given cursor in lists of the given size.
+    """
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _earliest_associations(associations):
+    """
+    Returns the association with the earliest created date (the lowest ID
+    among equally old ones) of each unit, keyed by unit ID.
+    """
+    earliest = {}
+    for a in associations:
+        current = earliest.get(a['unit_id'])
+        if current is None or (a['created'], a['_id']) < (current['created'], current['_id']):
+            earliest[a['unit_id']] = a
+    return earliest
+
+
+def _keyset_sort(sort):
+    """
+    Returns the given sort with the document ID appended as a tie breaker so
+    that every document has a distinct position in the sort order.
+    """
+    sort = list(sort)
+    if '_id' not in [f for f, d in sort]:
+        sort.append(('_id', SORT_ASCENDING))
+    return sort
+
+
+def _field_value(document, field):
+    """
+    Returns the value of a (possibly dotted) field of a document; missing
+    fields are returned as None, which is how mongo sorts them.
+    """
+    value = document
+    for key in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _sort_values(document, sort):
+    return [_field_value(document, f) for f, d in sort]
+
+
+def _keyset_clauses(sort, values):
+    """
+    Builds the $or clauses matching the documents that come after the
+    document with the given sort values in the given sort order.
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        equal = dict((f, v) for (f, d), v in zip(sort[:i], values[:i]))
+        value = values[i]
+
+        if direction == SORT_ASCENDING:
+            if value is None:
+                # everything but null sorts after null
+                clause = {field : {'$ne' : None}}
+            else:
+                clause = {field : {'$gt' : value}}
+            clause.update(equal)
+            clauses.append(clause)
+
+        else:
+            if value is not None:
+                clause = {field : {'$lt' : value}}
+                clause.update(equal)
+                clauses.append(clause)
+                # null sorts last in descending order
+                clause = {field : None}
+                clause.update(equal)
+                clauses.append(clause)
+
+    return clauses
+
+
+def _resume_spec(spec, sort, resume_token):
+    """
+    Narrows the given spec to the documents after the one the resume token
+    was generated from.
+    """
+    if resume_token is None:
+        return spec
+
+    values = _decode_resume_token(sort, resume_token)
+    return {'$and' : [spec, {'$or' : _keyset_clauses(sort, values)}]}
+
+
+def _encode_resume_token(sort, values):
+    data = {'sort' : sort, 'values' : values}
+    return base64.urlsafe_b64encode(json.dumps(data, default=json_util.default))
+
+
+def _decode_resume_token(sort, resume_token):
+    """
+    @raise InvalidValue: if the token is malformed or was generated for a
+                         different sort
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(str(resume_token)),
+                          object_hook=json_util.object_hook)
+        token_sort = [(f, d) for f, d in data['sort']]
+        values = data['values']
+    except Exception:
+        raise InvalidValue(['resume_token'])
+
+    if token_sort != sort or len(values) != len(sort):
+        raise InvalidValue(['resume_token'])
+
+    return values
+
+
+def _projection(requested, required):
+    """
+    Returns the fields to retrieve when the given fields are requested but the
+    required ones are needed as well, along with the fields to remove from the
+    retrieved documents before they are returned.
+    """
+    if requested is None:
+        return None, []
+
+    fields = list(requested)
+    strip = []
+    for field in required:
+        top = field.split('.')[0]
+        if top == '_id' or field in fields:
+            continue
+        fields.append(field)
+        if top not in [f.split('.')[0] for f in requested] and top not in strip:
+            strip.append(top)
+    return fields, strip
+
+
+def _strip_fields(document, strip):
+    for key in strip:
+        document.pop(key, None)
@@ -63,6 +63,10 @@ V2_RPM_KEYS_FIELDS = {
     'checksum' : 1,
 }
 
+# Same fields in a fixed order, used to match up duplicate packages
+RPM_UNIT_KEY_FIELDS = ('name', 'epoch', 'version', 'release', 'arch',
+                       'checksumtype', 'checksum')
+
 
 DIR_STORAGE_ROOT = '/var/lib/pulp/content/'
 DIR_RPMS = os.path.join(DIR_STORAGE_ROOT, 'rpm')
@@ -72,6 +76,9 @@ DIR_DISTRIBUTION = os.path.join(DIR_STORAGE_ROOT, 'distribution')
 
 PACKAGE_PATH_TEMPLATE = '%(name)s/%(version)s/%(release)s/%(arch)s/%(checksum)s/%(filename)s'
 
+# Number of RPMs/SRPMs inserted into the v2 database in a single call
+PACKAGE_BATCH_SIZE = 1000
+
 # We don't track this distinction in v1, but the majority of the units in a
 # v1 install will have come from a sync, so this is a reasonable default. What
 # is lost here is the knowledge of which units were uploaded, where "lost" is
@@ -118,8 +125,11 @@ def upgrade(v1_database, v2_database):
     init_types_success = _initialize_content_types(v2_database)
     init_associations_success = _initialize_association_collection(v2_database)
 
-    rpms_success = _rpms(v1_database, v2_database, report)
-    srpms_success = _srpms(v1_database, v2_database, report)
+    # Shared by RPMs and SRPMs so the v1 repos are only read once
+    package_repos = _package_repos(v1_database)
+
+    rpms_success = _rpms(v1_database, v2_database, report, package_repos)
+    srpms_success = _srpms(v1_database, v2_database, report, package_repos)
     drpms_success = _drpms(v1_database, v2_database, report)
     errata_success = _errata(v1_database, v2_database, report)
     groups_success = _package_groups(v1_database, v2_database, report)
@@ -211,20 +221,39 @@ def _initialize_association_collection(v2_database):
     return True
 
 
-def _rpms(v1_database, v2_database, report):
+def _rpms(v1_database, v2_database, report, package_repos=None):
     rpm_coll = v2_database.units_rpm
     all_rpms = v1_database.packages.find({'arch' : {'$ne' : 'src'}})
-    return _packages(v1_database, v2_database, rpm_coll, all_rpms, 'rpm', report)
+    return _packages(v1_database, v2_database, rpm_coll, all_rpms, 'rpm', report,
+                     package_repos)
 
 
-def _srpms(v1_database, v2_database, report):
+def _srpms(v1_database, v2_database, report, package_repos=None):
     srpm_coll = v2_database.units_srpm
     all_srpms = v1_database.packages.find({'arch' : 'src'})
-    return _packages(v1_database, v2_database, srpm_coll, all_srpms, 'srpm', report)
+    return _packages(v1_database, v2_database, srpm_coll, all_srpms, 'srpm', report,
+                     package_repos)
+
+
+def _package_repos(v1_database):
+    """
+    Builds the mapping of v1 package ID to the IDs of the v1 repositories that
+    contain it in a single pass over the repositories. Looking up the repos
+    for each package individually is a scan of the repos collection per
+    package, which is far too slow for large installations.
+
+    :return: dict of v1 package ID to list of repo IDs
+    :rtype:  dict
+    """
+    package_repos = {}
+    for repo in v1_database.repos.find({}, {'id' : 1, 'packages' : 1}):
+        for package_id in repo.get('packages') or ():
+            package_repos.setdefault(package_id, []).append(repo['id'])
+    return package_repos
 
 
 def _packages(v1_database, v2_database, package_coll, all_v1_packages,
-              unit_type_id, report):
+              unit_type_id, report, package_repos=None):
 
     # In v1, both RPMs and SRPMs are stored in the packages collection.
     # The differentiating factor is the arch which will be 'src' for SRPMs and,
@@ -233,96 +262,158 @@ def _packages(v1_database, v2_database, package_coll, all_v1_packages,
 
     # Idempotency: This one is ugly. The unique key for an RPM/SRPM in v2
     # is NEVRA, checksumtype, and checksum. It's less efficient but way simpler
-    # to iterate over each package in v1 and attempt to insert it, letting
-    # mongo's uniqueness check prevent a duplicate.
+    # to attempt to insert each package in v1, letting mongo's uniqueness
+    # check prevent a duplicate. The packages are inserted in batches to
+    # avoid a round trip per package.
 
+    if package_repos is None:
+        package_repos = _package_repos(v1_database)
+
+    batch = []
     for v1_rpm in all_v1_packages:
-        new_rpm_id = str(uuid.uuid4())
-        v2_rpm = {
-            'name' : v1_rpm['name'],
-            'epoch' : v1_rpm['epoch'],
-            'version' : v1_rpm['version'],
-            'release' : v1_rpm['release'],
-            'arch' : v1_rpm['arch'],
-            'description' : v1_rpm['description'],
-            'vendor' : v1_rpm['vendor'],
-            'filename' : v1_rpm['filename'],
-            'requires' : v1_rpm['requires'],
-            'provides' : v1_rpm['provides'],
-            'buildhost' : v1_rpm['buildhost'],
-            'license' : v1_rpm['license'],
-
-            '_id' : new_rpm_id,
-            '_content_type_id' : unit_type_id
-        }
+        batch.append((v1_rpm['_id'], _convert_package(v1_rpm, unit_type_id, report)))
+        if len(batch) >= PACKAGE_BATCH_SIZE:
+            _insert_packages(v2_database, package_coll, batch, unit_type_id, package_repos)
+            report.processed(unit_type_id, len(batch))
+            batch = []
 
-        # Checksum is weird, it's stored as a dict of checksum type to the
-        # checksum value. In practice the data should never contain multiple
-        # entries (instead, multiple documents would be created in the packages
-        # collection), so if we encouter it warn the user and only store the
-        # first entry.
-        if len(v1_rpm['checksum']) > 1:
-            warning = _('Multiple checksums found for the RPM %(filename)s,'
-                        'only the checksum of type %(type)s will be saved')
-            report.warning(warning % {'filename' : v1_rpm['filename'], 'type' : v1_rpm['checksum'].keys()[0]})
+    if batch:
+        _insert_packages(v2_database, package_coll, batch, unit_type_id, package_repos)
+        report.processed(unit_type_id, len(batch))
 
-        v2_rpm['checksumtype'] = v1_rpm['checksum'].keys()[0]
-        v2_rpm['checksum'] = v1_rpm['checksum'][v2_rpm['checksumtype']]
+    return True
 
-        # Relative path will be set during the associations. That information
-        # is only obtainable from a repo itself in v1. Not ideal, but so far
-        # one of the very few places where it's a multi-step process to upgrade
-        # a data type.
 
-        # Storage path
-        rpm_path = PACKAGE_PATH_TEMPLATE % v2_rpm
-        storage_path = os.path.join(DIR_RPMS, rpm_path)
-        v2_rpm['_storage_path'] = storage_path
+def _convert_package(v1_rpm, unit_type_id, report):
+    new_rpm_id = str(uuid.uuid4())
+    v2_rpm = {
+        'name' : v1_rpm['name'],
+        'epoch' : v1_rpm['epoch'],
+        'version' : v1_rpm['version'],
+        'release' : v1_rpm['release'],
+        'arch' : v1_rpm['arch'],
+        'description' : v1_rpm['description'],
+        'vendor' : v1_rpm['vendor'],
+        'filename' : v1_rpm['filename'],
+        'requires' : v1_rpm['requires'],
+        'provides' : v1_rpm['provides'],
+        'buildhost' : v1_rpm['buildhost'],
+        'license' : v1_rpm['license'],
+
+        '_id' : new_rpm_id,
+        '_content_type_id' : unit_type_id
+    }
 
-        try:
-            package_coll.insert(v2_rpm, safe=True)
-        except DuplicateKeyError:
-            # I really dislike this pattern, but it's easiest. This is the
-            # idempotency check and isn't a problem that needs to be handled.
+    # Checksum is weird, it's stored as a dict of checksum type to the
+    # checksum value. In practice the data should never contain multiple
+    # entries (instead, multiple documents would be created in the packages
+    # collection), so if we encouter it warn the user and only store the
+    # first entry.
+    if len(v1_rpm['checksum']) > 1:
+        warning = _('Multiple checksums found for the RPM %(filename)s,'
+                    'only the checksum of type %(type)s will be saved')
+        report.warning(warning % {'filename' : v1_rpm['filename'], 'type' : v1_rpm['checksum'].keys()[0]})
 
-            # Still should try to do the association in the event the unit
-            # was added but the association failed.
-            unit_key_fields = ('name', 'epoch', 'version', 'release', 'arch',
-                               'checksumtype', 'checksum')
-            query = dict([ (k, v2_rpm[k]) for k in unit_key_fields ])
-            existing = package_coll.find_one(query, {'_id' : 1})
-            new_rpm_id = existing['_id']
+    v2_rpm['checksumtype'] = v1_rpm['checksum'].keys()[0]
+    v2_rpm['checksum'] = v1_rpm['checksum'][v2_rpm['checksumtype']]
 
-        _associate_package(v1_database, v2_database, v1_rpm['_id'], new_rpm_id, unit_type_id)
+    # Relative path will be set during the associations. That information
+    # is only obtainable from a repo itself in v1. Not ideal, but so far
+    # one of the very few places where it's a multi-step process to upgrade
+    # a data type.
 
-    return True
+    # Storage path
+    rpm_path = PACKAGE_PATH_TEMPLATE % v2_rpm
+    storage_path = os.path.join(DIR_RPMS, rpm_path)
+    v2_rpm['_storage_path'] = storage_path
 
+    return v2_rpm
 
-def _associate_package(v1_database, v2_database, v1_id, v2_id, unit_type):
 
-    v1_coll = v1_database.repos
+def _insert_packages(v2_database, package_coll, batch, unit_type_id, package_repos):
+    """
+    Inserts a batch of converted packages and associates each with the repos
+    that contained it in v1.
+
+    :param batch: list of tuples of v1 package ID and converted v2 package
+    :type  batch: list
+    """
+    v2_rpms = [v2_rpm for v1_id, v2_rpm in batch]
+    v2_ids = dict([(v1_id, v2_rpm['_id']) for v1_id, v2_rpm in batch])
+
+    try:
+        # Keep going past duplicates so the rest of the batch is inserted
+        package_coll.insert(v2_rpms, safe=True, continue_on_error=True)
+    except DuplicateKeyError:
+        # I really dislike this pattern, but it's easiest. This is the
+        # idempotency check and isn't a problem that needs to be handled.
+
+        # Still should try to do the associations in the event the units
+        # were added but the associations failed, so find the IDs the
+        # duplicates were originally added under.
+        inserted = package_coll.find({'_id' : {'$in' : v2_ids.values()}}, {'_id' : 1})
+        inserted_ids = set([p['_id'] for p in inserted])
+        duplicates = [(v1_id, v2_rpm) for v1_id, v2_rpm in batch
+                      if v2_rpm['_id'] not in inserted_ids]
+        existing_ids = _existing_package_ids(package_coll, [v2_rpm for v1_id, v2_rpm in duplicates])
+        for v1_id, v2_rpm in duplicates:
+            v2_ids[v1_id] = existing_ids[_package_key(v2_rpm)]
+
+    _associate_package(v2_database, package_repos, v2_ids, unit_type_id)
+
+
+def _existing_package_ids(package_coll, v2_rpms):
+    """
+    :return: dict of unit key tuple to the ID of the package stored under it
+    :rtype:  dict
+    """
+    query = {'$or' : [dict([(k, p[k]) for k in RPM_UNIT_KEY_FIELDS]) for p in v2_rpms]}
+    existing = package_coll.find(query, dict(V2_RPM_KEYS_FIELDS))
+    return dict([(_package_key(p), p['_id']) for p in existing])
+
+
+def _package_key(v2_rpm):
+    return tuple([v2_rpm[k] for k in RPM_UNIT_KEY_FIELDS])
+
+
+def _associate_package(v2_database, package_repos, v2_ids, unit_type):
+    """
+    Associates a batch of packages with the repos that contained them in v1.
+
+    :param package_repos: mapping of v1 package ID to v1 repo IDs, as returned
+           by _package_repos
+    :type  package_repos: dict
+    :param v2_ids: mapping of v1 package ID to the ID of the v2 unit
+    :type  v2_ids: dict
+    """
+
     v2_coll = v2_database.repo_content_units
 
     # Idempotency: Easiest to let mongo handle it on insert
 
-    repos_with_package = v1_coll.find({'packages' : v1_id}, {'id' : 1})
+    new_associations = []
+    for v1_id, v2_id in v2_ids.items():
+        for repo_id in package_repos.get(v1_id, ()):
+            new_association = {
+                '_id' : ObjectId(),
+                'repo_id' : repo_id,
+                'unit_id' : v2_id,
+                'unit_type_id' : unit_type,
+                'owner_type' : DEFAULT_OWNER_TYPE,
+                'owner_id' : DEFAULT_OWNER_ID,
+                'created' : DEFAULT_CREATED,
+                'updated' : DEFAULT_UPDATED,
+            }
+            new_associations.append(new_association)
+
+    if not new_associations:
+        return
 
-    for repo in repos_with_package:
-        new_association = {
-            '_id' : ObjectId(),
-            'repo_id' : repo['id'],
-            'unit_id' : v2_id,
-            'unit_type_id' : unit_type,
-            'owner_type' : DEFAULT_OWNER_TYPE,
-            'owner_id' : DEFAULT_OWNER_ID,
-            'created' : DEFAULT_CREATED,
-            'updated' : DEFAULT_UPDATED,
-        }
-        try:
-            v2_coll.insert(new_association, safe=True)
-        except DuplicateKeyError:
-            # Still hate this model, still the simplest
-            pass
+    try:
+        v2_coll.insert(new_associations, safe=True, continue_on_error=True)
+    except DuplicateKeyError:
+        # Still hate this model, still the simplest
+        pass
 
 
 def _drpms(v1_database, v2_database, report):
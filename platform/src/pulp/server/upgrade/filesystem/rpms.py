@@ -10,8 +10,12 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import errno
 import os
+import Queue
 import shutil
+import threading
+
 from pulp.server.upgrade.model import UpgradeStepReport
 from pulp.server.upgrade.utils import presto_parser
 
@@ -21,6 +25,13 @@ DIR_SRPMS = os.path.join(DIR_STORAGE_ROOT, 'srpm')
 DIR_DRPM = os.path.join(DIR_STORAGE_ROOT, 'drpm')
 V1_DIR_RPMS = '/var/lib/pulp/packages/'
 
+# Number of threads moving RPMs/SRPMs concurrently; the moves are dominated
+# by filesystem latency, particularly when v1 and v2 are on different devices
+MOVE_WORKER_COUNT = 8
+
+# Bounds the number of packages waiting to be moved
+MOVE_QUEUE_SIZE = 1000
+
 def upgrade(v1_database, v2_database):
     report = UpgradeStepReport()
 
@@ -35,33 +46,84 @@ def _rpms(v1_database, v2_database, report):
     Migrate RPM/SRPM units on filesystem from v1 to v2 database. This assumes that the
     database migration is already complete at this point. The rpm units are migrated
     from v1 location to v2 content location /var/lib/pulp/content/{rpm,srpm}.
+    The moves are run by a pool of MOVE_WORKER_COUNT threads.
+    """
+    moves = Queue.Queue(MOVE_QUEUE_SIZE)
+    report_lock = threading.Lock()
+    workers = []
+    for i in range(MOVE_WORKER_COUNT):
+        worker = threading.Thread(target=_move_packages, args=(moves, report, report_lock))
+        worker.setDaemon(True)
+        worker.start()
+        workers.append(worker)
+
+    try:
+        all_v1_rpms = v1_database.packages.find()
+        for v1_rpm in all_v1_rpms:
+            rpm_rel_path =  "%s/%s/%s/%s/%s/%s" % (v1_rpm['name'], v1_rpm['version'], v1_rpm['release'],
+                                              v1_rpm['arch'], v1_rpm['checksum'].values()[0], v1_rpm['filename'])
+            v1_pkgpath  = os.path.join(V1_DIR_RPMS, rpm_rel_path)
+            if v1_rpm['arch'] == 'src':
+                v2_pkgpath = os.path.join(DIR_SRPMS, rpm_rel_path)
+            else:
+                v2_pkgpath = os.path.join(DIR_RPMS, rpm_rel_path)
+            moves.put((v1_pkgpath, v2_pkgpath))
+    finally:
+        # one stop marker per worker; each exits once it gets to its marker
+        for worker in workers:
+            moves.put(None)
+        for worker in workers:
+            worker.join()
+
+    if len(report.errors):
+        return False
+    return True
+
+def _move_packages(moves, report, report_lock):
+    """
+    Worker that moves packages from their v1 to their v2 location until it
+    takes None from the queue.
+
+    :param moves: queue of tuples of v1 and v2 package path
+    :type  moves: Queue.Queue
+    :param report_lock: serializes updates to the report across workers
+    :type  report_lock: threading.Lock
     """
-    all_v1_rpms = v1_database.packages.find()
-    for v1_rpm in all_v1_rpms:
-        rpm_rel_path =  "%s/%s/%s/%s/%s/%s" % (v1_rpm['name'], v1_rpm['version'], v1_rpm['release'],
-                                          v1_rpm['arch'], v1_rpm['checksum'].values()[0], v1_rpm['filename'])
-        v1_pkgpath  = os.path.join(V1_DIR_RPMS, rpm_rel_path)
-        if v1_rpm['arch'] == 'src':
-            v2_pkgpath = os.path.join(DIR_SRPMS, rpm_rel_path)
-        else:
-            v2_pkgpath = os.path.join(DIR_RPMS, rpm_rel_path)
+    while True:
+        move = moves.get()
+        if move is None:
+            return
+        v1_pkgpath, v2_pkgpath = move
         if not os.path.exists(v1_pkgpath):
             # missing source path, skip migrate
-            report.warning("Package %s does not exist" % v1_pkgpath)
+            report_lock.acquire()
+            try:
+                report.warning("Package %s does not exist" % v1_pkgpath)
+            finally:
+                report_lock.release()
             continue
+        error = None
         try:
             v2_pkg_dir = os.path.dirname(v2_pkgpath)
-            os.makedirs(os.path.dirname(v2_pkgpath))
+            try:
+                os.makedirs(v2_pkg_dir)
+            except OSError, e:
+                # other workers may be creating the same parent directories
+                if e.errno != errno.EEXIST:
+                    raise
             shutil.move(v1_pkgpath, v2_pkg_dir)
         except (IOError, OSError), e:
-            report.error(str(e))
-            continue
+            error = str(e)
         except Exception, e:
-            report.error("Error: %s" % str(e))
-            continue
-    if len(report.errors):
-        return False
-    return True
+            error = "Error: %s" % str(e)
+        report_lock.acquire()
+        try:
+            if error is None:
+                report.processed('package')
+            else:
+                report.error(error)
+        finally:
+            report_lock.release()
 
 def _drpms(v1_database, v2_database, report):
     """
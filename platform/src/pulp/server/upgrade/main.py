@@ -17,6 +17,7 @@ Methods that drive the entire v1 to v2 upgrade process.
 from gettext import gettext as _
 import logging
 import os
+import time
 
 from okaara.prompt import Prompt
 from okaara.progress import ThreadedSpinner
@@ -224,6 +225,7 @@ class Upgrader(object):
             spinner = ThreadedSpinner(self.prompt)
             spinner.start()
 
+            start = time.time()
             try:
                 report = db_call(v1_database, tmp_database)
             except:
@@ -231,6 +233,7 @@ class Upgrader(object):
                 raise
 
             spinner.stop(clear=True)
+            elapsed = time.time() - start
 
             if report is None or report.success is None:
                 # This should only happen during development if the script writer
@@ -247,6 +250,7 @@ class Upgrader(object):
                 self._print_report_data(_('Errors'), report.errors)
                 raise StepException(description)
 
+            self._print_step_statistics(report, elapsed)
             self.prompt.write('')
 
     def _upgrade_files(self):
@@ -264,6 +268,7 @@ class Upgrader(object):
             spinner = ThreadedSpinner(self.prompt)
             spinner.start()
 
+            start = time.time()
             try:
                 report = upgrade_call(v1_database, tmp_database)
             except:
@@ -271,6 +276,7 @@ class Upgrader(object):
                 raise
 
             spinner.stop(clear=True)
+            elapsed = time.time() - start
 
             if report is None or report.success is None:
                 # This should only happen during development if the script writer
@@ -287,6 +293,7 @@ class Upgrader(object):
                 self._print_report_data(_('Errors'), report.errors)
                 raise StepException(description)
 
+            self._print_step_statistics(report, elapsed)
             self.prompt.write('')
 
     def _install(self):
@@ -335,6 +342,7 @@ class Upgrader(object):
             spinner = ThreadedSpinner(self.prompt)
             spinner.start()
 
+            start = time.time()
             try:
                 report = upgrade_call(v1_database, tmp_database)
             except:
@@ -342,6 +350,7 @@ class Upgrader(object):
                 raise
 
             spinner.stop(clear=True)
+            elapsed = time.time() - start
 
             if report is None or report.success is None:
                 self._print(_('Clean upgrade script did not indicate the result of the step'))
@@ -355,6 +364,7 @@ class Upgrader(object):
                 self._print_report_data(_('Errors'), report.errors)
                 raise StepException(description)
 
+            self._print_step_statistics(report, elapsed)
             self.prompt.write('')
 
     def _drop_stream_flag(self):
@@ -402,6 +412,23 @@ class Upgrader(object):
             for i in items:
                 self._print('  %s' % i)
 
+    def _print_step_statistics(self, report, elapsed):
+        """
+        Displays how long a step took and, for each kind of item the step
+        counted, how many it processed and at what rate.
+
+        :param report: report returned from the step
+        :type  report: pulp.server.upgrade.model.UpgradeStepReport
+        :param elapsed: number of seconds the step ran for
+        :type  elapsed: float
+        """
+        self._print(_('Completed in %(s).1f seconds') % {'s' : elapsed})
+        for item_type, count in sorted(report.item_counts.items()):
+            # guard against a clock too coarse to measure very quick steps
+            rate = count / max(elapsed, 0.001)
+            self._print(_('  %(t)s: %(c)d (%(r).1f per second)') %
+                        {'t' : item_type, 'c' : count, 'r' : rate})
+
     def _is_v1(self):
         """
         Returns whether or not the current installation is a v1 stream build.
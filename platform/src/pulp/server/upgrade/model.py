@@ -15,6 +15,9 @@ class UpgradeStepReport(object):
     Captures the success/failure of an upgrade step and any messages to
     be displayed to the user. Any messages added to this report should be
     i18n'd before being passed in.
+
+    Steps may also record how many items of each kind they processed, which
+    is used to report the throughput of the step.
     """
 
     def __init__(self):
@@ -22,6 +25,7 @@ class UpgradeStepReport(object):
         self.messages = []
         self.warnings = []
         self.errors = []
+        self.item_counts = {}
 
     def succeeded(self):
         self.success = True
@@ -39,3 +43,6 @@ class UpgradeStepReport(object):
 
     def error(self, msg):
         self.errors.append(msg)
+
+    def processed(self, item_type, count=1):
+        self.item_counts[item_type] = self.item_counts.get(item_type, 0) + count
@@ -25,6 +25,10 @@ from pulp.server.webservices import http, serialization
 
 _log = logging.getLogger(__name__)
 
+# Approximate size, in bytes, of the chunks a streamed response body is
+# written in
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class JSONController(object):
     """
@@ -136,6 +140,16 @@ class JSONController(object):
         http.header('Content-Length', len(body))
         return body
 
+    def _output_stream(self, items):
+        """
+        JSON encode the given items as a JSON array that is produced one chunk
+        at a time as the response is written, and set the appropriate headers.
+        No Content-Length is sent, so the response is sent with chunked
+        transfer encoding.
+        """
+        http.header('Content-Type', 'application/json')
+        return _json_array_chunks(items, STREAM_CHUNK_SIZE)
+
     def _error_dict(self, msg, code=None):
         """
         Standardized error returns
@@ -157,6 +171,23 @@ class JSONController(object):
         http.status_ok()
         return self._output(data)
 
+    def ok_stream(self, items):
+        """
+        Return an ok response with a body streamed as a JSON array of the given
+        items. Only the items of the chunk being written are serialized at any
+        given time, so large result sets are never held in memory as a whole,
+        provided the items are produced lazily as well (e.g. from a cursor).
+
+        The first chunk is produced before the response status is sent, so
+        errors retrieving the first items are reported as usual. Errors past
+        that point can only truncate the response.
+        @type items: iterable
+        @param items: items to be returned in the body of the response
+        @return: generator of the chunks of the JSON encoded response
+        """
+        http.status_ok()
+        return self._output_stream(items)
+
     def created(self, location, data):
         """
         Return a created response.
@@ -269,3 +300,26 @@ class JSONController(object):
         """
         http.status_not_implemented()
         return self._output(msg)
+
+
+def _json_array_chunks(items, chunk_size):
+    """
+    Generator of the JSON encoding of a list of the given items, split into
+    chunks of at least the given size (except for the last one). The joined
+    chunks are identical to json.dumps of the items as a list.
+    """
+    chunk = ['[']
+    size = 1
+    separator = ''
+    for item in items:
+        encoded = json.dumps(item, default=json_util.default)
+        chunk.append(separator)
+        chunk.append(encoded)
+        size += len(separator) + len(encoded)
+        separator = ', '
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    chunk.append(']')
+    yield ''.join(chunk)
@@ -12,6 +12,7 @@
 # if not, see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
 
 from gettext import gettext as _
+import itertools
 
 import web
 
@@ -29,6 +30,10 @@ from pulp.server.webservices.controllers.decorators import auth_required
 # content types controller classes ---------------------------------------------
 from pulp.server.webservices.controllers.search import SearchController
 
+# Number of units whose repository memberships are looked up at once when
+# streaming search results
+REPO_MEMBERSHIP_BATCH_SIZE = 500
+
 class ContentTypesCollection(JSONController):
 
     @auth_required(READ)
@@ -147,6 +152,30 @@ class ContentUnitsSearch(SearchController):
             unit['repository_memberships'] = list(association_map.get(unit['_id'], []))
         return units
 
+    def _process_units(self, raw_units, type_id, include_repos):
+        """
+        Generator of the processed units for the given query results. When
+        repository memberships are included, they are looked up one batch of
+        REPO_MEMBERSHIP_BATCH_SIZE units at a time.
+
+        :param raw_units:       unit documents returned by the query
+        :type  raw_units:       iterable of dicts
+        :param type_id:         content type id
+        :type  type_id:         str
+        :param include_repos:   if true, add the repository memberships to each unit
+        :type  include_repos:   bool
+        """
+        raw_units = iter(raw_units)
+        while True:
+            batch = list(itertools.islice(raw_units, REPO_MEMBERSHIP_BATCH_SIZE))
+            if not batch:
+                break
+            units = [ContentUnitsCollection.process_unit(unit) for unit in batch]
+            if include_repos:
+                self._add_repo_memberships(units, type_id)
+            for unit in units:
+                yield unit
+
     @auth_required(READ)
     def GET(self, type_id):
         """
@@ -160,12 +189,11 @@ class ContentUnitsSearch(SearchController):
         @type  type_id: basestring
         """
         self._type_id = type_id
-        raw_units = self._get_query_results_from_get(ignore_fields=('include_repos',))
-        units = [ContentUnitsCollection.process_unit(unit) for unit in raw_units]
-        if web.input().get('include_repos'):
-            self._add_repo_memberships(units, type_id)
+        raw_units = self._get_query_results_from_get(ignore_fields=('include_repos',),
+                                                     as_generator=True)
+        include_repos = web.input().get('include_repos')
 
-        return self.ok(units)
+        return self.ok_stream(self._process_units(raw_units, type_id, include_repos))
 
     @auth_required(READ)
     def POST(self, type_id):
@@ -180,12 +208,10 @@ class ContentUnitsSearch(SearchController):
         @type  type_id: basestring
         """
         self._type_id = type_id
-        raw_units = self._get_query_results_from_post()
-        units = [ContentUnitsCollection.process_unit(unit) for unit in raw_units]
-        if self.params().get('include_repos'):
-            self._add_repo_memberships(units, type_id)
+        raw_units = self._get_query_results_from_post(as_generator=True)
+        include_repos = self.params().get('include_repos')
 
-        return self.ok(units)
+        return self.ok_stream(self._process_units(raw_units, type_id, include_repos))
 
 
 class ContentUnitResource(JSONController):
@@ -95,7 +95,7 @@ class TaskResource(JSONController):
             return self.ok(serialized_call_report)
         archived_calls = dispatch_history.find_archived_calls(call_request_id=call_request_id)
         if archived_calls.count() > 0:
-            serialized_call_report = archived_calls[0]['serialized_call_report']
+            serialized_call_report = dispatch_history.archived_call_report(archived_calls[0])
             serialized_call_report.update(link)
             return self.ok(serialized_call_report)
         raise TaskNotFound(call_request_id)
@@ -184,7 +184,7 @@ class TaskGroupResource(JSONController):
         found_call_request_ids = set(c.call_request_id for c in call_reports)
         serialized_call_reports = [c.serialize() for c in call_reports]
         archived_calls = dispatch_history.find_archived_calls(call_request_group_id=call_request_group_id)
-        serialized_call_reports.extend(c['serialized_call_report'] for c in archived_calls
+        serialized_call_reports.extend(dispatch_history.archived_call_report(c) for c in archived_calls
                                        if c['serialized_call_report']['call_request_id'] not in found_call_request_ids)
         if not serialized_call_reports:
             raise TaskGroupNotFound(call_request_group_id)
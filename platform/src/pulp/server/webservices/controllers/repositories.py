@@ -1024,13 +1024,38 @@ class RepoUnitAdvancedSearch(JSONController):
 
         # Data lookup
         manager = manager_factory.repo_unit_association_query_manager()
+
+        # Results are paginated if a page size or the continuation token
+        # returned with the previous page are specified
+        page_size = params.get('page_size', None)
+        continuation = params.get('continuation', None)
+        if page_size is not None or continuation is not None:
+            return self._page(manager, repo_id, criteria, page_size, continuation)
+
         if criteria.type_ids is not None and len(criteria.type_ids) == 1:
             type_id = criteria.type_ids[0]
             units = manager.get_units_by_type(repo_id, type_id, criteria=criteria)
         else:
-            units = manager.get_units_across_types(repo_id, criteria=criteria)
+            units = manager.get_units_across_types(repo_id, criteria=criteria, as_generator=True)
+
+        return self.ok_stream(units)
+
+    def _page(self, manager, repo_id, criteria, page_size, continuation):
+        # Pagination is only supported when searching a single type
+        if criteria.type_ids is None or len(criteria.type_ids) != 1:
+            raise exceptions.InvalidValue(['type_ids'])
+
+        kwargs = {'criteria' : criteria,
+                  'resume_token' : continuation}
+        if page_size is not None:
+            try:
+                kwargs['page_size'] = int(page_size)
+            except (TypeError, ValueError):
+                raise exceptions.InvalidValue(['page_size']), None, sys.exc_info()[2]
+
+        units, continuation = manager.get_units_by_type_page(repo_id, criteria.type_ids[0], **kwargs)
 
-        return self.ok(units)
+        return self.ok({'units' : units, 'continuation' : continuation})
 
 # -- web.py application -------------------------------------------------------
 
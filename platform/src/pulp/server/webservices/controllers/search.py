@@ -39,7 +39,7 @@ class SearchController(JSONController):
         example, '/v2/sometype/search/?field=id&field=display_name' will
         return the fields 'id' and 'display_name'.
         """
-        return self.ok(self._get_query_results_from_get())
+        return self.ok_stream(self._get_query_results_from_get(as_generator=True))
 
     @auth_required(READ)
     def POST(self):
@@ -56,9 +56,10 @@ class SearchController(JSONController):
         @rtype:     list
         """
 
-        return self.ok(self._get_query_results_from_post())
+        return self.ok_stream(self._get_query_results_from_post(as_generator=True))
 
-    def _get_query_results_from_get(self, ignore_fields=None, is_user_search=False):
+    def _get_query_results_from_get(self, ignore_fields=None, is_user_search=False,
+                                    as_generator=False):
         """
         Looks for query parameters that define a Criteria, and returns the
         results of a search based on that Criteria.
@@ -74,6 +75,11 @@ class SearchController(JSONController):
 
         @type is_user_search
 
+        @param as_generator:    if true, the results are returned as they
+                                come from the query method, typically a cursor,
+                                rather than as a list
+        @type  as_generator:    bool
+
         @return:    list of documents from the DB that match the given criteria
                     for the collection associated with this controller
         @rtype:     list
@@ -94,13 +100,18 @@ class SearchController(JSONController):
             input['fields'] = fields
 
         criteria = Criteria.from_client_input(input)
-        return list(self.query_method(criteria))
+        return self._query(criteria, as_generator)
 
-    def _get_query_results_from_post(self, is_user_search=False):
+    def _get_query_results_from_post(self, is_user_search=False, as_generator=False):
         """
         Looks for a Criteria passed as a POST parameter on ket 'criteria', and
         returns the results of a search based on that Criteria.
 
+        @param as_generator:    if true, the results are returned as they
+                                come from the query method, typically a cursor,
+                                rather than as a list
+        @type  as_generator:    bool
+
         @return:    list of documents from the DB that match the given criteria
                     for the collection associated with this controller
         @rtype:     list
@@ -115,4 +126,10 @@ class SearchController(JSONController):
                 criteria.fields.append('id')
             if is_user_search and 'login' not in criteria.fields and u'login' not in criteria.fields:
                 criteria.fields.append('login')
-        return list(self.query_method(criteria))
+        return self._query(criteria, as_generator)
+
+    def _query(self, criteria, as_generator):
+        results = self.query_method(criteria)
+        if as_generator:
+            return results
+        return list(results)
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2012 Red Hat, Inc.
+#
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import time
+
+import mock
+
+import base
+
+from pulp.server.db.model.auth import Role, User
+from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth import authentication, password
+from pulp.server.managers.auth.cert.cert_generator import CertGenerationManager
+
+
+class AuthenticationManagerTests(base.PulpServerTests):
+
+    def setUp(self):
+        super(AuthenticationManagerTests, self).setUp()
+        self.user_manager = manager_factory.user_manager()
+        self.authentication_manager = manager_factory.authentication_manager()
+        self.password_manager = manager_factory.password_manager()
+
+    def clean(self):
+        base.PulpServerTests.clean(self)
+        User.get_collection().remove()
+        Role.get_collection().remove()
+        authentication.invalidate_credential_cache()
+        authentication.invalidate_certificate_cache()
+
+    def test_check_username_password(self):
+        self.user_manager.create_user('test-user', password='test-password')
+        login = self.authentication_manager.check_username_password('test-user', 'test-password')
+        self.assertEqual(login, 'test-user')
+        login = self.authentication_manager.check_username_password('test-user', 'wrong-password')
+        self.assertEqual(login, None)
+
+    def test_credentials_cached(self):
+        self.user_manager.create_user('test-user', password='test-password')
+        self.authentication_manager.check_username_password('test-user', 'test-password')
+        check_password = mock.Mock(wraps=self.password_manager.check_password)
+        self.mock(password.PasswordManager, 'check_password', check_password)
+
+        login = self.authentication_manager.check_username_password('test-user', 'test-password')
+        self.assertEqual(login, 'test-user')
+        self.assertEqual(check_password.call_count, 0)
+        # a different password is never answered from the cache
+        login = self.authentication_manager.check_username_password('test-user', 'wrong-password')
+        self.assertEqual(login, None)
+        self.assertEqual(check_password.call_count, 1)
+
+    def test_credentials_invalidated(self):
+        self.user_manager.create_user('test-user', password='test-password')
+        self.authentication_manager.check_username_password('test-user', 'test-password')
+        self.user_manager.update_user('test-user', {'password': 'new-password'})
+        login = self.authentication_manager.check_username_password('test-user', 'test-password')
+        self.assertEqual(login, None)
+        login = self.authentication_manager.check_username_password('test-user', 'new-password')
+        self.assertEqual(login, 'test-user')
+
+    def test_stored_password_unchanged(self):
+        self.user_manager.create_user('test-user', password='test-password')
+        stored = User.get_collection().find_one({'login': 'test-user'})['password']
+
+        login = self.authentication_manager.check_username_password('test-user', 'test-password')
+        self.assertEqual(login, 'test-user')
+        user = User.get_collection().find_one({'login': 'test-user'})
+        self.assertEqual(user['password'], stored)
+
+    def test_consumer_cert_cached(self):
+        key, cert_pem = manager_factory.cert_generation_manager().make_cert('test-consumer', 7)
+        verify_cert = mock.Mock(return_value=True)
+        self.mock(CertGenerationManager, 'verify_cert', verify_cert)
+
+        self.assertEqual(self.authentication_manager.check_consumer_cert(cert_pem), 'test-consumer')
+        self.assertEqual(self.authentication_manager.check_consumer_cert(cert_pem), 'test-consumer')
+        self.assertEqual(verify_cert.call_count, 1)
+        stats = authentication.certificate_cache_statistics()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_foreign_cert_not_cached(self):
+        key, cert_pem = manager_factory.cert_generation_manager().make_cert('test-consumer', 7)
+        verify_cert = mock.Mock(return_value=False)
+        self.mock(CertGenerationManager, 'verify_cert', verify_cert)
+
+        self.assertEqual(self.authentication_manager.check_consumer_cert(cert_pem), None)
+        self.assertEqual(self.authentication_manager.check_consumer_cert(cert_pem), None)
+        self.assertEqual(verify_cert.call_count, 2)
+
+
+class CredentialCacheTests(base.PulpServerTests):
+
+    def test_expiration(self):
+        cache = authentication.CredentialCache(ttl=10)
+        cache.add('user', 'password', 'user')
+        self.assertEqual(cache.get('user', 'password'), 'user')
+        self.assertEqual(cache.get('user', 'other'), None)
+        cache._entries['user'] = cache._entries['user'][:2] + (time.time() - 1,)
+        self.assertEqual(cache.get('user', 'password'), None)
+
+    def test_bounded(self):
+        cache = authentication.CredentialCache(size=3)
+        for i in range(5):
+            cache.add('user-%d' % i, 'password', 'user-%d' % i)
+        self.assertEqual(cache.statistics()['entries'], 3)
+        self.assertEqual(cache.get('user-0', 'password'), None)
+        self.assertEqual(cache.get('user-4', 'password'), 'user-4')
+
+    def test_invalidate(self):
+        cache = authentication.CredentialCache()
+        cache.add('user-1', 'password', 'user-1')
+        cache.add('user-2', 'password', 'user-2')
+        cache.invalidate('user-1')
+        self.assertEqual(cache.get('user-1', 'password'), None)
+        self.assertEqual(cache.get('user-2', 'password'), 'user-2')
+
+
+class CertificateCacheTests(base.PulpServerTests):
+
+    def test_least_recently_used_evicted(self):
+        cache = authentication.CertificateCache(size=2)
+        expiration = time.time() + 60
+        cache.add('a', 'consumer-a', expiration)
+        cache.add('b', 'consumer-b', expiration)
+        self.assertEqual(cache.get('a'), 'consumer-a')
+        cache.add('c', 'consumer-c', expiration)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 'consumer-a')
+        self.assertEqual(cache.get('c'), 'consumer-c')
+        self.assertEqual(cache.statistics()['evictions'], 1)
+
+    def test_expiration(self):
+        cache = authentication.CertificateCache()
+        cache.add('a', 'consumer-a', time.time() - 1)
+        self.assertEqual(cache.statistics()['entries'], 0)
+        cache.add('b', 'consumer-b', time.time() + 60)
+        cache._entries['b'][4] = time.time() - 1
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.statistics()['entries'], 0)
+
+    def test_invalidate(self):
+        cache = authentication.CertificateCache()
+        cache.add('a', 'consumer-a', time.time() + 60)
+        cache.invalidate()
+        self.assertEqual(cache.get('a'), None)
+        cache.add('a', 'consumer-a', time.time() + 60)
+        self.assertEqual(cache.get('a'), 'consumer-a')
+
+
+class AuthenticationPerformanceTests(base.PulpServerTests):
+
+    def clean(self):
+        base.PulpServerTests.clean(self)
+        User.get_collection().remove()
+        authentication.invalidate_credential_cache()
+
+    def _test_check_username_password_performance(self):
+        manager_factory.user_manager().create_user('test-user', password='test-password')
+        authentication_manager = manager_factory.authentication_manager()
+        count = 200
+
+        start = time.time()
+        for i in range(count):
+            authentication.invalidate_credential_cache()
+            authentication_manager.check_username_password('test-user', 'test-password')
+        uncached = count / (time.time() - start)
+
+        start = time.time()
+        for i in range(count):
+            authentication_manager.check_username_password('test-user', 'test-password')
+        cached = count / (time.time() - start)
+
+        print '\nuncached: %.1f auth/s, cached: %.1f auth/s' % (uncached, cached)
+        print authentication.credential_cache_statistics()
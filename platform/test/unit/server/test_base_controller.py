@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import datetime
+import os
+import resource
+import unittest
+
+import mock
+
+from pulp.server.compat import json, json_util, ObjectId
+from pulp.server.webservices.controllers import base
+from pulp.server.webservices.controllers.base import JSONController
+
+
+def _synthetic_units(count):
+    """
+    Generator of unit documents resembling those of an rpm repository.
+    """
+    for i in range(count):
+        yield {'_id' : str(ObjectId()),
+               'name' : 'package-%d' % i,
+               'version' : '1.%d' % i,
+               'release' : '1.el6',
+               'arch' : 'x86_64',
+               'checksum' : '%064x' % i,
+               'description' : 'Synthetic package %d ' % i * 8,
+               'created' : datetime.datetime.now()}
+
+
+class JSONArrayChunksTests(unittest.TestCase):
+
+    def test_matches_dumps(self):
+        for items in ([], [1], [{'a' : 1}, None, 'b', [2, 3]]):
+            body = ''.join(base._json_array_chunks(iter(items), 4))
+            self.assertEqual(json.dumps(items), body)
+
+    def test_bson_types(self):
+        items = list(_synthetic_units(3))
+        body = ''.join(base._json_array_chunks(items, 10))
+        self.assertEqual(json.dumps(items, default=json_util.default), body)
+
+    def test_chunk_size(self):
+        items = ['x' * 10] * 10 # 12 bytes each once encoded, plus separators
+
+        chunks = list(base._json_array_chunks(items, 30))
+
+        self.assertEqual(4, len(chunks)) # 3 items per chunk
+        for c in chunks[:-1]:
+            self.assertTrue(len(c) >= 30)
+
+    def test_lazy(self):
+        consumed = []
+        def items():
+            for i in range(4):
+                consumed.append(i)
+                yield i
+
+        chunks = base._json_array_chunks(items(), 1)
+
+        self.assertEqual('[0', chunks.next())
+        self.assertEqual([0], consumed)
+
+
+class OkStreamTests(unittest.TestCase):
+
+    @mock.patch('pulp.server.webservices.http.header')
+    @mock.patch('pulp.server.webservices.http.status_ok')
+    def test_ok_stream(self, mock_status_ok, mock_header):
+        body = JSONController().ok_stream(iter([{'a' : 1}]))
+
+        self.assertEqual(1, mock_status_ok.call_count)
+        mock_header.assert_called_once_with('Content-Type', 'application/json')
+        self.assertEqual('[{"a": 1}]', ''.join(body))
+
+
+class StreamingMemoryTests(unittest.TestCase):
+
+    UNIT_COUNT = 100000
+
+    def _peak_rss(self, write_body):
+        """
+        Runs the given function in a child process and returns the peak RSS,
+        in kB, of the child.
+        """
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                write_body(_synthetic_units(self.UNIT_COUNT))
+                os.write(write_fd, str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        peak = int(os.read(read_fd, 64))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        return peak
+
+    def _test_streaming_memory(self):
+        devnull = open(os.devnull, 'w')
+
+        def buffered(units):
+            devnull.write(json.dumps(list(units), default=json_util.default))
+
+        def streamed(units):
+            for chunk in base._json_array_chunks(units, base.STREAM_CHUNK_SIZE):
+                devnull.write(chunk)
+
+        baseline = self._peak_rss(lambda units: None)
+        buffered_peak = self._peak_rss(buffered)
+        streamed_peak = self._peak_rss(streamed)
+
+        print '\n%d units, peak RSS: baseline %d kB, buffered %d kB, streamed %d kB' % \
+              (self.UNIT_COUNT, baseline, buffered_peak, streamed_peak)
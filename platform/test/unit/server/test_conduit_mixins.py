@@ -140,6 +140,42 @@ class SingleRepoUnitsMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.DistributorConduitException, self.mixin.get_units)
 
+    @mock.patch('pulp.plugins.types.database.type_definition')
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoUnitAssociationQueryManager.get_units')
+    def test_get_units_as_generator(self, mock_query_call, mock_type_def_call):
+        # Setup
+        mock_query_call.return_value = iter([
+            {'unit_type_id' : 'type-1', 'metadata' : {'m' : 'm1', 'k1' : 'v1'}},
+            {'unit_type_id' : 'type-1', 'metadata' : {'m' : 'm1', 'k1' : 'v2'}},
+        ])
+
+        mock_type_def_call.return_value = {
+            'id' : 'mock-type-def',
+            'unit_key' : ['k1']
+        }
+
+        # Test
+        units = self.mixin.get_units(criteria='fake-criteria', as_generator=True)
+
+        # Verify
+        self.assertFalse(isinstance(units, list))
+        units = list(units)
+        self.assertEqual(2, len(units))
+        self.assertEqual(mock_query_call.call_args[1]['as_generator'], True)
+        self.assertEqual(1, mock_type_def_call.call_count) # only loaded once per type
+
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoUnitAssociationQueryManager.get_units')
+    def test_get_units_as_generator_server_error(self, mock_query_call):
+        # Setup
+        def failing_generator():
+            raise Exception()
+            yield
+        mock_query_call.return_value = failing_generator()
+
+        # Test
+        units = self.mixin.get_units(as_generator=True)
+        self.assertRaises(mixins.DistributorConduitException, list, units)
+
 
 class MultipleRepoUnitsMixinTests(unittest.TestCase):
 
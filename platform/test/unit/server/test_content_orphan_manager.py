@@ -15,16 +15,19 @@ import random
 import shutil
 import string
 import tempfile
+import time
 import traceback
 from pprint import pformat
 
 import base
+import mock
 
 from pulp.server import exceptions as pulp_exceptions
 from pulp.plugins.types import database as content_type_db
 from pulp.plugins.types.model import TypeDefinition
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.content import orphan as orphan_manager
 from pulp.server.managers.content.orphan import OrphanManager
 
 # globals and constants --------------------------------------------------------
@@ -183,6 +186,14 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
                           self.orphan_manager.get_orphan,
                           PHONY_TYPE_1.id, 'non-existent')
 
+    def test_get_associated_unit_not_orphan(self):
+        unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
+        associate_content_unit_with_repo(unit)
+
+        self.assertRaises(pulp_exceptions.MissingResource,
+                          self.orphan_manager.get_orphan,
+                          PHONY_TYPE_1.id, unit['_id'])
+
     def test_associated_units_using_generators(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
         associate_content_unit_with_repo(unit)
@@ -194,6 +205,44 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         orphans = list(self.orphan_manager.generate_all_orphans())
         self.assertEqual(len(orphans), 1)
 
+    @mock.patch.object(orphan_manager, 'ORPHAN_BATCH_SIZE', 2)
+    def test_orphans_across_batches_using_generators(self):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(5)]
+        for unit in units[1::2]:
+            associate_content_unit_with_repo(unit)
+
+        orphans = list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id))
+        orphan_ids = set(o['_id'] for o in orphans)
+        self.assertEqual(orphan_ids, set(u['_id'] for u in units[0::2]))
+
+    # NOTE this test is disabled for normal test runs
+    def _test_generate_orphans_performance(self):
+        num_units = 30000
+        gen_buttload_of_content_units(PHONY_TYPE_1.id, self.content_root, num_units)
+        collection = content_type_db.type_units_collection(PHONY_TYPE_1.id)
+        for unit in collection.find({}, fields=['_id', '_content_type_id']).limit(num_units / 2):
+            associate_content_unit_with_repo(unit)
+
+        def per_unit_orphans():
+            # the original, query-per-unit implementation
+            repo_content_units_collection = RepoContentUnit.get_collection()
+            for content_unit in collection.find({}, fields=['_id']):
+                if repo_content_units_collection.find({'unit_id': content_unit['_id']}).count() > 0:
+                    continue
+                yield content_unit
+
+        start = time.time()
+        per_unit_count = len(list(per_unit_orphans()))
+        per_unit_time = time.time() - start
+
+        start = time.time()
+        batch_count = len(list(self.orphan_manager.generate_orphans_by_type(PHONY_TYPE_1.id)))
+        batch_time = time.time() - start
+
+        print '\nper unit: %d orphans in %.2fs' % (per_unit_count, per_unit_time)
+        print 'batched: %d orphans in %.2fs' % (batch_count, batch_time)
+        self.assertEqual(per_unit_count, batch_count)
+
     # delete with generator test methods ---------------------------------------
 
     def test_delete_one_orphan_using_generators(self):
@@ -250,6 +299,18 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         self.assertFalse(os.path.exists(unit_1['_storage_path']))
         self.assertTrue(os.path.exists(unit_2['_storage_path']))
 
+    @mock.patch.object(orphan_manager, 'ORPHAN_BATCH_SIZE', 2)
+    def test_delete_by_type_filtered_by_ids(self):
+        units = [gen_content_unit(PHONY_TYPE_1.id, self.content_root) for i in range(5)]
+        doomed_ids = [units[0]['_id'], units[3]['_id']]
+
+        self.orphan_manager.delete_orphans_by_type(PHONY_TYPE_1.id, doomed_ids)
+
+        orphans = list(self.orphan_manager.generate_all_orphans())
+        self.assertEqual(len(orphans), 3)
+        self.assertFalse(set(doomed_ids) & set(o['_id'] for o in orphans))
+        self.assertEqual(self.number_of_files_in_content_root(), 3)
+
     def test_delete_by_id_using_generators(self):
         unit = gen_content_unit(PHONY_TYPE_1.id, self.content_root)
 
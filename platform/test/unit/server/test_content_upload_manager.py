@@ -12,6 +12,7 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
 import os
 import shutil
 
@@ -23,6 +24,7 @@ from   pulp.plugins.model import Repository
 from   pulp.server.db.model.auth import User
 from   pulp.server.db.model.repository import Repo, RepoImporter
 from   pulp.server.exceptions import MissingResource, PulpDataException, PulpExecutionException, InvalidValue
+from   pulp.server.managers.content import upload as upload_module
 import pulp.server.managers.factory as manager_factory
 from   pulp.server.managers.repo.unit_association import OWNER_TYPE_USER
 
@@ -108,6 +110,80 @@ class ContentUploadManagerTests(base.PulpServerTests):
         except MissingResource, e:
             self.assertEqual(e.resources['upload_request'], 'foo')
 
+    def test_save_data_out_of_order(self):
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload()
+
+        segments = [(4, 'efgh'), (0, 'abcd'), (12, 'mn'), (8, 'ijkl')]
+        for offset, data in segments:
+            self.upload_manager.save_data(upload_id, offset, data)
+
+        # Verify
+        written = self.upload_manager.read_upload(upload_id)
+        self.assertEqual(written, 'abcdefghijklmn')
+
+        upload_file = upload_module._UPLOAD_FILES.pop(upload_id)
+        self.assertEqual([[0, 14]], upload_file.ranges)
+        self.assertEqual(upload_file.checksums()['sha256'], hashlib.sha256(written).hexdigest())
+
+    def test_save_data_rewrite_discards_checksum(self):
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abcd')
+        self.upload_manager.save_data(upload_id, 2, 'xy')
+
+        # Verify
+        self.assertEqual(self.upload_manager.read_upload(upload_id), 'abxy')
+        upload_file = upload_module._UPLOAD_FILES.pop(upload_id)
+        self.assertEqual(upload_file.checksums(), None)
+
+    def test_save_data_incomplete_checksum(self):
+
+        # Test
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 4, 'efgh')
+
+        # Verify
+        upload_file = upload_module._UPLOAD_FILES.pop(upload_id)
+        self.assertEqual(upload_file.checksums(), None)
+
+    def test_save_data_after_delete(self):
+
+        # Setup
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+        self.upload_manager.delete_upload(upload_id)
+
+        # Test
+        self.assertRaises(MissingResource, self.upload_manager.save_data, upload_id, 3, 'def')
+
+    def test_upload_file_cache_bounded(self):
+
+        # Setup
+        cache = upload_module.UploadFileCache(size=2)
+        paths = {}
+        for upload_id in ('u1', 'u2', 'u3'):
+            paths[upload_id] = self.upload_manager._upload_file_path(upload_id)
+            open(paths[upload_id], 'w').close()
+
+        # Test
+        u1 = cache.get('u1', paths['u1'])
+        cache.get('u2', paths['u2'])
+        cache.get('u3', paths['u3'])
+
+        # Verify the least recently used file was closed
+        self.assertEqual(sorted(cache.files.keys()), ['u2', 'u3'])
+        self.assertTrue(u1.file is None)
+
+        # A closed file is reopened on write but can no longer be checksummed
+        u1.write(0, 'abc')
+        self.assertEqual(u1.checksums(), None)
+        u1.close()
+        cache.pop('u2')
+        cache.pop('u3')
+
     def test_delete_upload(self):
 
         # Setup
@@ -179,6 +255,7 @@ class ContentUploadManagerTests(base.PulpServerTests):
         mock_plugins.MOCK_IMPORTER.upload_unit.return_value = importer_return_report
 
         upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'fus ro dah')
         file_path = self.upload_manager._upload_file_path(upload_id)
 
         fake_user = User('import-user', '')
@@ -201,6 +278,8 @@ class ContentUploadManagerTests(base.PulpServerTests):
         self.assertEqual(conduit.association_owner_type, OWNER_TYPE_USER)
         self.assertEqual(conduit.association_owner_id, fake_user.login)
 
+        self.assertEqual(conduit.get_upload_checksum('sha256'), hashlib.sha256('fus ro dah').hexdigest())
+
         # Clean up
         mock_plugins.MOCK_IMPORTER.upload_unit.return_value = None
         manager_factory.principal_manager().set_principal(principal=None)
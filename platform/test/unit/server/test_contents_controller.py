@@ -20,6 +20,7 @@ import base
 import dummy_plugins
 from pulp.server.db.model.repository import Repo, RepoImporter
 import pulp.server.managers.factory as manager_factory
+from pulp.server.webservices.controllers import contents
 from pulp.server.webservices.controllers.contents import ContentUnitsCollection, ContentUnitsSearch
 
 
@@ -127,6 +128,21 @@ class TestContentUnitsSearch(base.PulpWebserviceTests):
         self.assertEqual(body[0].get('repository_memberships'), ['repo1'])
 
 
+    @mock.patch.object(contents, 'REPO_MEMBERSHIP_BATCH_SIZE', 1)
+    @mock.patch(
+        'pulp.server.managers.content.query.ContentQueryManager.find_by_criteria',
+        return_value=[{'_id':'foo'}, {'_id':'bar'}])
+    @mock.patch('pulp.server.managers.repo.unit_association_query.RepoUnitAssociationQueryManager.find_by_criteria')
+    def test_add_repo_memberships_batches(self, mock_find_assoc, mock_find_unit):
+        mock_find_assoc.return_value = [{'unit_id':'foo', 'repo_id':'repo1'},
+                                        {'unit_id':'bar', 'repo_id':'repo2'}]
+        status, body = self.get('/v2/content/units/rpm/search/?include_repos=true')
+        self.assertEqual(status, 200)
+        self.assertEqual(2, mock_find_assoc.call_count)
+        self.assertEqual(['foo', 'bar'], [u['_id'] for u in body])
+        self.assertEqual(['repo1'], body[0]['repository_memberships'])
+        self.assertEqual(['repo2'], body[1]['repository_memberships'])
+
 class TestContentUnitsSearchNonWeb(base.PulpServerTests):
     def setUp(self):
         super(TestContentUnitsSearchNonWeb, self).setUp()
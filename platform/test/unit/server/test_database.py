@@ -13,6 +13,10 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import logging
+import unittest
+
+import mock
+from pymongo.errors import AutoReconnect
 
 import base
 
@@ -32,3 +36,74 @@ class TestDatabase(base.PulpServerTests):
 
     def test_database_name(self):
         self.assertEquals(connection._database.name, self.config.get("database", "name"))
+
+    def test_get_collection_cached(self):
+        collection = connection.get_collection('test_collection')
+        self.assertTrue(collection is connection.get_collection('test_collection'))
+        self.assertTrue(isinstance(collection, connection.PulpCollection))
+
+    def test_initialize_resets_collections(self):
+        collection = connection.get_collection('test_collection')
+        connection.initialize()
+        self.assertFalse(collection is connection.get_collection('test_collection'))
+
+    def test_retry_methods_not_rebound(self):
+        collection = connection.get_collection('test_collection')
+        self.assertFalse('find' in collection.__dict__)
+
+
+class RetryDecoratorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        self.collection = mock.Mock(retries=1, full_name='db.collection',
+                                    timing=connection.OperationTiming())
+
+    def _find(self, failures):
+        def find(collection, spec):
+            self.calls += 1
+            if self.calls <= failures:
+                raise AutoReconnect()
+            return spec
+        return connection._retry_decorator(find)
+
+    @mock.patch('time.sleep')
+    def test_retry(self, mock_sleep):
+        find = self._find(1)
+        self.assertEqual('spec', find(self.collection, 'spec'))
+        self.assertEqual(2, self.calls)
+
+    @mock.patch('time.sleep')
+    def test_retries_exhausted(self, mock_sleep):
+        find = self._find(2)
+        self.assertRaises(connection.PulpCollectionFailure, find, self.collection, 'spec')
+        self.assertEqual(2, self.calls)
+
+    @mock.patch.object(connection, '_operation_timing', True)
+    def test_timing(self):
+        find = self._find(0)
+        find(self.collection, 'spec')
+        find(self.collection, 'spec')
+
+        timing = self.collection.timing.statistics()
+        self.assertEqual(['find'], timing.keys())
+        self.assertEqual(2, timing['find']['count'])
+        self.assertTrue(timing['find']['max'] <= timing['find']['total'])
+
+    def test_timing_disabled(self):
+        find = self._find(0)
+        find(self.collection, 'spec')
+        self.assertEqual({}, self.collection.timing.statistics())
+
+    def test_operation_timing_statistics(self):
+        self.collection.timing.record('find', 0.5)
+        collections = {'collection': self.collection,
+                       'other': mock.Mock(timing=connection.OperationTiming())}
+
+        with mock.patch.object(connection, '_collections', collections):
+            statistics = connection.operation_timing_statistics()
+            self.assertEqual({'collection': {'find': {'count': 1, 'total': 0.5, 'max': 0.5}}},
+                             statistics)
+
+            connection.reset_operation_timing()
+            self.assertEqual({}, connection.operation_timing_statistics())
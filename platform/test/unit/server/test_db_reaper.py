@@ -15,6 +15,7 @@ from datetime import timedelta
 from threading import Thread
 from types import NoneType
 
+import mock
 from isodate import Duration
 
 import base
@@ -104,3 +105,41 @@ class ReaperReapingTests(BaseReaperTests):
         self.assertTrue(self.collection.find({'_id': event['_id']}).count() == 0)
 
 
+
+    def _insert_events(self, count):
+        events = [ConsumerHistoryEvent('consumer', 'originator', 'consumer_registered', {})
+                  for i in range(count)]
+        self.collection.insert(events, safe=True)
+        return sorted(e['_id'] for e in events)
+
+    def test_remove_expired_entries_in_batches(self):
+        self._insert_events(25)
+        self.reaper.batch_size = 10
+        self.reaper._pause = mock.Mock(return_value=True)
+        expired_oid = self.reaper._create_expired_object_id(timedelta(seconds=-1))
+        self.assertTrue(self.reaper._remove_expired_entries(self.collection, expired_oid))
+        self.assertEqual(self.collection.find().count(), 0)
+        self.assertEqual(self.reaper._pause.call_count, 2)
+
+    def test_remove_expired_entries_stopped(self):
+        self._insert_events(25)
+        self.reaper.batch_size = 10
+        self.reaper._pause = mock.Mock(return_value=False)
+        expired_oid = self.reaper._create_expired_object_id(timedelta(seconds=-1))
+        self.assertFalse(self.reaper._remove_expired_entries(self.collection, expired_oid))
+        self.assertEqual(self.collection.find().count(), 15)
+
+    def test_remove_excess_entries(self):
+        ids = self._insert_events(25)
+        self.reaper.batch_size = 10
+        self.assertTrue(self.reaper._remove_excess_entries(self.collection, 10))
+        remaining = sorted(e['_id'] for e in self.collection.find())
+        self.assertEqual(remaining, ids[-10:])
+
+    def test_limit_collection(self):
+        self._insert_events(5)
+        self.reaper.limit_collection(self.collection, 2)
+        self.reaper._reap_expired_collection_entries()
+        self.assertEqual(self.collection.find().count(), 2)
+        self.reaper.remove_collection(self.collection)
+        self.assertFalse(self.collection in self.reaper.collection_limits)
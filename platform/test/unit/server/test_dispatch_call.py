@@ -11,10 +11,16 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import datetime
+import pickle
+import time
+
 import base
 
 from pulp.server.dispatch import constants as dispatch_constants
+from pulp.server.dispatch import pickling, serialization
 from pulp.server.dispatch.call import CallReport, CallRequest
+from pulp.server.managers.auth.user.system import SystemUser
 
 # call test api ----------------------------------------------------------------
 
@@ -34,6 +40,19 @@ class Class(object):
     def method(self, *args, **kwargs):
         pass
 
+    @classmethod
+    def class_method(cls, *args, **kwargs):
+        pass
+
+
+class StatefulClass(object):
+
+    def __init__(self):
+        self.value = 1
+
+    def method(self, *args, **kwargs):
+        pass
+
 
 def function(*args, **kwargs):
     pass
@@ -138,6 +157,130 @@ class CallRequestTests(base.PulpServerTests):
         self.assertTrue(isinstance(call_request_2, CallRequest))
         self.assertTrue(call_request_2.execution_hooks[key][0] == function)
 
+    def test_serialize_by_name(self):
+        args = ['fee', 'fie', 'foe', 'foo']
+        kwargs = {'one': 'foo', 'two': {'three': [1, 2.0, None, True]}}
+        call_request = CallRequest(Class().method, args, kwargs)
+        call_request.add_control_hook(dispatch_constants.CALL_CANCEL_CONTROL_HOOK, Class.class_method)
+        data = call_request.serialize()
+        self.assertEqual(data['call'], {serialization.NAME_KEY: __name__ + '.Class.method',
+                                        serialization.KIND_KEY: serialization.METHOD})
+        self.assertEqual(data['args'], args)
+        self.assertEqual(data['kwargs'], kwargs)
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(isinstance(call_request_2.call.im_self, Class))
+        self.assertEqual(call_request_2.call.im_func, Class.method.im_func)
+        self.assertEqual(call_request_2.args, args)
+        self.assertEqual(call_request_2.kwargs, kwargs)
+        hook = call_request_2.control_hooks[dispatch_constants.CALL_CANCEL_CONTROL_HOOK]
+        self.assertEqual(hook, Class.class_method)
+
+    def test_serialize_pickle_fallback(self):
+        pickling.initialize() # instance method pickling support
+        instance = StatefulClass()
+        args = [datetime.datetime(2012, 1, 1), ('a', 'b')]
+        kwargs = {'a.b': 1}
+        call_request = CallRequest(instance.method, args, kwargs)
+        call_request.add_life_cycle_callback(dispatch_constants.CALL_CANCEL_LIFE_CYCLE_CALLBACK, Functor())
+        data = call_request.serialize()
+        self.assertTrue(serialization.PICKLE_KEY in data['call'])
+        self.assertTrue(isinstance(data['args'], str))
+        self.assertTrue(isinstance(data['kwargs'], str))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertEqual(call_request_2.call.im_self.value, 1)
+        self.assertEqual(call_request_2.args, args)
+        self.assertEqual(call_request_2.kwargs, kwargs)
+        hooks = call_request_2.execution_hooks[dispatch_constants.CALL_CANCEL_LIFE_CYCLE_CALLBACK]
+        self.assertTrue(isinstance(hooks[0], Functor))
+
+    def test_serialize_binary_string_pickled(self):
+        args = ['fee', '\xff\xfe']
+        kwargs = {'one': 'foo', 'two': {'\xff': 1}}
+        call_request = CallRequest(function, args, kwargs)
+        data = call_request.serialize()
+        self.assertTrue(isinstance(data['args'], str))
+        self.assertTrue(isinstance(data['kwargs'], str))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertEqual(call_request_2.args, args)
+        self.assertEqual(call_request_2.kwargs, kwargs)
+
+    def test_serialize_large_integer_pickled(self):
+        args = [2 ** 63 - 1, -2 ** 63]
+        kwargs = {'size': 2 ** 64}
+        call_request = CallRequest(function, args, kwargs)
+        data = call_request.serialize()
+        self.assertEqual(data['args'], args)
+        self.assertTrue(isinstance(data['kwargs'], str))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertEqual(call_request_2.args, args)
+        self.assertEqual(call_request_2.kwargs, kwargs)
+
+    def test_deserialize_legacy(self):
+        call_request = CallRequest(function, ['fee'], {'one': 'foo'})
+        data = {'callable_name': call_request.callable_name()}
+        for field in CallRequest.copied_fields:
+            data[field] = getattr(call_request, field)
+        for field in CallRequest.pickled_fields:
+            data[field] = unicode(pickle.dumps(getattr(call_request, field)))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(isinstance(call_request_2, CallRequest))
+        self.assertEqual(call_request_2.id, call_request.id)
+        self.assertTrue(call_request_2.call is function)
+        self.assertEqual(call_request_2.args, ['fee'])
+        self.assertEqual(call_request_2.kwargs, {'one': 'foo'})
+
+    def test_deserialize_system_principal(self):
+        call_request = CallRequest(function, principal=SystemUser())
+        data = call_request.serialize()
+        self.assertFalse(isinstance(data['principal'], basestring))
+        call_request_2 = CallRequest.deserialize(data)
+        self.assertTrue(call_request_2.principal is SystemUser())
+
+    def test_register_callable(self):
+        registry = serialization.CallableRegistry()
+        registry.register(function, 'alias')
+        self.assertEqual(registry.name(function), ('alias', serialization.FUNCTION))
+        self.assertTrue(registry.load('alias', serialization.FUNCTION) is function)
+
+    def test_unnamed_callables(self):
+        registry = serialization.CallableRegistry()
+        self.assertTrue(registry.name(lambda: None) is None)
+        self.assertTrue(registry.name(Functor()) is None)
+        self.assertTrue(registry.name(StatefulClass().method) is None)
+        self.assertTrue(registry.name({}.get) is None)
+
+    def _test_serialization_performance(self):
+        pickling.initialize()
+        call_request = CallRequest(Class().method, ['repo-id'], {'overrides': {'num_threads': 4}})
+        call_request.add_control_hook(dispatch_constants.CALL_CANCEL_CONTROL_HOOK, function)
+        data = call_request.serialize()
+        legacy = {'callable_name': data['callable_name']}
+        for field in CallRequest.copied_fields:
+            legacy[field] = data[field]
+        for field in CallRequest.pickled_fields:
+            legacy[field] = pickle.dumps(getattr(call_request, field))
+        count = 10000
+
+        start = time.time()
+        for i in range(count):
+            call_request.serialize()
+        serialize_time = time.time() - start
+
+        start = time.time()
+        for i in range(count):
+            CallRequest.deserialize(data)
+        deserialize_time = time.time() - start
+
+        start = time.time()
+        for i in range(count):
+            CallRequest.deserialize(legacy)
+        legacy_time = time.time() - start
+
+        print '\nserialize: %d/s, deserialize: %d/s, legacy deserialize: %d/s' % \
+              (count / serialize_time, count / deserialize_time, count / legacy_time)
+        print 'serialized size: %d bytes, legacy: %d bytes' % \
+              (len(repr(data)), len(repr(legacy)))
+
     def test_call_report_instantiation(self):
         try:
             call_report = CallReport()
@@ -12,6 +12,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
+import time
 import traceback
 import unittest
 
@@ -52,6 +53,7 @@ class CoordinatorTests(base.PulpServerTests):
 
     def tearDown(self):
         super(CoordinatorTests, self).tearDown()
+        self.coordinator.resource_lock_table.clear()
         self.coordinator = None
         dispatch_factory._task_queue = self._task_queue_factory
         self._task_queue_factory = None
@@ -60,6 +62,10 @@ class CoordinatorTests(base.PulpServerTests):
         QueuedCall.get_collection().drop()
         ArchivedCall.get_collection().drop()
 
+    def add_call_resources(self, call_resources):
+        self.collection.insert(call_resources, safe=True)
+        self.coordinator.resource_lock_table.add(call_resources)
+
 # or query tests ---------------------------------------------------------------
 
 class OrQueryTests(CoordinatorTests):
@@ -206,7 +212,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
 
         call_resources = coordinator.resource_dict_to_call_resources(resources)
         coordinator.set_call_request_id_on_call_resources(task_id, call_resources)
-        self.collection.insert(call_resources, safe=True)
+        self.add_call_resources(call_resources)
 
         response, blockers, reasons, call_resources = self.coordinator._find_conflicts(resources)
 
@@ -229,7 +235,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         }
         existing_task_resources = coordinator.resource_dict_to_call_resources(existing_resources)
         coordinator.set_call_request_id_on_call_resources(task_id, existing_task_resources)
-        self.collection.insert(existing_task_resources, safe=True)
+        self.add_call_resources(existing_task_resources)
 
         # delete on content unit is postponed by read
 
@@ -276,8 +282,8 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         task_2_resources = coordinator.resource_dict_to_call_resources(bind_2_resources)
         coordinator.set_call_request_id_on_call_resources(call_2_id, task_2_resources)
 
-        self.collection.insert(task_1_resources, safe=True)
-        self.collection.insert(task_2_resources, safe=True)
+        self.add_call_resources(task_1_resources)
+        self.add_call_resources(task_2_resources)
 
         # deleting the repository should be postponed by both binds
 
@@ -305,7 +311,7 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         }
         deletion_task_resources = coordinator.resource_dict_to_call_resources(deletion_resources)
         coordinator.set_call_request_id_on_call_resources(task_id, deletion_task_resources)
-        self.collection.insert(deletion_task_resources, safe=True)
+        self.add_call_resources(deletion_task_resources)
 
         # a cds sync should be rejected by the deletion
 
@@ -324,12 +330,103 @@ class CoordinatorCollisionDetectionTests(CoordinatorTests):
         self.assertTrue(task_id in blockers)
         self.assertTrue(reasons)
 
+    def test_duplicate_reasons(self):
+        # two binds to the same repository report a single reason
+        repo_id = 'my_repo'
+        for call_request_id in ('first_bind', 'second_bind'):
+            resources = {
+                dispatch_constants.RESOURCE_REPOSITORY_TYPE: {
+                    repo_id: dispatch_constants.RESOURCE_READ_OPERATION
+                }
+            }
+            call_resources = coordinator.resource_dict_to_call_resources(resources)
+            coordinator.set_call_request_id_on_call_resources(call_request_id, call_resources)
+            self.add_call_resources(call_resources)
+
+        resources = {
+            dispatch_constants.RESOURCE_REPOSITORY_TYPE: {
+                repo_id: dispatch_constants.RESOURCE_DELETE_OPERATION
+            }
+        }
+        response, blockers, reasons, call_resources = self.coordinator._find_conflicts(resources)
+
+        self.assertTrue(response is dispatch_constants.CALL_POSTPONED_RESPONSE)
+        self.assertEqual(blockers, set(['first_bind', 'second_bind']))
+        self.assertEqual(reasons, [{'resource_type': dispatch_constants.RESOURCE_REPOSITORY_TYPE,
+                                    'resource_id': repo_id,
+                                    'operation': dispatch_constants.RESOURCE_READ_OPERATION}])
+
+    def test_database_not_queried(self):
+        resources = {
+            dispatch_constants.RESOURCE_REPOSITORY_TYPE: {
+                'my_repo': dispatch_constants.RESOURCE_UPDATE_OPERATION
+            }
+        }
+        call_resources = coordinator.resource_dict_to_call_resources(resources)
+        coordinator.set_call_request_id_on_call_resources('existing_task', call_resources)
+        self.add_call_resources(call_resources)
+
+        with mock.patch.object(CallResource, 'get_collection') as mock_get_collection:
+            response, blockers, reasons, call_resources = self.coordinator._find_conflicts(resources)
+
+        self.assertEqual(mock_get_collection.call_count, 0)
+        self.assertTrue(response is dispatch_constants.CALL_POSTPONED_RESPONSE)
+        self.assertTrue('existing_task' in blockers)
+
+# resource lock table tests ----------------------------------------------------
+
+class ResourceLockTableTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ResourceLockTableTests, self).setUp()
+        self.table = coordinator.ResourceLockTable()
+
+    def _call_resources(self, call_request_id, resources):
+        call_resources = coordinator.resource_dict_to_call_resources(resources)
+        coordinator.set_call_request_id_on_call_resources(call_request_id, call_resources)
+        return call_resources
+
+    def test_add_find(self):
+        self.table.add(self._call_resources('call-1', {'repository': {'repo-1': 'read', 'repo-2': 'update'}}))
+        self.table.add(self._call_resources('call-2', {'repository': {'repo-1': 'update'}}))
+
+        self.assertEqual(sorted(self.table.find('repository', 'repo-1')),
+                         [('call-1', 'read'), ('call-2', 'update')])
+        self.assertEqual(self.table.find('repository', 'repo-2'), [('call-1', 'update')])
+        self.assertEqual(self.table.find('repository', 'repo-3'), [])
+        self.assertEqual(self.table.find('consumer', 'repo-1'), [])
+
+    def test_remove(self):
+        self.table.add(self._call_resources('call-1', {'repository': {'repo-1': 'read', 'repo-2': 'update'}}))
+        self.table.add(self._call_resources('call-2', {'repository': {'repo-1': 'update'}}))
+
+        self.table.remove('call-1')
+
+        self.assertEqual(self.table.find('repository', 'repo-1'), [('call-2', 'update')])
+        self.assertEqual(self.table.find('repository', 'repo-2'), [])
+        self.assertEqual(len(self.table), 1)
+
+        # removing an unknown call request is a no-op
+        self.table.remove('call-1')
+        self.table.remove('call-2')
+        self.assertEqual(len(self.table), 0)
+
+    def test_clear(self):
+        self.table.add(self._call_resources('call-1', {'repository': {'repo-1': 'read'}}))
+        self.table.clear()
+        self.assertEqual(self.table.find('repository', 'repo-1'), [])
+        self.assertEqual(len(self.table), 0)
+
 # call execution tests ---------------------------------------------------------
 
 def dummy_call(progress, success, failure):
     pass
 
 
+def trivial_call():
+    pass
+
+
 class CoordinatorRunTaskTests(CoordinatorTests):
 
     def setUp(self):
@@ -364,6 +461,40 @@ class CoordinatorWaitForTaskTests(CoordinatorTests):
                           self.coordinator._run_task,
                           task, timeout)
 
+    def test_wait_for_task_complete(self):
+        task = Task(call.CallRequest(trivial_call))
+        task.run()
+        coordinator.wait_for_task(task, dispatch_constants.CALL_COMPLETE_STATES,
+                                  timeout=datetime.timedelta(seconds=5))
+        self.assertTrue(task.call_report.state is dispatch_constants.CALL_FINISHED_STATE)
+
+    def _test_synchronous_call_latency(self):
+        num_calls = 200
+        poll_interval = 0.1 # server configuration default
+
+        def polling_wait(task, states):
+            # the original, polling implementation
+            while task.call_report.state not in states:
+                time.sleep(poll_interval)
+
+        def latencies(wait):
+            results = []
+            for i in range(num_calls):
+                task = Task(call.CallRequest(trivial_call))
+                start = time.time()
+                task.run()
+                wait(task, dispatch_constants.CALL_COMPLETE_STATES)
+                results.append(time.time() - start)
+            results.sort()
+            return results[num_calls / 2], results[int(num_calls * 0.99)]
+
+        polling_p50, polling_p99 = latencies(polling_wait)
+        push_p50, push_p99 = latencies(coordinator.wait_for_task)
+
+        print '\npolling: p50 %.2fms p99 %.2fms' % (polling_p50 * 1000, polling_p99 * 1000)
+        print 'push: p50 %.2fms p99 %.2fms' % (push_p50 * 1000, push_p99 * 1000)
+        self.assertTrue(push_p50 < polling_p50)
+
 
 class CoordinatorCallExecutionTests(CoordinatorTests):
 
@@ -393,6 +524,47 @@ class CoordinatorCallExecutionTests(CoordinatorTests):
         self.assertTrue(self.coordinator._process_tasks.call_count == 1)
         self.assertTrue(self.coordinator._run_task.call_count == 0)
 
+class ResourceLockTableSyncTests(CoordinatorTests):
+
+    def test_process_tasks(self):
+        call_request = call.CallRequest(dummy_call, resources={'repository': {'repo-1': 'update'}})
+        task = Task(call_request)
+
+        self.coordinator._process_tasks([task])
+
+        self.assertEqual(self.coordinator.resource_lock_table.find('repository', 'repo-1'),
+                         [(call_request.id, 'update')])
+        self.assertEqual(self.collection.find({'call_request_id': call_request.id}).count(), 1)
+
+    def test_process_tasks_rejected(self):
+        self.coordinator._find_conflicts = mock.Mock(return_value=(dispatch_constants.CALL_REJECTED_RESPONSE, set(), [], []))
+        call_request = call.CallRequest(dummy_call, resources={'repository': {'repo-1': 'update'}})
+
+        self.coordinator._process_tasks([Task(call_request)])
+
+        self.assertEqual(len(self.coordinator.resource_lock_table), 0)
+
+    def test_dequeue_callback(self):
+        call_request = call.CallRequest(dummy_call, resources={'repository': {'repo-1': 'update'}})
+        call_resources = coordinator.resource_dict_to_call_resources(call_request.resources)
+        coordinator.set_call_request_id_on_call_resources(call_request.id, call_resources)
+        self.add_call_resources(call_resources)
+
+        coordinator.coordinator_dequeue_callback(call_request, None)
+
+        self.assertEqual(self.coordinator.resource_lock_table.find('repository', 'repo-1'), [])
+        self.assertEqual(self.collection.find({'call_request_id': call_request.id}).count(), 0)
+
+    def test_start_clears_table(self):
+        call_resources = coordinator.resource_dict_to_call_resources({'repository': {'repo-1': 'update'}})
+        coordinator.set_call_request_id_on_call_resources('stale_call', call_resources)
+        self.add_call_resources(call_resources)
+
+        self.coordinator.start()
+
+        self.assertEqual(len(self.coordinator.resource_lock_table), 0)
+        self.assertEqual(self.collection.find().count(), 0)
+
 # multiple call execution tests ------------------------------------------------
 
 class TopologicalSortTests(unittest.TestCase):
@@ -553,6 +725,27 @@ class CoordinatorFindCallReportsTests(CoordinatorTests):
         self.assertEqual(len(call_report_list), 1)
         self.assertEqual(call_report_list[0].call_request_id, call_request.id)
 
+    def test_find_by_call_request_id_uses_index(self):
+        call_request = call.CallRequest(find_dummy_call)
+        task = Task(call_request)
+        self.set_task_queue([])
+        dispatch_factory._task_queue().get = mock.Mock(return_value=task)
+
+        call_report_list = self.coordinator.find_call_reports(call_request_id=call_request.id)
+        self.assertEqual(len(call_report_list), 1)
+        self.assertEqual(call_report_list[0].call_request_id, call_request.id)
+        dispatch_factory._task_queue().get.assert_called_once_with(call_request.id)
+
+    def test_find_by_tags_uses_index(self):
+        call_request = call.CallRequest(find_dummy_call, tags=['a', 'b'])
+        task = Task(call_request)
+        self.set_task_queue([])
+        dispatch_factory._task_queue().find = mock.Mock(return_value=[task])
+
+        call_report_list = self.coordinator.find_call_reports(tags=['a', 'b'])
+        self.assertEqual(len(call_report_list), 1)
+        dispatch_factory._task_queue().find.assert_called_once_with('a', 'b')
+
 # coordinator start tests ------------------------------------------------------
 
 class CoordinatorStartTests(CoordinatorTests):
@@ -11,7 +11,9 @@
 # You should have received a copy of GPLv2 along with this software; if not,
 # see http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt
 
-from pulp.server.db.model.dispatch import ArchivedCall
+import time
+
+from pulp.server.db.model.dispatch import ArchivedCall, ArchivedCallResult
 from pulp.server.dispatch import call, history
 
 import base
@@ -23,10 +25,14 @@ class ArchivedCallTests(base.PulpServerTests):
         super(ArchivedCallTests, self).setUp()
         self.archived_call_collection = ArchivedCall.get_collection()
         self.archived_call_collection.remove(safe=True) # cleanup others' messes
+        self.archived_result_collection = ArchivedCallResult.get_collection()
+        self.archived_result_collection.remove(safe=True)
 
     def tearDown(self):
         super(ArchivedCallTests, self).tearDown()
+        history._ARCHIVE_BUFFER = None
         self.archived_call_collection.remove(safe=True)
+        self.archived_result_collection.remove(safe=True)
 
     def _generate_request_and_report(self):
 
@@ -62,3 +68,57 @@ class ArchivedCallCreateTests(ArchivedCallTests):
         archived_calls = history.find_archived_calls(call_request_group_id='123')
         self.assertEqual(archived_calls.count(), 1)
 
+
+    def test_archived_result(self):
+        call_request, call_report = self._generate_request_and_report()
+        call_report.result = {'units': range(100)}
+        history.archive_call(call_request, call_report)
+        archived_call = self.archived_call_collection.find_one()
+        self.assertTrue(archived_call['result_archived'])
+        self.assertEqual(archived_call['serialized_call_report']['result'], None)
+        self.assertEqual(self.archived_result_collection.find().count(), 1)
+        serialized_call_report = history.archived_call_report(archived_call)
+        self.assertEqual(serialized_call_report['result'], {'units': range(100)})
+
+    def test_no_result(self):
+        call_request, call_report = self._generate_request_and_report()
+        history.archive_call(call_request, call_report)
+        archived_call = self.archived_call_collection.find_one()
+        self.assertFalse(archived_call['result_archived'])
+        self.assertEqual(self.archived_result_collection.find().count(), 0)
+        serialized_call_report = history.archived_call_report(archived_call)
+        self.assertEqual(serialized_call_report['result'], None)
+
+
+class ArchiveBufferTests(ArchivedCallTests):
+
+    def test_flush_when_full(self):
+        history._ARCHIVE_BUFFER = history.ArchiveBuffer(3, 60)
+        for i in range(2):
+            history.archive_call(*self._generate_request_and_report())
+        self.assertEqual(self.archived_call_collection.find().count(), 0)
+        history.archive_call(*self._generate_request_and_report())
+        self.assertEqual(self.archived_call_collection.find().count(), 3)
+        self.assertEqual(len(history._ARCHIVE_BUFFER), 0)
+
+    def test_flush_interval(self):
+        history._ARCHIVE_BUFFER = history.ArchiveBuffer(100, 0.1)
+        history.archive_call(*self._generate_request_and_report())
+        time.sleep(.5)
+        self.assertEqual(self.archived_call_collection.find().count(), 1)
+
+    def test_find_flushes(self):
+        history._ARCHIVE_BUFFER = history.ArchiveBuffer(100, 60)
+        call_request, call_report = self._generate_request_and_report()
+        call_report.result = 'result'
+        history.archive_call(call_request, call_report)
+        archived_calls = history.find_archived_calls(call_request_id=call_report.call_request_id)
+        self.assertEqual(archived_calls.count(), 1)
+        self.assertEqual(history.archived_call_report(archived_calls[0])['result'], 'result')
+
+    def test_finalize(self):
+        history._ARCHIVE_BUFFER = history.ArchiveBuffer(100, 60)
+        history.archive_call(*self._generate_request_and_report())
+        history.finalize()
+        self.assertTrue(history._ARCHIVE_BUFFER is None)
+        self.assertEqual(self.archived_call_collection.find().count(), 1)
@@ -13,6 +13,7 @@
 
 import datetime
 import threading
+import time
 import traceback
 
 import isodate
@@ -37,9 +38,19 @@ def itinerary_call(*args, **kwargs):
     call_request = CallRequest(_call, args, kwargs)
     return [call_request]
 
+def multiple_itinerary_call(*args, **kwargs):
+    def _call(*args, **kwargs):
+        pass
+    return [CallRequest(_call, args, kwargs), CallRequest(_call, args, kwargs)]
+
 def dummy_call():
     pass
 
+def complete_call(call_request):
+    call_report = CallReport.from_call_request(call_request)
+    for hook in call_request.execution_hooks[dispatch_constants.CALL_COMPLETE_LIFE_CYCLE_CALLBACK]:
+        hook(call_request, call_report)
+
 SCHEDULE_3_RUNS = 'R3/PT30M'
 SCHEDULE_0_RUNS = 'R0/P1D'
 SCHEDULE_INDEFINITE_RUNS = 'PT12H'
@@ -261,6 +272,174 @@ class SchedulerSchedulingTests(SchedulerTests):
         # generator
         self.assertRaises(StopIteration, next, call_group_generator)
 
+# batched scheduling tests -----------------------------------------------------
+
+class SchedulerBatchedTests(SchedulerTests):
+
+    def setUp(self):
+        super(SchedulerBatchedTests, self).setUp()
+        self.scheduler = Scheduler(batched=True)
+        dispatch_factory._SCHEDULER = self.scheduler
+        self.coordinator = dispatch_factory.coordinator.return_value
+        self.coordinator.find_call_reports.return_value = []
+
+    def add_due_schedule(self, itinerary=itinerary_call):
+        call_request = CallRequest(itinerary)
+        schedule = dateutils.format_iso8601_interval(datetime.timedelta(minutes=1),
+                                                     datetime.datetime.now())
+        schedule_id = self.scheduler.add(call_request, schedule)
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                              {'$set': {'next_run': datetime.datetime.utcnow()}},
+                                              safe=True)
+        return schedule_id
+
+    def test_claim(self):
+        schedule_id = self.add_due_schedule()
+        scheduled_call = self.scheduled_call_collection.find_one({'_id': ObjectId(schedule_id)})
+        next_run = self.scheduler.calculate_next_run(scheduled_call)
+
+        call_groups = list(self.scheduler._get_scheduled_call_groups())
+
+        self.assertEqual(len(call_groups), 1)
+        self.assertEqual(call_groups[0][0].schedule_id, schedule_id)
+        updated_scheduled_call = self.scheduled_call_collection.find_one({'_id': ObjectId(schedule_id)})
+        self.assertEqual(updated_scheduled_call['next_run'], next_run)
+        self.assertFalse('claim_id' in updated_scheduled_call)
+        self.assertFalse('claim_expires' in updated_scheduled_call)
+
+    def test_claimed_by_other(self):
+        schedule_id = self.add_due_schedule()
+        claim_expires = datetime.datetime.utcnow() + datetime.timedelta(minutes=1)
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                              {'$set': {'claim_id': 'other', 'claim_expires': claim_expires}},
+                                              safe=True)
+
+        self.assertEqual(list(self.scheduler._get_scheduled_call_groups()), [])
+
+        # an expired claim may be taken over
+        claim_expires = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                              {'$set': {'claim_expires': claim_expires}},
+                                              safe=True)
+
+        self.assertEqual(len(list(self.scheduler._get_scheduled_call_groups())), 1)
+
+    def test_in_flight(self):
+        schedule_id = self.add_due_schedule()
+
+        self.scheduler._run_scheduled_calls()
+        self.assertEqual(self.coordinator.execute_call_asynchronously.call_count, 1)
+
+        # the first call has not completed, so the schedule is skipped
+        self.scheduler._run_scheduled_calls()
+        self.assertEqual(self.coordinator.execute_call_asynchronously.call_count, 1)
+
+        call_request = self.coordinator.execute_call_asynchronously.call_args[0][0]
+        complete_call(call_request)
+
+        # make the schedule due again
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                              {'$set': {'next_run': datetime.datetime.utcnow()}},
+                                              safe=True)
+
+        self.scheduler._run_scheduled_calls()
+        self.assertEqual(self.coordinator.execute_call_asynchronously.call_count, 2)
+
+    def test_in_flight_multiple_calls(self):
+        schedule_id = self.add_due_schedule(multiple_itinerary_call)
+        self.coordinator.execute_multiple_calls.side_effect = \
+            lambda call_group: [CallReport.from_call_request(r) for r in call_group]
+
+        self.scheduler._run_scheduled_calls()
+        self.assertEqual(self.coordinator.execute_multiple_calls.call_count, 1)
+        call_group = self.coordinator.execute_multiple_calls.call_args[0][0]
+
+        def run_when_due():
+            self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                                  {'$set': {'next_run': datetime.datetime.utcnow()}},
+                                                  safe=True)
+            self.scheduler._run_scheduled_calls()
+
+        # the second call of the group is still running, so the schedule is skipped
+        complete_call(call_group[0])
+        run_when_due()
+        self.assertEqual(self.coordinator.execute_multiple_calls.call_count, 1)
+
+        complete_call(call_group[1])
+        run_when_due()
+        self.assertEqual(self.coordinator.execute_multiple_calls.call_count, 2)
+
+    def test_in_flight_from_task_queue(self):
+        schedule_id = self.add_due_schedule()
+
+        call_request_in_progress = CallRequest(dummy_call)
+        call_report_in_progress = CallReport.from_call_request(call_request_in_progress)
+        call_report_in_progress.schedule_id = schedule_id
+        self.coordinator.find_call_reports.return_value = [call_report_in_progress]
+
+        self.assertEqual(list(self.scheduler._get_scheduled_call_groups()), [])
+
+    def test_rejected(self):
+        schedule_id = self.add_due_schedule()
+        self.coordinator.execute_call_asynchronously.return_value.response = dispatch_constants.CALL_REJECTED_RESPONSE
+
+        self.scheduler._run_scheduled_calls()
+
+        # make the schedule due again
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id)},
+                                              {'$set': {'next_run': datetime.datetime.utcnow()}},
+                                              safe=True)
+
+        self.scheduler._run_scheduled_calls()
+
+        self.assertEqual(self.coordinator.execute_call_asynchronously.call_count, 2)
+
+    def test_itinerary_not_run_through_coordinator(self):
+        self.add_due_schedule()
+
+        list(self.scheduler._get_scheduled_call_groups())
+
+        self.assertEqual(self.coordinator.execute_call_synchronously.call_count, 0)
+
+    def test_update_next_runs(self):
+        schedule_id_1 = self.add_due_schedule()
+        schedule_id_2 = self.add_due_schedule()
+        schedule_id_3 = self.add_due_schedule()
+        self.scheduled_call_collection.update({'_id': ObjectId(schedule_id_3)},
+                                              {'$set': {'remaining_runs': 0}}, safe=True)
+        scheduled_calls = list(self.scheduled_call_collection.find())
+
+        self.scheduler.update_next_runs(scheduled_calls)
+
+        for schedule_id in (schedule_id_1, schedule_id_2):
+            scheduled_call = self.scheduled_call_collection.find_one({'_id': ObjectId(schedule_id)})
+            self.assertEqual(scheduled_call['next_run'], self.scheduler.calculate_next_run(scheduled_call))
+        self.assertEqual(self.scheduled_call_collection.find_one({'_id': ObjectId(schedule_id_3)}), None)
+
+    def _test_tick_performance(self):
+        count = 5000
+        call_request = CallRequest(itinerary_call)
+        schedule = dateutils.format_iso8601_interval(datetime.timedelta(hours=1),
+                                                     datetime.datetime.now())
+        for i in range(count):
+            self.scheduler.add(call_request, schedule)
+
+        def execute_call_synchronously(call_request, call_report):
+            call_report.result = call_request.call(*call_request.args, **call_request.kwargs)
+            return call_report
+
+        self.coordinator.execute_call_synchronously.side_effect = execute_call_synchronously
+
+        for batched in (False, True):
+            scheduler = Scheduler(batched=batched)
+            start = time.time()
+            scheduler._run_scheduled_calls()
+            elapsed = time.time() - start
+            print '\nbatched=%s: %d scheduled calls dispatched in %.2fs' % (batched, count, elapsed)
+            # make the calls due again
+            self.scheduled_call_collection.update({}, {'$unset': {'claim_id': 1, 'claim_expires': 1}},
+                                                  multi=True, safe=True)
+
 # query tests ------------------------------------------------------------------
 
 class SchedulerQueryTests(SchedulerTests):
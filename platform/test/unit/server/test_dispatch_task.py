@@ -12,6 +12,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import datetime
+import threading
 import traceback
 import types
 
@@ -152,6 +153,41 @@ class TaskTests(base.PulpServerTests):
         for h in hooks:
             self.assertTrue(h.call_count == 1)
 
+# task state testing -----------------------------------------------------------
+
+class TaskWaitForStateTests(base.PulpServerTests):
+
+    def setUp(self):
+        super(TaskWaitForStateTests, self).setUp()
+        self.task = Task(CallRequest(call_without_callbacks))
+
+    def tearDown(self):
+        super(TaskWaitForStateTests, self).tearDown()
+        self.task = None
+
+    def test_already_in_state(self):
+        self.assertTrue(self.task.wait_for_state(dispatch_constants.CALL_READY_STATES))
+
+    def test_timeout(self):
+        timeout = datetime.timedelta(seconds=0.01)
+        self.assertFalse(self.task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, timeout))
+
+    def test_notified_on_completion(self):
+        timer = threading.Timer(0.01, self.task.skip)
+        timer.start()
+        try:
+            complete = self.task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES,
+                                                datetime.timedelta(seconds=5))
+        finally:
+            timer.join()
+        self.assertTrue(complete)
+        self.assertTrue(self.task.call_report.state is dispatch_constants.CALL_SKIPPED_STATE)
+
+    def test_notified_on_run(self):
+        self.task.run()
+        self.task.wait_for_state(dispatch_constants.CALL_COMPLETE_STATES, datetime.timedelta(seconds=5))
+        self.assertTrue(self.task.call_report.state is dispatch_constants.CALL_FINISHED_STATE)
+
 # run failure testing ----------------------------------------------------------
 
 class FailTests(base.PulpServerTests):
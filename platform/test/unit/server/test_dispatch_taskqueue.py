@@ -222,6 +222,42 @@ class TaskQueueControlFlowTests(TaskQueueTests):
         self.assertTrue(task_1 in task_list)
         self.assertFalse(task_2 in task_list)
 
+    def test_get_ready_tasks_weights(self):
+        # concurrency threshold is 2: the heavy task no longer fits after the
+        # first light one, the second light one does and the weightless one
+        # always does
+        heavy_task = Task(CallRequest(call, weight=2))
+        light_task_1 = Task(CallRequest(call, weight=1))
+        light_task_2 = Task(CallRequest(call, weight=1))
+        weightless_task = Task(CallRequest(call, weight=0))
+        for t in (light_task_1, heavy_task, light_task_2, weightless_task):
+            self.queue.enqueue(t)
+        task_list = self.queue._get_ready_tasks()
+        self.assertEqual(task_list, [light_task_1, light_task_2, weightless_task])
+
+    def test_get_ready_tasks_enqueue_order(self):
+        weights = [1, 0, 2, 0, 1]
+        tasks = [Task(CallRequest(call, weight=w)) for w in weights]
+        for t in tasks:
+            self.queue.enqueue(t)
+        task_list = self.queue._get_ready_tasks()
+        self.assertEqual(task_list, [tasks[0], tasks[1], tasks[3], tasks[4]])
+
+    def test_get_ready_tasks_unblocked_order(self):
+        task_1 = self.gen_async_task()
+        task_2 = self.gen_task()
+        task_3 = self.gen_task()
+        task_2.call_request.dependencies[task_1.call_request.id] = dispatch_constants.CALL_COMPLETE_STATES
+        for t in (task_1, task_2, task_3):
+            self.queue.enqueue(t)
+        self.queue._run_ready_task(task_1)
+        self.wait_for_task_to_start(task_1)
+        self.assertEqual(self.queue._get_ready_tasks(), [task_3])
+        task_1._succeeded()
+        self.wait_for_task_to_complete(task_1)
+        self.assertEqual(self.queue.waiting_tasks(), [task_2, task_3])
+        self.assertEqual(self.queue._get_ready_tasks(), [task_2, task_3])
+
     def test_run_ready_task(self):
         task = self.gen_async_task()
         self.queue.enqueue(task)
@@ -321,6 +357,27 @@ class TaskQueueQueryTests(TaskQueueTests):
         task_2 = self.queue.get(task_1.call_request.id)
         self.assertTrue(task_2 is task_1)
 
+    def test_get_completed(self):
+        task_1 = self.gen_task()
+        self.queue.enqueue(task_1)
+        self.queue._run_ready_task(task_1)
+        self.wait_for_task_to_complete(task_1)
+        task_2 = self.queue.get(task_1.call_request.id)
+        self.assertTrue(task_2 is task_1)
+
+    def test_get_dequeued(self):
+        task = self.gen_task()
+        self.queue.enqueue(task)
+        self.queue.dequeue(task)
+        self.assertTrue(self.queue.get(task.call_request.id) is None)
+
+    def test_find_missing_tag(self):
+        task = self.gen_task()
+        task.call_request.tags.append('TAG')
+        self.queue.enqueue(task)
+        self.assertEqual(self.queue.find('TAG', 'OTHER'), [])
+        self.assertEqual(self.queue.find('OTHER'), [])
+
     def test_find_single_tag(self):
         tag = 'TAG'
         task = self.gen_task()
@@ -18,6 +18,7 @@ from pulp.server.db.model.event import EventListener
 from pulp.server.event import notifiers
 from pulp.server.event import data as event_data
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event import fire
 
 
 class EventFireManagerTests(base.PulpAsyncServerTests):
@@ -32,6 +33,7 @@ class EventFireManagerTests(base.PulpAsyncServerTests):
         super(EventFireManagerTests, self).tearDown()
 
         EventListener.get_collection().remove()
+        fire.invalidate_listener_cache()
         notifiers.reset()
 
     # -- plumbing tests -------------------------------------------------------
@@ -117,6 +119,103 @@ class EventFireManagerTests(base.PulpAsyncServerTests):
         self.assertEqual({'2' : '2'}, notifier_2.fire.call_args[0][0])
         self.assertEqual(event, notifier_2.fire.call_args[0][1])
 
+    # -- listener cache tests -------------------------------------------------
+
+    def test_listener_cache(self):
+        # Setup
+        for notifier_type_id in ('notifier_1', 'notifier_2', 'notifier_3'):
+            notifiers.NOTIFIER_FUNCTIONS[notifier_type_id] = mock.Mock()
+
+        self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        self.event_manager.create('notifier_2', {}, ['*'])
+        self.event_manager.create('notifier_3', {}, [event_data.TYPE_REPO_SYNC_FINISHED])
+
+        cache = fire.EventListenerCache()
+
+        # Test
+        started = cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+        finished = cache.listeners(event_data.TYPE_REPO_SYNC_FINISHED)
+        other = cache.listeners(event_data.TYPE_REPO_PUBLISH_STARTED)
+
+        # Verify
+        self.assertEqual(['notifier_1', 'notifier_2'], sorted(l['notifier_type_id'] for l in started))
+        self.assertEqual(['notifier_2', 'notifier_3'], sorted(l['notifier_type_id'] for l in finished))
+        self.assertEqual(['notifier_2'], [l['notifier_type_id'] for l in other])
+
+        stats = cache.statistics()
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(2, stats['hits'])
+
+    def test_listener_cache_star_listener_matched_once(self):
+        # Setup
+        notifiers.NOTIFIER_FUNCTIONS['notifier_1'] = mock.Mock()
+        self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED, '*'])
+        cache = fire.EventListenerCache()
+
+        # Test
+        listeners = cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+
+        # Verify
+        self.assertEqual(1, len(listeners))
+
+    def test_listener_cache_ttl(self):
+        # Setup
+        cache = fire.EventListenerCache(ttl=-1)
+
+        # Test
+        cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+        cache.listeners(event_data.TYPE_REPO_SYNC_STARTED)
+
+        # Verify
+        self.assertEqual(2, cache.statistics()['misses'])
+        self.assertEqual(0, cache.statistics()['hits'])
+
+    @mock.patch('pulp.server.db.model.event.EventListener.get_collection')
+    def test_do_fire_cached(self, mock_get_collection):
+        # Setup
+        mock_get_collection.return_value.find.return_value = []
+        fire.invalidate_listener_cache()
+        event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
+
+        # Test
+        self.manager._do_fire(event)
+        self.manager._do_fire(event)
+        self.manager._do_fire(event)
+
+        # Verify
+        self.assertEqual(1, mock_get_collection.return_value.find.call_count)
+
+    def test_listener_cache_invalidated_by_crud(self):
+        # Setup
+        notifiers.NOTIFIER_FUNCTIONS.clear()
+        notifier = mock.Mock()
+        notifiers.NOTIFIER_FUNCTIONS['notifier_1'] = notifier.fire
+        event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
+
+        # Test - create
+        self.manager._do_fire(event)
+        listener = self.event_manager.create('notifier_1', {}, [event_data.TYPE_REPO_SYNC_STARTED])
+        self.manager._do_fire(event)
+        self.assertEqual(1, notifier.fire.call_count)
+
+        # Test - update
+        self.event_manager.update(listener['_id'], event_types=[event_data.TYPE_REPO_SYNC_FINISHED])
+        self.manager._do_fire(event)
+        self.assertEqual(1, notifier.fire.call_count)
+
+        self.event_manager.update(listener['_id'], event_types=[event_data.TYPE_REPO_SYNC_STARTED])
+        self.manager._do_fire(event)
+        self.assertEqual(2, notifier.fire.call_count)
+
+        # Test - delete
+        version = fire.listener_cache_statistics()['version']
+        self.event_manager.delete(listener['_id'])
+        self.manager._do_fire(event)
+
+        # Verify
+        self.assertEqual(2, notifier.fire.call_count)
+        self.assertEqual(version + 1, fire.listener_cache_statistics()['version'])
+
     # -- event format tests ---------------------------------------------------
 
     def test_fire_repo_sync_started(self):
@@ -11,8 +11,10 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import BaseHTTPServer
 import httplib
 import mock
+import threading
 import time
 from pulp.server.compat import json
 
@@ -113,3 +115,114 @@ class TestHTTPNotifierTests(base.PulpAsyncServerTests):
         # Test HTTP
         conn = http._create_connection('http', 'foo')
         self.assertTrue(isinstance(conn, httplib.HTTPConnection))
+
+
+class _RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        self.server.bodies.append(self.rfile.read(length))
+        self.server.connections.add(self.client_address)
+        self.send_response(httplib.OK)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class EventDispatcherTests(base.PulpAsyncServerTests):
+
+    def setUp(self):
+        super(EventDispatcherTests, self).setUp()
+        self.server = BaseHTTPServer.HTTPServer(('localhost', 0), _RecordingHandler)
+        self.server.bodies = []
+        self.server.connections = set()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.url = 'http://localhost:%d/api/' % self.server.server_address[1]
+
+    def tearDown(self):
+        super(EventDispatcherTests, self).tearDown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_dispatch(self):
+        # Setup
+        dispatcher = http.EventDispatcher(worker_count=1)
+
+        # Test
+        for i in range(20):
+            dispatcher.dispatch({'url' : self.url}, json.dumps({'i' : i}))
+        dispatcher.queue.join()
+
+        # Verify
+        self.assertEqual(range(20), [json.loads(b)['i'] for b in self.server.bodies])
+        self.assertTrue(len(self.server.connections) < 20)
+
+        stats = dispatcher.statistics()
+        self.assertEqual(20, stats['queued'])
+        self.assertEqual(20, stats['delivered'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(0, stats['dropped'])
+        self.assertEqual(0, stats['depth'])
+        self.assertEqual(1, stats['workers'])
+        self.assertEqual(stats['connections'], len(self.server.connections))
+
+    def test_dispatch_queue_full(self):
+        # Setup
+        dispatcher = http.EventDispatcher(queue_size=1, queue_timeout=0)
+        dispatcher._start = mock.Mock() # no workers to drain the queue
+
+        # Test
+        dispatcher.dispatch({'url' : self.url}, '{}')
+        dispatcher.dispatch({'url' : self.url}, '{}') # should not error
+
+        # Verify
+        stats = dispatcher.statistics()
+        self.assertEqual(1, stats['queued'])
+        self.assertEqual(1, stats['dropped'])
+        self.assertEqual(1, stats['depth'])
+        self.assertEqual(1, stats['max_depth'])
+
+    @mock.patch('pulp.server.event.http._create_connection')
+    def test_dispatch_stale_connection(self, mock_create):
+        # Setup
+        stale_connection = mock.Mock()
+        stale_connection.request.side_effect = httplib.BadStatusLine('')
+        connection = mock.Mock()
+        connection.getresponse.return_value.status = httplib.OK
+        mock_create.side_effect = [connection]
+
+        dispatcher = http.EventDispatcher()
+        worker = http.EventWorker(dispatcher)
+        worker.connections[('http', 'localhost')] = stale_connection
+
+        # Test
+        worker._send(('http', 'localhost'), '/api/', {}, '{}')
+
+        # Verify
+        self.assertEqual(1, stale_connection.close.call_count)
+        self.assertEqual(1, connection.request.call_count)
+        self.assertEqual(1, dispatcher.statistics()['delivered'])
+
+    @mock.patch('pulp.server.event.http._create_connection')
+    def test_dispatch_sent_not_retried(self, mock_create):
+        # Setup
+        stale_connection = mock.Mock()
+        stale_connection.getresponse.side_effect = httplib.BadStatusLine('')
+
+        dispatcher = http.EventDispatcher()
+        worker = http.EventWorker(dispatcher)
+        worker.connections[('http', 'localhost')] = stale_connection
+
+        # Test
+        worker._send(('http', 'localhost'), '/api/', {}, '{}')
+
+        # Verify the listener may have received the event, so it is not sent again
+        self.assertEqual(1, stale_connection.close.call_count)
+        self.assertFalse(mock_create.called)
+        self.assertEqual(1, dispatcher.statistics()['failed'])
@@ -12,9 +12,13 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import hashlib
+from hmac import HMAC
+
 import base
 
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth import password
 
 class PasswordManagerTests(base.PulpServerTests):
     def setUp(self):
@@ -35,3 +39,21 @@ class PasswordManagerTests(base.PulpServerTests):
         password = "some password"
         hashed = self.password_manager.hash_password(password)
         self.assertTrue(self.password_manager.check_password(hashed, password))
+
+    def test_check_password_incorrect(self):
+        hashed = self.password_manager.hash_password("some password")
+        self.assertFalse(self.password_manager.check_password(hashed, "other password"))
+
+    def test_hash_password_format(self):
+        # same salt,hash format and derivation as HMAC objects chained together
+        hashed = self.password_manager.hash_password("some password")
+        salt, result = [f.decode("base64") for f in hashed.split(",")]
+        expected = "some password"
+        for i in xrange(password.NUM_ITERATIONS):
+            expected = HMAC(expected, salt, hashlib.sha256).digest()
+        self.assertEqual(result, expected)
+
+    def test_hmac_digest(self):
+        for key in ("", "key", "k" * 100):
+            expected = HMAC(key, "message", hashlib.sha256).digest()
+            self.assertEqual(password._hmac_digest(key, "message"), expected)
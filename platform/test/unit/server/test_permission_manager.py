@@ -15,12 +15,14 @@
 import base
 import random
 import string
+import time
 
 from pulp.server.auth import authorization
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth.user import query as user_query
 import pulp.server.exceptions as exceptions
 
-from pulp.server.db.model.auth import Role
+from pulp.server.db.model.auth import Permission, Role
 
 
 # -- test cases ---------------------------------------------------------------
@@ -47,6 +49,7 @@ class RoleManagerTests(base.PulpServerTests):
     def clean(self):
         base.PulpServerTests.clean(self)
         Role.get_collection().remove()
+        user_query.invalidate_permission_cache()
 
     # test data generation
 
@@ -164,5 +167,112 @@ class RoleManagerTests(base.PulpServerTests):
         self.permission_manager.grant('/', u['login'], [o])
         self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
 
+    def test_is_authorized_cached(self):
+        u = self._create_user()
+        r = self._create_resource()
+        o = authorization.READ
+        self.permission_manager.grant(r, u['login'], [o])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
+        # changes made behind the managers' backs are not seen until invalidation
+        Permission.get_collection().remove()
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
+        stats = user_query.permission_cache_statistics()
+        self.assertTrue(stats['hits'] > 0)
+        user_query.invalidate_permission_cache()
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], o))
+
+    def test_is_authorized_invalidated_per_user(self):
+        u1 = self._create_user()
+        u2 = self._create_user()
+        r = self._create_resource()
+        o = authorization.READ
+        self.permission_manager.grant(r, u1['login'], [o])
+        self.permission_manager.grant(r, u2['login'], [o])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u1['login'], o))
+        self.assertTrue(self.user_query_manager.is_authorized(r, u2['login'], o))
+        # only the entries of the user whose permissions changed are discarded
+        self.permission_manager.revoke(r, u1['login'], [o])
+        Permission.get_collection().remove()
+        self.assertFalse(self.user_query_manager.is_authorized(r, u1['login'], o))
+        self.assertTrue(self.user_query_manager.is_authorized(r, u2['login'], o))
+
+    def test_is_authorized_stale_load_not_cached(self):
+        u = self._create_user()
+        r = self._create_resource()
+        o = authorization.READ
+        cache = user_query._PERMISSION_CACHE
+        load = cache._load
+
+        def load_then_grant(login):
+            # permissions change while they are being loaded
+            trie = load(login)
+            self.permission_manager.grant(r, login, [o])
+            return trie
+
+        cache._load = load_then_grant
+        try:
+            self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], o))
+        finally:
+            del cache._load
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
+
+    def test_is_authorized_cache_expired(self):
+        u = self._create_user()
+        r = self._create_resource()
+        o = authorization.READ
+        self.permission_manager.grant(r, u['login'], [o])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
+        Permission.get_collection().remove()
+        cache = user_query._PERMISSION_CACHE
+        cache._loaded_at = time.time() - cache.ttl - 1
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], o))
 
+    def test_is_authorized_role_changes(self):
+        u = self._create_user()
+        role = self._create_role()
+        r = self._create_resource()
+        o = authorization.UPDATE
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], o))
+        self.role_manager.add_permissions_to_role(role['id'], r, [o])
+        self.role_manager.add_user_to_role(role['id'], u['login'])
+        self.assertTrue(self.user_query_manager.is_authorized(r, u['login'], o))
+        self.role_manager.remove_user_from_role(role['id'], u['login'])
+        self.assertFalse(self.user_query_manager.is_authorized(r, u['login'], o))
 
+    def test_is_superuser_cached(self):
+        u = self._create_user()
+        super_user_role = self.role_manager.super_user_role
+        self.assertFalse(self.user_query_manager.is_superuser(u['login']))
+        self.role_manager.add_user_to_role(super_user_role, u['login'])
+        self.assertTrue(self.user_query_manager.is_superuser(u['login']))
+        # the last super user cannot be deleted
+        self.role_manager.add_user_to_role(super_user_role, self._create_user()['login'])
+        self.user_manager.delete_user(u['login'])
+        self.assertRaises(exceptions.MissingResource,
+                          self.user_query_manager.is_superuser, u['login'])
+
+    def test_resource_trie(self):
+        trie = user_query.ResourceTrie()
+        trie.add('/v2/repositories/', [authorization.READ])
+        trie.add('/v2/repositories/zoo/', [authorization.UPDATE])
+        self.assertTrue(trie.allows('/v2/repositories/zoo/', authorization.READ))
+        self.assertTrue(trie.allows('/v2/repositories/zoo/', authorization.UPDATE))
+        self.assertFalse(trie.allows('/v2/repositories/', authorization.UPDATE))
+        self.assertFalse(trie.allows('/v2/repositories/zoos/', authorization.UPDATE))
+        self.assertFalse(trie.allows('/v2/', authorization.READ))
+        trie.add('/', [authorization.DELETE])
+        self.assertTrue(trie.allows('/v2/consumers/', authorization.DELETE))
+
+    def _test_is_authorized_latency(self):
+        u = self._create_user()
+        resources = [self._create_resource() for i in range(200)]
+        for r in resources:
+            self.permission_manager.grant(r, u['login'], [authorization.READ])
+        count = 10000
+        start = time.time()
+        for i in range(count):
+            r = resources[i % len(resources)]
+            self.user_query_manager.is_authorized(r, u['login'], authorization.READ)
+        elapsed = time.time() - start
+        print '\n%d checks in %.3f seconds (%.1f usec/check)' % (count, elapsed, elapsed / count * 1000000)
+        print user_query.permission_cache_statistics()
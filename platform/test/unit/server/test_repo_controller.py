@@ -1302,6 +1302,44 @@ class RepoUnitAssociationQueryTests(RepoControllersTests):
         # Verify
         self.assertEqual(400, status)
 
+    def test_post_paginated(self):
+        # Setup
+        self.association_query_mock.get_units_by_type_page.return_value = ([{'unit_id' : 'a'}], 'token-2')
+
+        params = {'criteria' : {'type_ids' : ['rpm']},
+                  'page_size' : '1',
+                  'continuation' : 'token-1'}
+        status, body = self.post('/v2/repositories/repo-1/search/units/', params=params)
+
+        # Verify
+        self.assertEqual(200, status)
+        self.assertEqual({'units' : [{'unit_id' : 'a'}], 'continuation' : 'token-2'}, body)
+
+        self.assertEqual(0, self.association_query_mock.get_units_by_type.call_count)
+        call_args = self.association_query_mock.get_units_by_type_page.call_args
+        self.assertEqual(('repo-1', 'rpm'), call_args[0])
+        self.assertEqual(1, call_args[1]['page_size'])
+        self.assertEqual('token-1', call_args[1]['resume_token'])
+
+    def test_post_paginated_multiple_types(self):
+        # Test
+        params = {'criteria' : {'type_ids' : ['rpm', 'errata']},
+                  'page_size' : 10}
+        status, body = self.post('/v2/repositories/repo-1/search/units/', params=params)
+
+        # Verify
+        self.assertEqual(400, status)
+        self.assertEqual(0, self.association_query_mock.get_units_by_type_page.call_count)
+
+    def test_post_paginated_bad_page_size(self):
+        # Test
+        params = {'criteria' : {'type_ids' : ['rpm']},
+                  'page_size' : 'fus'}
+        status, body = self.post('/v2/repositories/repo-1/search/units/', params=params)
+
+        # Verify
+        self.assertEqual(400, status)
+
 class DependencyResolutionTests(RepoControllersTests):
 
     @mock.patch('pulp.server.managers.repo.dependency.DependencyManager.resolve_dependencies_by_criteria')
@@ -18,6 +18,7 @@ import unittest
 import base
 import mock_plugins
 import mock
+import pymongo
 
 from   pulp.common.util import encode_unicode
 from pulp.plugins.loader import api as plugin_api
@@ -57,42 +58,116 @@ class RepoManagerTests(base.PulpAsyncServerTests):
         # platform migration 0004 has a test for this that uses live data
 
         repo_col = mock_get_repo_col.return_value
-        find = mock_get_assoc_col.return_value.find
-        cursor = find.return_value
-        cursor.distinct.return_value = ['rpm', 'srpm']
-        cursor.count.return_value = 6
+        aggregate = mock_get_assoc_col.return_value.aggregate
+        aggregate.return_value = {'ok': 1, 'result': [
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'rpm'}, 'count': 6},
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'srpm'}, 'count': 6},
+        ]}
 
-        self.manager.rebuild_content_unit_counts(['repo1'])
+        rebuilt = self.manager.rebuild_content_unit_counts(['repo1'])
 
-        # once to get the type_ids, then once more for each of the 2 types
-        self.assertEqual(find.call_count, 3)
-        find.assert_any_call({'repo_id': 'repo1'})
-        find.assert_any_call({'repo_id': 'repo1', 'unit_type_id': 'rpm'})
-        find.assert_any_call({'repo_id': 'repo1', 'unit_type_id': 'srpm'})
+        # a single aggregation for all of the repos
+        self.assertEqual(aggregate.call_count, 1)
+        pipeline = aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'repo_id': {'$in': ['repo1']}}})
 
-        self.assertEqual(repo_col.update.call_count, 1)
+        self.assertEqual(['repo1'], rebuilt)
         repo_col.update.assert_called_once_with(
-            {'id': 'repo1'},
+            {'id': {'$in': ['repo1']}},
             {'$set': {'content_unit_counts': {'rpm':6, 'srpm': 6}}},
-            safe=True
+            multi=True, safe=True
         )
 
     @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
     @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
     def test_rebuild_default_all_repos(self, mock_get_assoc_col, mock_get_repo_col):
         repo_col = mock_get_repo_col.return_value
-        repo_col.find.return_value = [{'id': 'repo1'}, {'id': 'repo2'}]
+        repo_col.find.return_value = [{'id': 'repo1'}, {'id': 'repo2'}, {'id': 'repo3'}]
 
         assoc_col = mock_get_assoc_col.return_value
-        # don't return any type IDs
-        assoc_col.find.return_value.distinct.return_value = []
+        assoc_col.aggregate.return_value = {'ok': 1, 'result': [
+            {'_id': {'repo_id': 'repo1', 'unit_type_id': 'rpm'}, 'count': 2},
+            {'_id': {'repo_id': 'deleted', 'unit_type_id': 'rpm'}, 'count': 1},
+        ]}
 
         self.manager.rebuild_content_unit_counts()
 
-        # makes sure it found these 2 repos and tried to operate on them
-        assoc_col.find.assert_any_call({'repo_id': 'repo1'})
-        assoc_col.find.assert_any_call({'repo_id': 'repo2'})
-        self.assertEqual(assoc_col.find.call_count, 2)
+        # all associations are counted without filtering on the repo IDs
+        pipeline = assoc_col.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {}})
+
+        # the empty repos are updated together
+        self.assertEqual(repo_col.update.call_count, 2)
+        updates = dict((str(c[0][1]['$set']['content_unit_counts']), sorted(c[0][0]['id']['$in']))
+                       for c in repo_col.update.call_args_list)
+        self.assertEqual({"{'rpm': 2}": ['repo1'], '{}': ['repo2', 'repo3']}, updates)
+
+    @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
+    @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
+    def test_rebuild_group_fallback(self, mock_get_assoc_col, mock_get_repo_col):
+        repo_col = mock_get_repo_col.return_value
+
+        assoc_col = mock_get_assoc_col.return_value
+        assoc_col.aggregate.side_effect = pymongo.errors.OperationFailure('no such cmd: aggregate')
+        assoc_col.group.return_value = [{'repo_id': 'repo1', 'unit_type_id': 'rpm', 'count': 3.0}]
+
+        self.manager.rebuild_content_unit_counts(['repo1'])
+
+        self.assertEqual(1, assoc_col.group.call_count)
+        self.assertEqual({'repo_id': {'$in': ['repo1']}}, assoc_col.group.call_args[0][1])
+        repo_col.update.assert_called_once_with(
+            {'id': {'$in': ['repo1']}},
+            {'$set': {'content_unit_counts': {'rpm': 3}}},
+            multi=True, safe=True
+        )
+
+    @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
+    @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
+    def test_rebuild_incremental(self, mock_get_assoc_col, mock_get_repo_col):
+        repo_col = mock_get_repo_col.return_value
+        repo_col.find.return_value = [
+            {'id': 'current', 'content_unit_counts': {'rpm': 2}},
+            {'id': 'added', 'content_unit_counts': {'rpm': 2}},
+            {'id': 'changed_type', 'content_unit_counts': {'rpm': 2}},
+            {'id': 'never_counted'},
+        ]
+
+        # actual association counts by spec
+        actual = {
+            ('current', None): 2, ('current', 'rpm'): 2,
+            ('added', None): 3, ('added', 'rpm'): 3,
+            ('changed_type', None): 2, ('changed_type', 'rpm'): 1,
+        }
+        def find(spec):
+            cursor = mock.Mock()
+            cursor.count.return_value = actual[(spec['repo_id'], spec.get('unit_type_id'))]
+            return cursor
+
+        assoc_col = mock_get_assoc_col.return_value
+        assoc_col.find.side_effect = find
+        assoc_col.aggregate.return_value = {'ok': 1, 'result': []}
+
+        rebuilt = self.manager.rebuild_content_unit_counts(['current', 'added', 'changed_type', 'never_counted'],
+                                                           incremental=True)
+
+        self.assertEqual(['added', 'changed_type', 'never_counted'], rebuilt)
+        pipeline = assoc_col.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'repo_id': {'$in': rebuilt}}})
+
+    @mock.patch('pulp.server.db.model.repository.Repo.get_collection')
+    @mock.patch('pulp.server.db.model.repository.RepoContentUnit.get_collection')
+    def test_rebuild_incremental_current(self, mock_get_assoc_col, mock_get_repo_col):
+        repo_col = mock_get_repo_col.return_value
+        repo_col.find.return_value = [{'id': 'repo1', 'content_unit_counts': {}}]
+
+        assoc_col = mock_get_assoc_col.return_value
+        assoc_col.find.return_value.count.return_value = 0
+
+        rebuilt = self.manager.rebuild_content_unit_counts(['repo1'], incremental=True)
+
+        self.assertEqual([], rebuilt)
+        self.assertEqual(0, assoc_col.aggregate.call_count)
+        self.assertEqual(0, repo_col.update.call_count)
 
     def test_create(self):
         """
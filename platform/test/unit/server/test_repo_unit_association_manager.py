@@ -448,6 +448,40 @@ class RepoUnitAssociationManagerTests(base.PulpServerTests):
 
         mock_call.assert_called_once_with(self.repo_id, 'type-1', 2)
 
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_associate_all_existing_associations(self, mock_call):
+        """
+        Units already associated by the same owner are skipped and units
+        associated by another owner are associated but not counted again.
+        """
+        self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'foo', OWNER_TYPE_USER, 'admin', False)
+        self.manager.associate_unit_by_id(self.repo_id, 'type-1', 'bar', OWNER_TYPE_IMPORTER, 'imp', False)
+
+        self.manager.associate_all_by_ids(
+            self.repo_id, 'type-1', ['foo', 'bar', 'baz'], OWNER_TYPE_USER, 'admin')
+
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', 1)
+
+        collection = RepoContentUnit.get_collection()
+        self.assertEqual(4, collection.find({'repo_id' : self.repo_id}).count())
+        user_spec = {'repo_id' : self.repo_id, 'owner_type' : OWNER_TYPE_USER, 'owner_id' : 'admin'}
+        self.assertEqual(3, collection.find(user_spec).count())
+
+    @mock.patch.object(association_manager, 'ASSOCIATION_BATCH_SIZE', 2)
+    @mock.patch('pulp.server.managers.repo.cud.RepoManager.update_unit_count')
+    def test_associate_all_batches(self, mock_call):
+        ids = ['unit-%d' % i for i in range(5)]
+
+        self.manager.associate_all_by_ids(self.repo_id, 'type-1', ids, OWNER_TYPE_USER, 'admin')
+
+        repo_units = list(RepoContentUnit.get_collection().find({'repo_id' : self.repo_id}))
+        self.assertEqual(sorted(ids), sorted(u['unit_id'] for u in repo_units))
+        mock_call.assert_called_once_with(self.repo_id, 'type-1', 5)
+
+    def test_associate_all_invalid_owner(self):
+        self.assertRaises(exceptions.InvalidValue, self.manager.associate_all_by_ids,
+                          self.repo_id, 'type-1', ['foo'], 'bad-owner', 'irrelevant')
+
     def test_unassociate_all(self):
         """
         Tests unassociating multiple units in a single call.
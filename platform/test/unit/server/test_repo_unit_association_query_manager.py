@@ -21,6 +21,7 @@ from pulp.common import dateutils
 from pulp.plugins.types import database, model
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.exceptions import InvalidValue
 import pulp.server.managers.repo.unit_association as association_manager
 from pulp.server.managers.repo.unit_association import OWNER_TYPE_USER, OWNER_TYPE_IMPORTER
 import pulp.server.managers.repo.unit_association_query as association_query_manager
@@ -399,6 +400,57 @@ class UnitAssociationQueryTests(base.PulpServerTests):
             self.assertFalse('created' in u)
             self.assertFalse('updated' in u)
 
+    def test_get_units_metadata_batches(self):
+        # Setup
+        all_units = self.manager.get_units_across_types('repo-1')
+
+        # Test
+        with mock.patch.object(association_query_manager, 'UNIT_METADATA_BATCH_SIZE', 2):
+            batched_units = self.manager.get_units_across_types('repo-1')
+
+        # Verify
+        self.assertEqual(all_units, batched_units)
+        for u in batched_units:
+            self._assert_unit_integrity(u)
+
+    def test_get_units_as_generator(self):
+        # Setup
+        all_units = self.manager.get_units_across_types('repo-1')
+
+        # Test
+        with mock.patch.object(association_query_manager, 'UNIT_METADATA_BATCH_SIZE', 3):
+            generator = self.manager.get_units_across_types('repo-1', as_generator=True)
+            self.assertFalse(isinstance(generator, list))
+            generated_units = list(generator)
+
+        # Verify
+        self.assertEqual(all_units, generated_units)
+
+    def test_get_units_as_generator_remove_duplicates(self):
+        # Setup
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+        all_units = self.manager.get_units_across_types('repo-1', criteria)
+
+        # Test
+        criteria = UnitAssociationCriteria(remove_duplicates=True)
+        generated_units = list(self.manager.get_units_across_types('repo-1', criteria, as_generator=True))
+
+        # Verify
+        self.assertEqual(all_units, generated_units)
+
+    def test_get_units_missing_unit_metadata(self):
+        # Setup
+        database.type_units_collection('alpha').remove({'key_1' : 'apple'})
+
+        # Test
+        criteria = UnitAssociationCriteria(type_ids=['alpha'])
+        units = self.manager.get_units_across_types('repo-1', criteria)
+
+        # Verify
+        self.assertEqual(len(self.units['alpha']), len(units))
+        missing = [u for u in units if u['metadata'] is None]
+        self.assertEqual(1, len(missing))
+
     # -- get_units_by_type tests ----------------------------------------------
 
     def test_get_units_by_type_no_criteria(self):
@@ -620,6 +672,157 @@ class UnitAssociationQueryTests(base.PulpServerTests):
         for u in units:
             self.assertTrue(u['metadata']['key_1'] != 'aardvark')
 
+    def test_get_units_by_type_large_repo_unit_sort(self):
+        # Setup
+        criteria = UnitAssociationCriteria(unit_sort=[('md_2', association_manager.SORT_DESCENDING)], skip=1, limit=2)
+        expected = self.manager.get_units_by_type('repo-1', 'beta', criteria)
+
+        # Test
+        criteria = UnitAssociationCriteria(unit_sort=[('md_2', association_manager.SORT_DESCENDING)], skip=1, limit=2)
+        with mock.patch.object(association_query_manager, 'UNIT_ID_QUERY_LIMIT', 1):
+            units = self.manager.get_units_by_type('repo-1', 'beta', criteria)
+
+        # Verify
+        self.assertEqual(2, len(units))
+        self.assertEqual([u['_id'] for u in expected], [u['_id'] for u in units])
+
+    def test_get_units_by_type_association_sort_batches(self):
+        # Setup
+        criteria = UnitAssociationCriteria(unit_filters={'md_2' : 0},
+                                           association_sort=[('created', association_manager.SORT_DESCENDING)])
+        expected = self.manager.get_units_by_type('repo-1', 'beta', criteria)
+
+        # Test
+        criteria = UnitAssociationCriteria(unit_filters={'md_2' : 0},
+                                           association_sort=[('created', association_manager.SORT_DESCENDING)])
+        with mock.patch.object(association_query_manager, 'UNIT_METADATA_BATCH_SIZE', 1):
+            units = self.manager.get_units_by_type('repo-1', 'beta', criteria)
+
+        # Verify
+        self.assertEqual(2, len(units))
+        self.assertEqual(expected, units)
+
+    # -- get_units_by_type_page tests -----------------------------------------
+
+    def _all_pages(self, type_id, criteria_args, page_size):
+        """
+        Retrieves all pages of the units of the given type in repo-1, using a
+        new criteria built from the given arguments for each page.
+        """
+        pages = []
+        token = None
+        while True:
+            criteria = UnitAssociationCriteria(**criteria_args)
+            units, token = self.manager.get_units_by_type_page('repo-1', type_id, criteria,
+                                                               page_size=page_size, resume_token=token)
+            self.assertTrue(len(units) <= page_size)
+            pages.append(units)
+            if token is None:
+                return pages
+
+    def test_get_units_by_type_page_default_sort(self):
+        # Setup
+        expected = self.manager.get_units_by_type('repo-1', 'beta')
+
+        # Test
+        pages = self._all_pages('beta', {}, 3)
+
+        # Verify
+        self.assertEqual([3, 1], [len(p) for p in pages])
+        units = pages[0] + pages[1]
+        self.assertEqual([u['_id'] for u in expected], [u['_id'] for u in units])
+        for u in units:
+            self._assert_unit_integrity(u)
+
+    def test_get_units_by_type_page_last_page_empty(self):
+        # Test
+        pages = self._all_pages('beta', {}, 2)
+
+        # Verify
+        self.assertEqual([2, 2, 0], [len(p) for p in pages])
+
+    def test_get_units_by_type_page_unit_sort(self):
+        # Test
+        args = {'unit_sort' : [('md_2', association_manager.SORT_DESCENDING)]}
+        pages = self._all_pages('beta', args, 1)
+
+        # Verify
+        units = reduce(lambda x, y: x + y, pages)
+        self.assertEqual(len(self.units['beta']), len(units))
+        self.assertEqual(len(self.units['beta']), len(set(u['unit_id'] for u in units)))
+        for i in range(0, len(units) - 1):
+            self.assertTrue(units[i]['metadata']['md_2'] >= units[i+1]['metadata']['md_2'])
+
+    def test_get_units_by_type_page_large_repo(self):
+        # Setup
+        expected = self.manager.get_units_by_type('repo-1', 'beta')
+
+        # Test
+        with mock.patch.object(association_query_manager, 'UNIT_ID_QUERY_LIMIT', 1):
+            pages = self._all_pages('beta', {}, 3)
+
+        # Verify
+        units = reduce(lambda x, y: x + y, pages)
+        self.assertEqual([u['_id'] for u in expected], [u['_id'] for u in units])
+
+    def test_get_units_by_type_page_association_sort_unit_filters(self):
+        # Test
+        args = {'unit_filters' : {'md_2' : 0},
+                'association_sort' : [('created', association_manager.SORT_DESCENDING)]}
+        with mock.patch.object(association_query_manager, 'UNIT_METADATA_BATCH_SIZE', 1):
+            pages = self._all_pages('beta', args, 1)
+
+        # Verify
+        units = reduce(lambda x, y: x + y, pages)
+        self.assertEqual(2, len(units))
+        self.assertTrue(units[0]['created'] > units[1]['created'])
+        for u in units:
+            self.assertEqual(0, u['metadata']['md_2'])
+
+    def test_get_units_by_type_page_remove_duplicates(self):
+        # Test
+        args = {'remove_duplicates' : True,
+                'association_sort' : [('owner_type', association_manager.SORT_ASCENDING)]}
+        pages = self._all_pages('gamma', args, 1)
+
+        # Verify
+        units = reduce(lambda x, y: x + y, pages)
+        self.assertEqual(len(self.units['gamma']), len(units))
+        for u in units:
+            # all user associations have earlier created date
+            self.assertEqual(u['owner_type'], association_manager.OWNER_TYPE_USER)
+
+    def test_get_units_by_type_page_with_fields(self):
+        # Test
+        args = {'association_fields' : ['owner_type'],
+                'unit_fields' : ['md_1'],
+                'association_sort' : [('created', association_manager.SORT_ASCENDING)]}
+        pages = self._all_pages('alpha', args, 2)
+
+        # Verify
+        units = reduce(lambda x, y: x + y, pages)
+        self.assertEqual(len(self.units['alpha']), len(units))
+        for u in units:
+            self.assertTrue('owner_type' in u)
+            self.assertFalse('created' in u)
+            self.assertTrue('md_1' in u['metadata'])
+            self.assertFalse('key_1' in u['metadata'])
+
+    def test_get_units_by_type_page_invalid_token(self):
+        # Setup
+        units, token = self.manager.get_units_by_type_page('repo-1', 'beta', page_size=1)
+
+        # Test
+        criteria = UnitAssociationCriteria(association_sort=[('created', association_manager.SORT_ASCENDING)])
+        self.assertRaises(InvalidValue, self.manager.get_units_by_type_page, 'repo-1', 'beta',
+                          criteria, resume_token=token)
+        self.assertRaises(InvalidValue, self.manager.get_units_by_type_page, 'repo-1', 'beta',
+                          resume_token='foo')
+
+    def test_get_units_by_type_page_invalid_page_size(self):
+        self.assertRaises(InvalidValue, self.manager.get_units_by_type_page, 'repo-1', 'beta',
+                          page_size=0)
+
     def test_remove_duplicates(self):
         # Setup
         def unit(unit_type_id, unit_id, created):
@@ -18,6 +18,7 @@ import string
 
 from pulp.server.auth import authorization
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth.user import query as user_query
 from pulp.server.db.model.auth import Role
 from pulp.server.exceptions import PulpDataException
 
@@ -46,6 +47,7 @@ class RoleManagerTests(base.PulpServerTests):
     def clean(self):
         base.PulpServerTests.clean(self)
         Role.get_collection().remove()
+        user_query.invalidate_permission_cache()
 
     # test data generation
 
@@ -43,6 +43,10 @@ class TestGetQueryResultsFromPost(unittest.TestCase):
         self.controller._get_query_results_from_post()
         self.assertTrue('id' in self.mock_query_method.call_args[0][0].fields)
 
+    def test_as_generator(self):
+        results = self.controller._get_query_results_from_post(as_generator=True)
+        self.assertTrue(results is self.mock_query_method.return_value)
+
 
 class TestGetQueryResultsFromGet(unittest.TestCase):
     def setUp(self):
@@ -68,3 +72,14 @@ class TestGetQueryResultsFromGet(unittest.TestCase):
         self.controller._get_query_results_from_get()
         self.assertTrue('id' in self.mock_query_method.call_args[0][0].fields)
 
+    @mock.patch('web.input', return_value={'field':[]})
+    def test_as_generator(self, mock_input):
+        results = self.controller._get_query_results_from_get(as_generator=True)
+        self.assertTrue(results is self.mock_query_method.return_value)
+
+    @mock.patch('web.input', return_value={'field':[]})
+    def test_list(self, mock_input):
+        self.mock_query_method.return_value = iter([{'id' : 'a'}])
+        results = self.controller._get_query_results_from_get()
+        self.assertEqual([{'id' : 'a'}], results)
+
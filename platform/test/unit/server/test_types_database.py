@@ -13,6 +13,7 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 import base
+import mock
 
 import pulp.plugins.types.database as types_db
 from pulp.plugins.types.model import TypeDefinition
@@ -260,6 +261,107 @@ class TypesDatabaseTests(base.PulpServerTests):
         # Verify
         self.assertTrue(indexes is None)
 
+    # -- cache tests -----------------------------------------------------------
+
+    def test_type_definition_cached(self):
+        """
+        Tests repeated lookups are served from the cache without querying the database.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1, DEF_2])
+        types_db.type_definition(DEF_1.id) # prime the cache
+        before = types_db.cache_statistics()
+
+        # Test
+        with mock.patch.object(ContentType, 'get_collection') as mock_get_collection:
+            type_def = types_db.type_definition(DEF_1.id)
+            unit_key = types_db.type_units_unit_key(DEF_2.id)
+            type_ids = types_db.all_type_ids()
+
+        # Verify
+        self.assertFalse(mock_get_collection.called)
+        self.assertEqual(DEF_1.id, type_def['id'])
+        self.assertEqual(DEF_2.unit_key, unit_key)
+        self.assertEqual(sorted([DEF_1.id, DEF_2.id]), sorted(type_ids))
+
+        after = types_db.cache_statistics()
+        self.assertEqual(before['hits'] + 3, after['hits'])
+        self.assertEqual(before['misses'], after['misses'])
+
+    def test_type_definition_returns_copy(self):
+        """
+        Tests callers cannot modify the cached definitions.
+        """
+
+        # Setup
+        types_db.update_database([DEF_3])
+
+        # Test
+        type_def = types_db.type_definition(DEF_3.id)
+        type_def['unit_key'].append('mangled')
+        type_def['display_name'] = 'mangled'
+
+        # Verify
+        type_def = types_db.type_definition(DEF_3.id)
+        self.assertEqual(DEF_3.unit_key, type_def['unit_key'])
+        self.assertEqual(DEF_3.display_name, type_def['display_name'])
+
+    def test_cache_invalidated_by_update_and_clean(self):
+        """
+        Tests the cache reflects the database after update_database and clean.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        self.assertEqual([DEF_1.id], types_db.all_type_ids())
+        version = types_db.cache_statistics()['version']
+
+        # Test
+        types_db.update_database([DEF_1, DEF_2])
+        updated_ids = types_db.all_type_ids()
+        types_db.clean()
+        cleaned_ids = types_db.all_type_ids()
+
+        # Verify
+        self.assertEqual(sorted([DEF_1.id, DEF_2.id]), sorted(updated_ids))
+        self.assertEqual([], cleaned_ids)
+        self.assertTrue(types_db.cache_statistics()['version'] > version)
+
+    def test_type_definition_added_externally(self):
+        """
+        Tests a type added to the database after the cache was loaded is found.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+        types_db.all_type_ids() # load the cache
+        ContentType.get_collection().insert(
+            ContentType(DEF_2.id, DEF_2.display_name, DEF_2.description, DEF_2.unit_key,
+                        DEF_2.search_indexes, DEF_2.referenced_types), safe=True)
+
+        # Test
+        type_def = types_db.type_definition(DEF_2.id)
+
+        # Verify
+        self.assertEqual(DEF_2.id, type_def['id'])
+
+    def test_type_units_collection_cached(self):
+        """
+        Tests the same collection handle is returned for repeated calls.
+        """
+
+        # Setup
+        types_db.update_database([DEF_1])
+
+        # Test
+        collection_1 = types_db.type_units_collection(DEF_1.id)
+        collection_2 = types_db.type_units_collection(DEF_1.id)
+
+        # Verify
+        self.assertTrue(collection_1 is collection_2)
+        self.assertEqual(types_db.unit_collection_name(DEF_1.id), collection_1.name)
+
     # -- utility method tests ------------------------------------------------
 
     def test_create_or_update_type_collection(self):
@@ -15,6 +15,7 @@ import mock
 import base
 
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.auth.user import query as user_query
 from pulp.server.managers.auth.cert.cert_generator import SerialNumber
 
 from pulp.server.db.model.auth import User, Role
@@ -50,6 +51,7 @@ class UserManagerTests(base.PulpServerTests):
 
         User.get_collection().remove()
         Role.get_collection().remove()
+        user_query.invalidate_permission_cache()
 
     def _test_generate_user_certificate(self):
 
@@ -14,7 +14,10 @@
 import math
 import mock
 import os
+import pickle
 import shutil
+import threading
+import time
 import unittest
 
 from   pulp.bindings.exceptions import NotFoundException
@@ -232,6 +235,214 @@ class UploadManagerTests(unittest.TestCase):
         tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
         self.assertEqual(rpm_size, tracker.offset)
 
+    def test_upload_concurrently(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 4
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        mock_callback = mock.Mock()
+
+        # Test
+        self.upload_manager.upload(upload_id, mock_callback.update_status)
+
+        # Verify
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        f = open(TEST_RPM_FILENAME, 'r')
+        expected_contents = f.read()
+        f.close()
+
+        # Every segment sent matches the file at its offset and together they
+        # cover the whole file exactly once
+        uploaded = 0
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            call_upload_id, offset, body = single_call_args[0]
+            self.assertEqual(upload_id, call_upload_id)
+            self.assertEqual(expected_contents[offset:offset + len(body)], body)
+            uploaded += len(body)
+        self.assertEqual(rpm_size, uploaded)
+
+        self.assertEqual((rpm_size, rpm_size), mock_callback.update_status.call_args[0])
+
+        # Verify the state of the tracker file on disk
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual(rpm_size, tracker.offset)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertEqual(True, tracker.is_finished_uploading)
+        self.assertEqual(False, tracker.is_running)
+
+    @mock.patch('pulp.client.upload.manager.m2threading')
+    def test_upload_concurrently_openssl_locking(self, mock_m2threading):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        def upload_segment(upload_id, offset, data):
+            # the locking callbacks are in place for every call
+            self.assertEqual(1, mock_m2threading.init.call_count)
+            self.assertEqual(0, mock_m2threading.cleanup.call_count)
+            return Response(200, {})
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        self.assertTrue(self.mock_upload_bindings.upload_segment.called)
+        self.assertEqual(1, mock_m2threading.cleanup.call_count)
+
+    @mock.patch('pulp.client.upload.manager.m2threading')
+    def test_upload_serially_no_openssl_locking(self, mock_m2threading):
+        # Setup
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify
+        self.assertFalse(mock_m2threading.init.called)
+
+    def test_upload_concurrently_resume(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        tracker.add_completed_range(0, 500)
+        tracker.add_completed_range(1000, 1500)
+
+        # Test
+        self.upload_manager.upload(upload_id)
+
+        # Verify only the missing ranges were sent
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        for single_call_args in self.mock_upload_bindings.upload_segment.call_args_list:
+            offset, body = single_call_args[0][1:]
+            self.assertTrue(500 <= offset < 1000 or offset >= 1500)
+            self.assertTrue(offset + len(body) <= 1000 or offset >= 1500)
+
+        tracker = self.upload_manager._get_tracker_file_by_id(upload_id)
+        self.assertEqual([[0, rpm_size]], tracker.completed_ranges)
+        self.assertEqual(True, tracker.is_finished_uploading)
+
+    def test_upload_concurrently_server_error(self):
+        # Setup
+        self.upload_manager.chunk_size = 100
+        self.upload_manager.concurrency = 2
+        self.upload_manager.initialize()
+        upload_id = self.upload_manager.initialize_upload(TEST_RPM_FILENAME, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+
+        def upload_segment(upload_id, offset, data):
+            if offset >= 1000:
+                raise NotFoundException({})
+            return Response(200, {})
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        # Test
+        self.assertRaises(NotFoundException, self.upload_manager.upload, upload_id)
+
+        # Verify the segments uploaded before the failure are remembered
+        rpm_size = os.path.getsize(TEST_RPM_FILENAME)
+        tf_filename = self.upload_manager._tracker_filename(upload_id)
+        tracker = upload_util.UploadTracker.load(tf_filename)
+        self.assertEqual([[0, tracker.offset]], tracker.completed_ranges)
+        self.assertTrue(1000 <= tracker.offset < rpm_size)
+        self.assertEqual(False, tracker.is_finished_uploading)
+        self.assertEqual(False, tracker.is_running)
+
+    def test_load_tracker_without_ranges(self):
+        # Setup
+        filename = self.upload_manager._tracker_filename('tf')
+        tf = upload_util.UploadTracker(filename)
+        tf.offset = 500
+        del tf.completed_ranges
+        f = open(filename, 'w')
+        pickle.dump(tf, f)
+        f.close()
+
+        # Test
+        tracker = upload_util.UploadTracker.load(filename)
+
+        # Verify
+        self.assertEqual([[0, 500]], tracker.completed_ranges)
+        self.assertEqual([[500, 800]], tracker.missing_ranges(800))
+
+    def test_tracker_ranges(self):
+        tracker = upload_util.UploadTracker('tf')
+        tracker.offset = 0
+        tracker.add_completed_range(200, 300)
+        tracker.add_completed_range(500, 600)
+        self.assertEqual(0, tracker.offset)
+        self.assertEqual([[0, 200], [300, 500], [600, 700]], tracker.missing_ranges(700))
+
+        tracker.add_completed_range(0, 200)
+        tracker.add_completed_range(300, 500)
+        self.assertEqual([[0, 600]], tracker.completed_ranges)
+        self.assertEqual(600, tracker.offset)
+        self.assertEqual(600, tracker.uploaded_bytes())
+
+    def test_segment_scheduler_adapts_chunk_size(self):
+        tracker = upload_util.UploadTracker('tf')
+        scheduler = upload_util.SegmentScheduler(tracker, 100 * upload_util.MAX_CHUNKSIZE, upload_util.MIN_CHUNKSIZE)
+
+        offset, length = scheduler.next_segment()
+        scheduler.segment_done(offset, length, 0.01)
+        self.assertEqual(2 * upload_util.MIN_CHUNKSIZE, scheduler.chunk_size)
+
+        offset, length = scheduler.next_segment()
+        self.assertEqual(2 * upload_util.MIN_CHUNKSIZE, length)
+        scheduler.segment_done(offset, length, upload_util.TARGET_SEGMENT_SECONDS * 3)
+        self.assertEqual(upload_util.MIN_CHUNKSIZE, scheduler.chunk_size)
+
+        # never below the minimum
+        offset, length = scheduler.next_segment()
+        scheduler.segment_done(offset, length, upload_util.TARGET_SEGMENT_SECONDS * 3)
+        self.assertEqual(upload_util.MIN_CHUNKSIZE, scheduler.chunk_size)
+
+    def _test_upload_performance(self):
+        # Stand-in for the server that takes a fixed latency per call plus the
+        # time to receive the data at a fixed bandwidth
+        latency = 0.05
+        bandwidth = 50 * 1048576
+        received = []
+        lock = threading.Lock()
+
+        def upload_segment(upload_id, offset, data):
+            time.sleep(latency + float(len(data)) / bandwidth)
+            lock.acquire()
+            received.append(len(data))
+            lock.release()
+            return Response(200, {})
+        self.mock_upload_bindings.upload_segment.side_effect = upload_segment
+
+        source_filename = os.path.join(self.upload_working_dir, '..', 'pulp-upload-benchmark.bin')
+        f = open(source_filename, 'w')
+        f.write(os.urandom(64 * 1048576))
+        f.close()
+
+        try:
+            for concurrency in (1, 4, 8):
+                del received[:]
+                manager = upload_util.UploadManager(self.upload_working_dir, self.mock_bindings,
+                                                    concurrency=concurrency)
+                manager.initialize()
+                upload_id = manager.initialize_upload(source_filename, 'repo-1', 'type-1', {'k' : 'v'}, 'm-1')
+                start = time.time()
+                manager.upload(upload_id)
+                elapsed = time.time() - start
+                manager.delete_upload(upload_id)
+                print '\nconcurrency %d: %.1f MB/s in %d calls' % \
+                      (concurrency, sum(received) / elapsed / 1048576, len(received))
+        finally:
+            os.remove(source_filename)
+
     def test_upload_concurrent_upload(self):
         # Setup
         self.upload_manager.initialize()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import BaseHTTPServer
+import httplib
+import os
+import shutil
+import socket
+import SocketServer
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from pulp.bindings.server import ConnectionPool, PulpConnection
+
+# -- test cases ---------------------------------------------------------------
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTests, self).setUp()
+        self.factory = mock.Mock(side_effect=lambda: mock.Mock(sock=None))
+        self.pool = ConnectionPool(self.factory, size=2)
+        self.pool._is_usable = mock.Mock(return_value=True)
+
+    def test_acquire_new(self):
+        connection, reused = self.pool.acquire()
+        self.assertFalse(reused)
+        self.assertEqual(1, self.factory.call_count)
+
+    def test_acquire_released(self):
+        connection, reused = self.pool.acquire()
+        self.pool.release(connection)
+
+        reused_connection, reused = self.pool.acquire()
+        self.assertTrue(reused)
+        self.assertTrue(reused_connection is connection)
+        self.assertEqual(1, self.factory.call_count)
+        self.assertEqual(1, self.pool.statistics()['reused'])
+
+    def test_acquire_unusable(self):
+        connection, reused = self.pool.acquire()
+        self.pool.release(connection)
+        self.pool._is_usable.return_value = False
+
+        new_connection, reused = self.pool.acquire()
+        self.assertFalse(reused)
+        self.assertTrue(new_connection is not connection)
+        self.assertEqual(1, connection.close.call_count)
+
+    def test_acquire_expired(self):
+        connection, reused = self.pool.acquire()
+        self.pool.release(connection)
+        self.pool._idle[0] = (connection, time.time() - self.pool.idle_timeout - 1)
+
+        new_connection, reused = self.pool.acquire()
+        self.assertFalse(reused)
+        self.assertEqual(1, connection.close.call_count)
+
+    def test_release_full(self):
+        connections = [self.pool.acquire()[0] for i in range(3)]
+        for c in connections:
+            self.pool.release(c)
+
+        self.assertEqual(2, self.pool.statistics()['idle'])
+        self.assertEqual(1, connections[2].close.call_count)
+
+    def test_close(self):
+        connection, reused = self.pool.acquire()
+        self.pool.release(connection)
+        self.pool.close()
+
+        self.assertEqual(0, self.pool.statistics()['idle'])
+        self.assertEqual(1, connection.close.call_count)
+
+
+class PooledRequestTests(unittest.TestCase):
+
+    def setUp(self):
+        super(PooledRequestTests, self).setUp()
+        self.pulp_connection = PulpConnection('localhost', keep_alive=True)
+        self.wrapper = self.pulp_connection.server_wrapper
+        self.wrapper._create_connection = mock.Mock(side_effect=lambda: mock.Mock(sock=None))
+        self.wrapper.pool.factory = self.wrapper._create_connection
+        self.wrapper.pool._is_usable = mock.Mock(return_value=True)
+
+    def _response(self, will_close=False):
+        return mock.Mock(status=200, will_close=will_close)
+
+    def test_connection_reused(self):
+        self.wrapper._receive = mock.Mock(return_value=(self._response(), '{}'))
+
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        self.assertEqual(1, self.wrapper._create_connection.call_count)
+        first = self.wrapper._receive.call_args_list[0][0][0]
+        second = self.wrapper._receive.call_args_list[1][0][0]
+        self.assertTrue(first is second)
+
+    def test_connection_closed_by_server(self):
+        self.wrapper._receive = mock.Mock(return_value=(self._response(will_close=True), '{}'))
+
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        self.assertEqual(2, self.wrapper._create_connection.call_count)
+
+    def test_reconnect_on_failure(self):
+        self.wrapper._receive = mock.Mock(return_value=(self._response(), '{}'))
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        # the server dropped the idle connection
+        self.wrapper._receive.side_effect = [httplib.BadStatusLine(''), (self._response(), '{"a": 1}')]
+        status, body = self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        self.assertEqual(200, status)
+        self.assertEqual({'a': 1}, body)
+        self.assertEqual(2, self.wrapper._create_connection.call_count)
+        self.assertEqual(1, self.wrapper.pool.statistics()['discarded'])
+
+    def test_new_connection_failure_not_retried(self):
+        self.wrapper._receive = mock.Mock(side_effect=socket.error('refused'))
+
+        self.assertRaises(socket.error, self.wrapper.request, 'GET', '/pulp/api/v2/repositories/', None)
+        self.assertEqual(1, self.wrapper._receive.call_count)
+        self.assertEqual(0, self.wrapper.pool.statistics()['idle'])
+
+    def test_non_idempotent_failure_not_retried(self):
+        self.wrapper._receive = mock.Mock(return_value=(self._response(), '{}'))
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        # the server may have acted on the request before the failure
+        self.wrapper._receive.side_effect = httplib.BadStatusLine('')
+        self.assertRaises(httplib.BadStatusLine, self.wrapper.request,
+                          'POST', '/pulp/api/v2/repositories/', '{}')
+
+        self.assertEqual(1, self.wrapper._create_connection.call_count)
+        self.assertEqual(2, self.wrapper._receive.call_count)
+        self.assertEqual(1, self.wrapper.pool.statistics()['discarded'])
+
+    def test_non_idempotent_unsent_retried(self):
+        self.wrapper._receive = mock.Mock(return_value=(self._response(), '{}'))
+        self.wrapper.request('GET', '/pulp/api/v2/repositories/', None)
+
+        # the server dropped the idle connection before the request was written
+        connection = self.wrapper._receive.call_args[0][0]
+        connection.request.side_effect = socket.error('broken pipe')
+        status, body = self.wrapper.request('POST', '/pulp/api/v2/repositories/', '{}')
+
+        self.assertEqual(200, status)
+        self.assertEqual(2, self.wrapper._create_connection.call_count)
+        self.assertEqual(2, self.wrapper._receive.call_count)
+        self.assertEqual(1, self.wrapper.pool.statistics()['discarded'])
+
+    def test_not_pooled_by_default(self):
+        wrapper = PulpConnection('localhost').server_wrapper
+        self.assertTrue(wrapper.pool is None)
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1 # send each response in one write
+
+    def do_GET(self):
+        body = '{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TLSServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, cert_filename):
+        BaseHTTPServer.HTTPServer.__init__(self, ('localhost', 0), KeepAliveHandler)
+        self.socket = ssl.wrap_socket(self.socket, certfile=cert_filename, server_side=True)
+
+    def handle_error(self, request, client_address):
+        # clients that do not keep the connection alive close it without a
+        # TLS shutdown
+        pass
+
+
+class KeepAlivePerformanceTests(unittest.TestCase):
+
+    def setUp(self):
+        super(KeepAlivePerformanceTests, self).setUp()
+        self.working_dir = tempfile.mkdtemp()
+        self.cert_filename = os.path.join(self.working_dir, 'server.pem')
+        subprocess.check_call(['openssl', 'req', '-x509', '-nodes', '-newkey', 'rsa:2048',
+                               '-subj', '/CN=localhost', '-days', '1',
+                               '-keyout', self.cert_filename, '-out', self.cert_filename],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.server = TLSServer(self.cert_filename)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        shutil.rmtree(self.working_dir)
+
+    def _test_keep_alive_performance(self):
+        port = self.server.server_address[1]
+        count = 200
+        for keep_alive in (False, True):
+            connection = PulpConnection('localhost', port, keep_alive=keep_alive)
+            start = time.time()
+            for i in range(count):
+                connection.GET('/v2/repositories/')
+            elapsed = time.time() - start
+            stats = ''
+            if keep_alive:
+                stats = connection.server_wrapper.pool.statistics()
+            print '\nkeep_alive=%s: %.1f requests/s %s' % (keep_alive, count / elapsed, stats)
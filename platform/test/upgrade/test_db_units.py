@@ -147,6 +147,39 @@ class PackagesUpgradeTests(BaseDbUpgradeTests):
 
         self._assert_associations(self.tmp_test_db.database.units_srpm, 'srpm', {'arch' : 'src'})
 
+    def test_rpms_batched(self):
+        # Setup
+        original_batch_size = units.PACKAGE_BATCH_SIZE
+        units.PACKAGE_BATCH_SIZE = 2
+
+        # Test
+        try:
+            report = UpgradeStepReport()
+            units._rpms(self.v1_test_db.database, self.tmp_test_db.database, report)
+            result = units._rpms(self.v1_test_db.database, self.tmp_test_db.database, report)
+        finally:
+            units.PACKAGE_BATCH_SIZE = original_batch_size
+
+        # Verify
+        self.assertTrue(result)
+
+        v1_rpms = self.v1_test_db.database.packages.find({'arch' : {'$ne' : 'src'}}).sort('filename')
+        self.assertEqual(2 * v1_rpms.count(), report.item_counts['rpm'])
+        self._assert_upgrade(v1_rpms)
+        self._assert_associations(self.tmp_test_db.database.units_rpm, 'rpm', {'arch' : {'$ne' : 'src'}})
+
+    def test_package_repos(self):
+        # Test
+        package_repos = units._package_repos(self.v1_test_db.database)
+
+        # Verify
+        for v1_repo in self.v1_test_db.database.repos.find():
+            for package_id in v1_repo['packages']:
+                self.assertTrue(v1_repo['id'] in package_repos[package_id])
+
+        expected_count = sum([len(r['packages']) for r in self.v1_test_db.database.repos.find()])
+        self.assertEqual(expected_count, sum([len(r) for r in package_repos.values()]))
+
     def _assert_upgrade(self, v1_packages):
 
         v2_rpms = self.tmp_test_db.database.units_rpm.find().sort('filename')
@@ -10,8 +10,13 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 import os
+import Queue
 import shutil
 import glob
+import tempfile
+import threading
+import unittest
+
 from base_file_upgrade import BaseFileUpgradeTests
 from pulp.server.upgrade.filesystem import rpms, distribution, isos
 from pulp.server.upgrade.model import UpgradeStepReport
@@ -45,6 +50,7 @@ class TestFileSystemUpgrade(BaseFileUpgradeTests):
             v2_path = "%s/%s" % (rpms.DIR_RPMS, v1_path.split(rpms.V1_DIR_RPMS)[-1])
             self.assertTrue(os.path.exists(v2_path))
         self.assertEquals(len(report.errors), 0)
+        self.assertEquals(report.item_counts['package'], 3)
         self.assertTrue(report.succeeded)
 
     def test_distributions(self):
@@ -75,6 +81,49 @@ class TestFileSystemUpgrade(BaseFileUpgradeTests):
         self.assertEquals(len(report.errors), 0)
         self.assertTrue(report.succeeded)
 
+class MovePackagesTests(unittest.TestCase):
+
+    def setUp(self):
+        super(MovePackagesTests, self).setUp()
+        self.working_dir = tempfile.mkdtemp()
+        self.v1_dir = os.path.join(self.working_dir, 'v1')
+        self.v2_dir = os.path.join(self.working_dir, 'v2')
+        os.makedirs(self.v1_dir)
+
+    def tearDown(self):
+        super(MovePackagesTests, self).tearDown()
+        shutil.rmtree(self.working_dir)
+
+    def _move(self, moves):
+        queue = Queue.Queue()
+        for move in moves:
+            queue.put(move)
+        queue.put(None)
+        report = UpgradeStepReport()
+        rpms._move_packages(queue, report, threading.Lock())
+        return report
+
+    def test_move_existing_directory(self):
+        v1_path = os.path.join(self.v1_dir, 'a.rpm')
+        open(v1_path, 'w').close()
+        v2_path = os.path.join(self.v2_dir, 'a', 'a.rpm')
+        os.makedirs(os.path.dirname(v2_path))
+
+        report = self._move([(v1_path, v2_path)])
+
+        self.assertTrue(os.path.exists(v2_path))
+        self.assertFalse(os.path.exists(v1_path))
+        self.assertEquals(len(report.errors), 0)
+        self.assertEquals(report.item_counts['package'], 1)
+
+    def test_move_missing_source(self):
+        report = self._move([(os.path.join(self.v1_dir, 'missing.rpm'),
+                              os.path.join(self.v2_dir, 'missing.rpm'))])
+
+        self.assertEquals(len(report.warnings), 1)
+        self.assertEquals(len(report.errors), 0)
+        self.assertFalse('package' in report.item_counts)
+
 class DRPMUpgradeTests(BaseFileUpgradeTests):
 
     def setUp(self):
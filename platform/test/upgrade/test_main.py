@@ -185,3 +185,15 @@ class MainTests(unittest.TestCase):
         # Verify
         self.assertEqual(0, mock_files_call.call_count)
         self.assertEqual(1, mock_db_call.call_count)
+
+    def test_step_statistics(self):
+        # Setup
+        self.mock_db_upgrade_call_1.return_value.processed('rpm', 1000)
+        self.upgrader._print = mock.MagicMock()
+
+        # Test
+        self.upgrader._print_step_statistics(self.mock_db_upgrade_call_1.return_value, 2.0)
+
+        # Verify
+        lines = [c[0][0] for c in self.upgrader._print.call_args_list]
+        self.assertEqual(['Completed in 2.0 seconds', '  rpm: 1000 (500.0 per second)'], lines)